@@ -0,0 +1,173 @@
+# P-Lexi Trees biased towards the keys that are looked up most often.
+
+# NOTE:
+# - In a P-Lexi tree, the depth of a node of level l is about
+#   log_{1/p}(n) - l, so, as in biased skip lists, a key looked up with
+#   frequency f should have level about log_{1/p}(n*f) to get a search path
+#   of length about log_{1/p}(1/f), which is optimal up to a constant factor.
+# - Each node counts its lookups (hits). Every `decay_every` lookups a new
+#   epoch starts and all the counts are halved (lazily, when a node is next
+#   touched), so that the tree follows the changes in the access pattern.
+# - The level of a node is never lower than the random level it was given
+#   on insertion (its base level), so the cold keys keep the usual
+#   guarantees of P-Lexi trees.
+# - A node is promoted when its count reaches a power of 2 and its target
+#   level is higher than its current level. The promoted nodes (and the ones
+#   with a weight) are revisited at the start of each epoch and demoted if
+#   they cooled down.
+# - Changing the level of a node is done by removing it and reinserting it,
+#   which costs O(log n). This is rare, but the bookkeeping makes each
+#   lookup a little slower, so this only pays off with skewed (e.g.
+#   Zipfian) lookups.
+
+from __future__ import annotations
+from math import log
+from misc import NotFound, notFound
+from misc import _Missing, _missing
+from generic import K, V, T
+from PLTree import MaxLevel, PLTree, _PNode
+
+class _BNode(_PNode[K, V]):
+    """Node for Biased P-Lexi Trees"""
+    base_level: int
+    hits: int
+    epoch: int              # epoch of the last update of `hits`
+    weight: float           # expected frequency given by the client
+
+    def __init__(self, key: K, val: V, level: int, epoch: int) -> None:
+        super().__init__(key, val, level)
+        self.base_level = level
+        self.hits = 0
+        self.epoch = epoch
+        self.weight = 0.
+
+class BiasedPLTree(PLTree[K, V]):
+    decay_every: int
+    min_hits: int
+    _log_inv_p: float
+    _epoch: int
+    _epoch_lookups: int
+    _total_hits: int        # decayed like the hits of the nodes
+    _tracked: dict[K, None] # keys whose level is above their base level
+
+    def __init__(self, any_key: K, any_val: V, *, p=0.5,
+                 decay_every: int = 1 << 16, min_hits: int = 16):
+        """NOTE: Nodes with fewer than `min_hits` hits are never promoted, so
+        that a few lookups in a young epoch don't reshape the tree."""
+        if not (0 < p < 1):
+            raise ValueError("p must be in ]0, 1[")
+        if decay_every < 1:
+            raise ValueError("decay_every must be positive")
+        super().__init__(any_key, any_val, p=p)
+        self.decay_every = decay_every
+        self.min_hits = min_hits
+        self._log_inv_p = log(1 / p)
+        self._epoch = 0
+        self._epoch_lookups = 0
+        self._total_hits = 0
+        self._tracked = {}
+
+    def _new_node(self, key: K, val: V, level: int) -> _BNode[K, V]:
+        return _BNode(key, val, level, self._epoch)
+
+    def _find(self, key: K) -> V | NotFound:
+        cur = self._root.right
+        while cur is not None:
+            if cur.key < key:
+                cur = cur.right
+            elif key < cur.key:
+                cur = cur.left
+            else:
+                val = cur.val
+                self._hit(cur)              # type: ignore
+                return val
+        return notFound
+
+    def _decay(self, node: _BNode[K, V]):
+        if node.epoch != self._epoch:
+            node.hits >>= min(self._epoch - node.epoch, 63)
+            node.epoch = self._epoch
+
+    def _hit(self, node: _BNode[K, V]):
+        self._decay(node)
+        node.hits += 1
+        self._total_hits += 1
+        hits = node.hits
+        if hits >= self.min_hits and hits & (hits - 1) == 0:
+            level = self._target_level(node)
+            if level > node.level:
+                self._relevel(node, level)
+        self._epoch_lookups += 1
+        if self._epoch_lookups >= self.decay_every:
+            self._new_epoch()
+
+    def _target_level(self, node: _BNode[K, V]) -> int:
+        freq = node.weight
+        if self._total_hits > 0 and node.hits >= self.min_hits:
+            freq = max(freq, node.hits / self._total_hits)
+        if freq <= 0:
+            return node.base_level
+        level = int(log(self._len * freq) / self._log_inv_p)
+        level = min(level, MaxLevel, self._maxLevel + 1)
+        return max(level, node.base_level)
+
+    def _relevel(self, node: _BNode[K, V], level: int):
+        """Moves `node` to `level` (by removing it and reinserting it).
+        NOTE: `node` is replaced by a new node."""
+        key = node.key
+        PLTree.remove(self, key)
+        PLTree.insert(self, key, node.val, level)
+        new = self._get_node_pos(key)[1]
+        assert isinstance(new, _BNode)
+        new.base_level = node.base_level
+        new.hits = node.hits
+        new.epoch = node.epoch
+        new.weight = node.weight
+        if level > node.base_level or node.weight > 0:
+            self._tracked[key] = None
+        else:
+            self._tracked.pop(key, None)
+
+    def _new_epoch(self):
+        """Halves all the hits and demotes the nodes that cooled down."""
+        self._epoch += 1
+        self._epoch_lookups = 0
+        self._total_hits >>= 1
+        for key in list(self._tracked):
+            node = self._get_node_pos(key)[1]
+            assert isinstance(node, _BNode)
+            self._decay(node)
+            level = self._target_level(node)
+            if level < node.level:
+                self._relevel(node, level)
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        self._tracked.pop(key, None)
+        return super().remove(key, default)
+
+    def set_weight(self, key: K, freq: float):
+        """Tells the tree that `key` is expected to be looked up with
+        frequency `freq` (in [0, 1]), on top of what the hit counts say.
+        NOTE: Unlike the hits, weights don't decay."""
+        if not (0 <= freq <= 1):
+            raise ValueError("freq must be in [0, 1]")
+        node = self._get_node_pos(key)[1]
+        if node is None:
+            raise KeyError
+        assert isinstance(node, _BNode)
+        self._decay(node)
+        node.weight = freq
+        level = self._target_level(node)
+        if level != node.level:
+            self._relevel(node, level)
+        elif freq > 0:
+            self._tracked[key] = None
+
+    def hits(self, key: K) -> int:
+        """Returns the (decayed) number of lookups of `key` so far."""
+        node = self._get_node_pos(key)[1]
+        if node is None:
+            raise KeyError
+        assert isinstance(node, _BNode)
+        self._decay(node)
+        return node.hits
@@ -27,6 +27,8 @@ class PathData(Generic[K, V]):
     last_idx: int = 0               # last valid idx in list of nodes
 
 class D2LTree(DLTree[K, V], Tree[K, V]):
+    _max_list_len = 2
+
     def _insert_keynode(
         self, prev2: _DNode[K, V], prev: _DNode[K, V], prev_cmp: int,
         key_node: _DNode[K, V]
@@ -91,18 +93,26 @@ class D2LTree(DLTree[K, V], Tree[K, V]):
                 cur.val = val
                 return
         
-        key_node = _DNode[K, V](key, val, high_right=False)
-        self._len += 1
-        
         # prev -> key_node
         prev = nodes[last_idx]
         assert prev is not None
+        key_node = self._new_node(key, val, prev)
+        self._len += 1
+
         if last_idx == 0:              # empty tree
             prev.right = key_node
             return
+        self._insert_below(nodes, last_idx, prev_cmp, key_node)
+
+    def _insert_below(self, nodes: list[_DNode[K, V] | None], last_idx: int,
+                      prev_cmp: int, key_node: _DNode[K, V]):
+        """Links `key_node` below nodes[last_idx], the last node on its search
+        path nodes[0..last_idx], on the side given by `prev_cmp`, and
+        rebalances the tree."""
+        prev = nodes[last_idx]
         last_idx -= 1
         prev2 = nodes[last_idx]
-        assert prev2 is not None
+        assert prev is not None and prev2 is not None
         prev, cur = self._insert_keynode(prev2, prev, prev_cmp, key_node)
 
         # rebalances the tree
@@ -183,8 +193,10 @@ class D2LTree(DLTree[K, V], Tree[K, V]):
         last_idx -= 1
         hole = self._replace_with_leaf(pd.prev_key_node, pd.key_node,
                                        prev_leaf, leaf)
+        val = pd.key_node.val
+        self._free_node(pd.key_node)
         if not hole:
-            return pd.key_node.val
+            return val
 
         # updates `nodes` as well
         nodes[pd.key_node_idx] = leaf
@@ -220,7 +232,10 @@ class D2LTree(DLTree[K, V], Tree[K, V]):
             cur = prev
             prev = nodes[last_idx]
         
-        return pd.key_node.val
+        return val
+
+    def _path_buffer_len(self) -> int:
+        return 2*(MAX_LEVEL+1) + 1
 
     def _check(self):
         """Checks whether the tree is valid."""
@@ -0,0 +1,315 @@
+# 2-Lexi Trees where each operation does a bounded amount of rebalancing.
+
+# NOTE:
+# - An insertion can lift nodes all the way up to the root, and a deletion
+#   can lower nodes all the way up to the root, so, although the work is O(1)
+#   amortized, a single operation can take O(log n) steps. Here, each
+#   operation does at most `max_steps` lift/lower steps, and the unfinished
+#   work is deferred:
+#   - An insertion that runs out of steps leaves a list that is too long,
+#     which doesn't break the search (the tree is still a valid BST with all
+#     the leaves at the same depth). The keys of the nodes of such lists are
+#     queued, and the lists are fixed later.
+#   - A deletion that would need too many lower steps just marks the node as
+#     deleted (a tombstone), which is removed for real later.
+# - Every operation spends the steps it didn't use on the deferred work, and
+#   `maintain` can be called (e.g. when idle) to do more of it. The
+#   tombstones that need more steps than that are skipped.
+# - Removing a tombstone can need more steps than any operation has left
+#   (e.g. after many removals, when most lists have a single node and the
+#   holes go up to the top), so the deferred work is capped: an operation
+#   that leaves more than `max_deferred` queued keys and tombstones finishes
+#   some of them whatever it takes, i.e. O(height) more steps.
+# - This works a list at a time, as DkLTree (bottom-up mode) does.
+
+from __future__ import annotations
+from enum import Enum
+from math import inf
+from typing import Any, Final, Iterator
+import numpy as np
+from generic import K, V, T
+from DLTree import DLTree
+from DLTree_misc import _DNode, link_list, list_of
+from DkLTree import DkLTree
+from liftk import lift
+from misc import NotFound, notFound
+from misc import _Missing, _missing
+
+class _Tombstone(Enum):
+    tombstone = 0
+_tombstone: Final = _Tombstone.tombstone
+
+class D2LTree_Budgeted(DkLTree[K, V]):
+    max_steps: int
+    max_deferred: int
+    # Keys of the nodes in the lists that are too long (a dict is an ordered
+    # set).
+    _pending: dict[K, None]
+    _tombstones: dict[K, None]
+
+    def __init__(self, any_key: K, any_val: V, *, max_steps: int = 4,
+                 max_deferred: int = 256):
+        if max_steps < 1:
+            raise ValueError("max_steps must be positive")
+        if max_deferred < 0:
+            raise ValueError("max_deferred must be non-negative")
+        super().__init__(any_key, any_val, k=2, mode='bottom_up')
+        self.max_steps = max_steps
+        self.max_deferred = max_deferred
+        self._pending = {}
+        self._tombstones = {}
+
+    def _init_params(self) -> tuple[tuple[str, object], ...]:
+        return (('max_steps', self.max_steps),
+                ('max_deferred', self.max_deferred))
+
+    @property
+    def num_deferred(self) -> int:
+        """Returns the number of queued keys and tombstones."""
+        return len(self._pending) + len(self._tombstones)
+
+    def _find(self, key: K) -> V | NotFound:
+        val = super()._find(key)
+        return notFound if val is _tombstone else val
+
+    def items(self, from_key: K | _Missing = _missing,
+              to_key: K | _Missing = _missing) -> Iterator[tuple[K, V]]:
+        for key, val in super().items(from_key, to_key):
+            if val is not _tombstone:
+                yield key, val
+
+    def __iter__(self) -> Iterator[tuple[K, V]]:
+        return self.items()
+
+    def to_arrays(self, lo: K | _Missing = _missing,
+                  hi: K | _Missing = _missing, *, key_dtype: Any = None,
+                  val_dtype: Any = None) -> tuple[np.ndarray, np.ndarray]:
+        """NOTE: Finishes the deferred work first."""
+        self.maintain()
+        return super().to_arrays(lo, hi, key_dtype=key_dtype,
+                                 val_dtype=val_dtype)
+
+    def _note_if_long(self, nodes: list[_DNode[K, V]]):
+        if len(nodes) > self.k:
+            for node in nodes:
+                self._pending[node.key] = None
+        elif self._pending:
+            for node in nodes:
+                self._pending.pop(node.key, None)
+
+    def _lift_up(self, path: list[_DNode[K, V]], h: int,
+                 nodes: list[_DNode[K, V]], children: list[_DNode | None],
+                 budget: float) -> int:
+        """Fixes the list (nodes, children), headed by path[h], and the lists
+        above it with at most `budget` lifts, relinks the last list touched
+        and returns the number of lifts."""
+        k = self.k
+        steps = 0
+        while len(nodes) > k:
+            if steps >= budget:
+                break
+            steps += 1
+            if h == 1:
+                # the top list: the tree gets taller
+                parent_nodes: list[_DNode] = []
+                parent_children: list[_DNode | None] = [path[1]]
+                ln, _, rn, _ = lift(nodes, children, parent_nodes,
+                                    parent_children, 0)
+                self._note_if_long(ln)
+                self._note_if_long(rn)
+                self._root.right = link_list(parent_nodes, parent_children)
+                return steps
+            parent_h, parent_nodes, parent_children = \
+                self._list_at(path, h - 1)
+            slot = self._slot_of(path, h, parent_h)
+            ln, _, rn, _ = lift(nodes, children, parent_nodes,
+                                parent_children, slot)
+            self._note_if_long(ln)
+            self._note_if_long(rn)
+            h, nodes, children = parent_h, parent_nodes, parent_children
+        if self._pending or len(nodes) > k:
+            self._note_if_long(nodes)
+        left_side = path[h-1].left is path[h]
+        self._attach(path[h-1], link_list(nodes, children), left_side)
+        return steps
+
+    def _lowering_cost(self, path: list[_DNode[K, V]]) -> int:
+        """Returns the number of lower steps `_unlink` would do (see
+        DkLTree._removal_path), without modifying the tree."""
+        h, nodes, _ = self._list_at(path, len(path) - 1)
+        if len(nodes) > 1:
+            return 0                    # no hole
+        steps = 0
+        while h > 1:
+            steps += 1
+            parent_h, parent_nodes, parent_children = \
+                self._list_at(path, h - 1)
+            slot = self._slot_of(path, h, parent_h)
+            # the hole borrows a node from a sibling if it can (see lowerk.py)
+            if slot > 0 and \
+                    len(list_of(parent_children[slot-1])[0]) >= 2:  # type: ignore
+                break
+            if slot < len(parent_nodes) and \
+                    len(list_of(parent_children[slot+1])[0]) >= 2:  # type: ignore
+                break
+            # otherwise it merges and the parent loses a node
+            if len(parent_nodes) > 1:
+                break
+            h = parent_h
+        return steps
+
+    def __setitem__(self, key: K, val: V):
+        """Inserts with replacement."""
+        path: list[_DNode[K, V]] = [self._root]
+        prev_cmp = -1
+        cur = self._root.right
+        while cur is not None:
+            path.append(cur)
+            if cur.key < key:
+                prev_cmp = -1
+                cur = cur.right
+            elif key < cur.key:
+                prev_cmp = 1
+                cur = cur.left
+            else:       # key already present
+                if cur.val is _tombstone:
+                    del self._tombstones[key]
+                    self._len += 1
+                cur.val = val
+                return
+
+        key_node = self._new_node(key, val, path[-1])
+        self._len += 1
+        if len(path) == 1:              # empty tree
+            self._root.right = key_node
+            return
+
+        t = len(path) - 1
+        h, nodes, children = self._list_at(path, t)
+        pos = t - h + (1 if prev_cmp < 0 else 0)
+        nodes.insert(pos, key_node)
+        children.insert(pos, None)
+        steps = self._lift_up(path, h, nodes, children, self.max_steps)
+        if self._pending or self._tombstones:
+            self._do_deferred(self.max_steps - steps)
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        path, key_idx = self._removal_path(key)
+        if key_idx == 0 or path[key_idx].val is _tombstone:
+            if default is _missing:
+                raise KeyError
+            return default
+        key_node = path[key_idx]
+        val = key_node.val
+        self._len -= 1
+        steps = self._lowering_cost(path)
+        if steps > self.max_steps:
+            key_node.val = _tombstone       # type: ignore
+            self._tombstones[key] = None
+            steps = 0
+        else:
+            self._unlink(path, key_idx)
+            self._free_node(key_node)
+        if self._pending or self._tombstones:
+            self._do_deferred(self.max_steps - steps)
+        return val
+
+    def _do_deferred(self, budget: int):
+        """Does at most `budget` steps of deferred work, and then more if
+        there's more than `max_deferred` left."""
+        self.maintain(budget)
+        while self.num_deferred > self.max_deferred:
+            if self._pending:
+                self._fix_pending(inf)
+            else:
+                self._purge_tombstone(inf)
+
+    def _fix_pending(self, budget: float) -> int:
+        """Fixes the list of the first queued key with at most `budget` lifts
+        and returns the number of steps."""
+        key = next(iter(self._pending))
+        del self._pending[key]
+        path: list[_DNode[K, V]] = [self._root]
+        cur = self._root.right
+        while cur is not None:
+            path.append(cur)
+            if cur.key < key:
+                cur = cur.right
+            elif key < cur.key:
+                cur = cur.left
+            else:
+                break
+        if cur is None:
+            return 1                    # (the node was removed)
+        h, nodes, children = self._list_at(path, len(path) - 1)
+        if len(nodes) <= self.k:
+            return 1                    # (the list was fixed already)
+        return max(1, self._lift_up(path, h, nodes, children, budget))
+
+    def _purge_tombstone(self, budget: float) -> int:
+        """Removes the node of the first tombstone for real if that takes at
+        most `budget` lower steps, and returns the number of steps, or -1 if
+        it needs more, in which case the tombstone is moved to the back of
+        the queue."""
+        key = next(iter(self._tombstones))
+        del self._tombstones[key]
+        path, key_idx = self._removal_path(key)
+        steps = self._lowering_cost(path)
+        if steps > budget:
+            self._tombstones[key] = None
+            return -1
+        key_node = path[key_idx]
+        self._unlink(path, key_idx)
+        self._free_node(key_node)
+        return max(1, steps)
+
+    def maintain(self, budget: int | None = None) -> bool:
+        """Does at most `budget` steps (all of them by default) of deferred
+        work and returns whether there's none left.
+        NOTE: Each queued key and each tombstone looked at counts as at least
+            1 step. The tombstones that need more steps than are left are
+            skipped (once each).
+        """
+        left: float = inf if budget is None else budget
+        num_skipped = 0
+        while left > 0:
+            if self._pending:
+                left -= self._fix_pending(left)
+            elif num_skipped < len(self._tombstones):
+                steps = self._purge_tombstone(left)
+                if steps < 0:
+                    num_skipped += 1
+                    left -= 1
+                else:
+                    left -= steps
+            else:
+                break
+        return not self._pending and not self._tombstones
+
+    def _check(self):
+        """Checks whether the tree is valid.
+        NOTE: The lists can only be too long if some work is deferred."""
+        DLTree._check(self, self.k if not self._pending else 1 << 30)
+        num_tombstones = 0
+        num_nodes = 0
+        for node in self._nodes():
+            num_nodes += 1
+            if node.val is _tombstone:
+                num_tombstones += 1
+                assert node.key in self._tombstones
+        assert num_tombstones == len(self._tombstones)
+        assert num_nodes - num_tombstones == self._len
+
+    def _nodes(self) -> Iterator[_DNode[K, V]]:
+        """Yields the nodes (tombstones included) in key order."""
+        stack: list[_DNode[K, V]] = []
+        cur = self._root.right
+        while True:
+            while cur is not None:
+                stack.append(cur)
+                cur = cur.left
+            if not stack:
+                return
+            cur = stack.pop()
+            yield cur
+            cur = cur.right
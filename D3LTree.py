@@ -27,6 +27,8 @@ class PathData(Generic[K, V]):
     key_node: _DNode[K, V] | None = None
 
 class D3LTree(DLTree[K, V], Tree[K, V]):
+    _max_list_len = 3
+
     def _lift_and_find(self, key: K) -> \
             Tuple[_DNode[K, V] | None, _DNode[K, V], _DNode[K, V] | None, int]:
         """Returns (prev2, prev, key_node, prev_cmp).
@@ -83,7 +85,7 @@ class D3LTree(DLTree[K, V], Tree[K, V]):
             # updates Node(key)
             key_node.val = val
             return
-        key_node = _DNode[K, V](key, val, high_right=False)
+        key_node = self._new_node(key, val, prev)
         self._len += 1
 
         # prev -> key_node
@@ -267,12 +269,13 @@ class D3LTree(DLTree[K, V], Tree[K, V]):
         if pd.leaf.right is pd.key_node:
             assert pd.prev_key_node is pd.leaf and pd.leaf.high_right
             pd.leaf.right = pd.key_node.right
-            return pd.key_node.val
-
-        self._replace_with_leaf(pd.prev_key_node, pd.key_node, pd.prev_leaf,
-                                pd.leaf)
+        else:
+            self._replace_with_leaf(pd.prev_key_node, pd.key_node,
+                                    pd.prev_leaf, pd.leaf)
 
-        return pd.key_node.val
+        val = pd.key_node.val
+        self._free_node(pd.key_node)
+        return val
         
     def _check(self):
         """Checks whether the tree is valid."""
@@ -1,19 +1,36 @@
 from __future__ import annotations
-from typing import Final, Generic
+from typing import Final, Generic, Iterable, Sequence
 from generic import K, V
 from DLTree_misc import _DNode
-from misc import NotFound, notFound, _Missing, _missing
+from misc import NotFound, gc_paused, notFound, _Missing, _missing
 
 class DLTree(Generic[K, V]):
     _root: Final[_DNode[K, V]]
     _len: int
+    _max_list_len: int          # set by the subclasses
 
     def __init__(self, any_key: K, any_val: V):
         """NOTE: `any_key` and `any_val` are needed for type stability, not
         that Python cares about it.
         """
-        self._root = _DNode[K, V](any_key, any_val, high_right=False)
+        self._root = self._make_root(any_key, any_val)
         self._len = 0
+
+    # NOTE: The node hooks below let subclasses store the nodes elsewhere
+    #   (see paged_store.py).
+    def _make_root(self, any_key: K, any_val: V) -> _DNode[K, V]:
+        return _DNode[K, V](any_key, any_val, high_right=False)
+
+    def _new_node(self, key: K, val: V,
+                  near: _DNode[K, V] | None = None) -> _DNode[K, V]:
+        """Returns a new node that will be linked into the same list as
+        `near`, if given."""
+        # NOTE: `_DNode` instead of `_DNode[K, V]` because it's faster.
+        return _DNode(key, val)
+
+    def _free_node(self, node: _DNode[K, V]):
+        """Called when `node` has been unlinked from the tree for good."""
+        pass
         
     @property
     def first(self):
@@ -133,6 +150,97 @@ class DLTree(Generic[K, V]):
             self._check_sub(self._root.right, max_list_len=max_list_len,
                             cur_height=1, tree_height=tree_height)
 
+    @staticmethod
+    def _balanced_levels(n: int, max_list_len: int,
+                         height: int | None = None) -> list[int]:
+        """Returns the levels, in key order, of the nodes of a balanced tree
+        with `n` nodes and height `height`.
+        NOTE:
+        - By default, the height is floor(log2(n+1)), i.e. the height of a
+          perfectly balanced binary tree, so that most lists have length 1.
+        - Requires 2^height - 1 <= n <= (max_list_len+1)^height - 1.
+        """
+        if height is None:
+            height = (n + 1).bit_length() - 1
+        # max_nodes[h] = max number of nodes in a subtree of height h
+        max_nodes = [(max_list_len + 1)**h - 1 for h in range(height + 1)]
+        if not ((1 << height) - 1 <= n <= max_nodes[height]):
+            raise ValueError(f"a tree with {n} nodes can't have height "
+                             f"{height}")
+        levels: list[int] = []
+
+        def sub(m: int, h: int):
+            # Builds a subtree of height `h` with `m` nodes.
+            if h == 1:
+                levels.extend([0] * m)
+                return
+            # We use the shortest top list such that the children can hold
+            # the remaining nodes, and then split them as evenly as possible.
+            c = 1
+            while m - c > (c + 1) * max_nodes[h-1]:
+                c += 1
+            q, r = divmod(m - c, c + 1)
+            for j in range(c + 1):
+                sub(q + 1 if j < r else q, h - 1)
+                if j < c:
+                    levels.append(h - 1)
+
+        if height > 0:
+            sub(n, height)
+        return levels
+
+    def _sorted_levels(self, keys: Sequence[K]) -> list[int]:
+        """Levels (in key order) used by `build_sorted`."""
+        return self._balanced_levels(len(keys), self._max_list_len)
+
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]):
+        """Creates and links the nodes of a valid tree, given their keys,
+        values and levels in key order, in one linear pass.
+        NOTE:
+        - The tree must be empty.
+        - The shape is fully determined by the levels: the first node of the
+          highest list in any key interval is the root of the subtree for that
+          interval, so this is just the usual construction of a Cartesian tree
+          (where later nodes at the same level become high right nodes).
+        """
+        assert self._root.right is None
+        stack: list[_DNode[K, V]] = []          # rightmost path
+        stack_levels: list[int] = []
+        n = 0
+        new_node = self._new_node
+        with gc_paused():
+            for key, val, level in zip(keys, vals, levels):
+                node = new_node(key, val)
+                last = None
+                while stack_levels and stack_levels[-1] < level:
+                    last = stack.pop()
+                    stack_levels.pop()
+                node.left = last
+                if stack:
+                    top = stack[-1]
+                    top.right = node
+                    top.high_right = stack_levels[-1] == level
+                stack.append(node)
+                stack_levels.append(level)
+                n += 1
+        if stack:
+            self._root.right = stack[0]
+        self._len = n
+
+    def build_sorted(self, keys: Sequence[K], vals: Sequence[V]):
+        """Fills the (empty) tree with the pairs (keys[i], vals[i]) in O(n).
+        NOTE: `keys` must be strictly increasing.
+        """
+        if len(keys) != len(vals):
+            raise ValueError("keys and vals must have the same length")
+        for i in range(1, len(keys)):
+            if not (keys[i-1] < keys[i]):
+                raise ValueError("keys must be strictly increasing")
+        if self._root.right is not None:
+            raise ValueError("the tree must be empty")
+        self._link_sorted(keys, vals, self._sorted_levels(keys))
+
     def _pretty_print_sub(
         self, cur: _DNode[K, V], level: int, elem_width: int, *,
         from_level: int | None=None, to_level: int | None=None,
@@ -20,3 +20,34 @@ class _DNode(Node[K, V]):
     # generic interface
     def right_level(self, cur_level: int):
         return cur_level if self.high_right else cur_level - 1
+
+# The helpers below see a list at level L as its nodes n_1, ..., n_m and its
+# m+1 children c_0, ..., c_m (the heads of the lists at level L-1, in key
+# order), where c_{i-1} = n_i.left and c_m = n_m.right (not high).
+
+def list_of(head: _DNode) -> tuple[list[_DNode], list[_DNode | None]]:
+    """Returns the nodes and children of the list starting at `head`."""
+    nodes = [head]
+    children = [head.left]
+    cur = head
+    while cur.high_right and cur.right is not None:
+        cur = cur.right
+        nodes.append(cur)
+        children.append(cur.left)
+    children.append(cur.right)
+    return nodes, children
+
+def link_list(nodes: list[_DNode],
+              children: list[_DNode | None]) -> _DNode | None:
+    """Links `nodes` into a list with children `children` and returns its
+    head.
+    NOTE: If there are no nodes, the list is just a *hole* and we return the
+        only child.
+    """
+    if not nodes:
+        return children[0]
+    for i, node in enumerate(nodes):
+        node.left = children[i]
+        node.right = nodes[i+1] if i+1 < len(nodes) else children[-1]
+        node.high_right = i+1 < len(nodes)
+    return nodes[0]
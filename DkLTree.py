@@ -0,0 +1,360 @@
+# Single-threaded version of k-Lexi Trees, where k is chosen at runtime.
+
+# NOTE:
+# - Unlike D2LTree and D3LTree, which rebalance with a few pointer updates,
+#   this works a list at a time: the lists involved are collected as Python
+#   lists of nodes and children, modified, and relinked (see DLTree_misc.py).
+#   This costs O(k) per list touched, which is fine for small values of k.
+# - Bottom-up mode (as in D2LTree): we insert/remove at level 0 and then fix
+#   the overflows/holes going up along the search path.
+# - Top-down mode (as in D3LTree): we split the full lists (insertions) or
+#   fill the lists with a single node (deletions) while going down, so that
+#   nothing needs fixing at the bottom. This requires k >= 3.
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Final, Literal
+from generic import K, V, T, Tree
+from DLTree_misc import _DNode, link_list, list_of
+from DLTree import DLTree
+from liftk import lift
+from lowerk import lower
+from misc import _Missing, _missing
+
+Mode = Literal['bottom_up', 'top_down']
+
+@dataclass
+class _ListFrame:
+    """A list along the search path (only used in top-down mode)."""
+    nodes: list[_DNode]
+    children: list[_DNode | None]
+    slot: int           # which child of the parent list this list is
+
+class DkLTree(DLTree[K, V], Tree[K, V]):
+    k: Final[int]
+    mode: Final[Mode]
+
+    def __init__(self, any_key: K, any_val: V, *, k: int = 2,
+                 mode: Mode = 'bottom_up'):
+        if k < 2:
+            raise ValueError("k must be at least 2")
+        if mode == 'top_down' and k < 3:
+            raise ValueError("top-down mode requires k >= 3")
+        if mode not in ('bottom_up', 'top_down'):
+            raise ValueError(f"unknown mode {mode!r}")
+        super().__init__(any_key, any_val)
+        self.k = k
+        self.mode = mode
+        self._max_list_len = k
+
+    # The path helpers are for bottom-up mode. `path` contains the nodes
+    # along a search path, starting with the root.
+
+    @staticmethod
+    def _list_at(path: list[_DNode[K, V]], t: int) -> \
+            tuple[int, list[_DNode], list[_DNode | None]]:
+        """Returns (h, nodes, children) for the list containing path[t],
+        where path[h] is the head of the list."""
+        h = t
+        while h > 1 and path[h-1].high_right and path[h-1].right is path[h]:
+            h -= 1
+        nodes, children = list_of(path[h])
+        return h, nodes, children
+
+    def _attach(self, parent: _DNode[K, V], head: _DNode[K, V] | None,
+                left_side: bool):
+        if parent is self._root:
+            self._root.right = head
+        elif left_side:
+            parent.left = head
+        else:
+            parent.right = head
+            parent.high_right = False
+
+    @staticmethod
+    def _slot_of(path: list[_DNode[K, V]], h: int, parent_h: int) -> int:
+        """Returns which child of the parent list the list headed by path[h]
+        is (the parent list is headed by path[parent_h])."""
+        pos = h - 1 - parent_h          # position of path[h-1] in its list
+        return pos if path[h-1].left is path[h] else pos + 1
+
+    # The frame helpers are for top-down mode.
+
+    def _set_child(self, frames: list[_ListFrame], depth: int,
+                   head: _DNode[K, V] | None):
+        """Makes `head` the head of the list at `depth`."""
+        if depth == 0:
+            self._root.right = head
+            return
+        parent = frames[depth-1]
+        slot = frames[depth].slot
+        parent.children[slot] = head
+        if slot < len(parent.nodes):
+            parent.nodes[slot].left = head
+        else:
+            last = parent.nodes[-1]
+            last.right = head
+            last.high_right = False
+
+    @staticmethod
+    def _position(nodes: list[_DNode[K, V]], key: K) -> int:
+        """Returns the index of the first node with key >= `key`."""
+        i = 0
+        while i < len(nodes) and nodes[i].key < key:
+            i += 1
+        return i
+
+    def __setitem__(self, key: K, val: V):
+        """Inserts with replacement."""
+        if self.mode == 'bottom_up':
+            self._insert_bottom_up(key, val)
+        else:
+            self._insert_top_down(key, val)
+
+    def _insert_bottom_up(self, key: K, val: V):
+        path: list[_DNode[K, V]] = [self._root]
+        prev_cmp = -1
+        cur = self._root.right
+        while cur is not None:
+            path.append(cur)
+            if cur.key < key:
+                prev_cmp = -1
+                cur = cur.right
+            elif key < cur.key:
+                prev_cmp = 1
+                cur = cur.left
+            else:       # key already present
+                cur.val = val
+                return
+
+        key_node = self._new_node(key, val, path[-1])
+        self._len += 1
+        if len(path) == 1:              # empty tree
+            self._root.right = key_node
+            return
+
+        t = len(path) - 1
+        h, nodes, children = self._list_at(path, t)
+        pos = t - h + (1 if prev_cmp < 0 else 0)
+        nodes.insert(pos, key_node)
+        children.insert(pos, None)
+
+        # lifts the middle nodes of the lists that are too long, going up
+        k = self.k
+        while len(nodes) > k:
+            if h == 1:
+                # the top list: the tree gets taller
+                parent_nodes: list[_DNode] = []
+                parent_children: list[_DNode | None] = [path[1]]
+                lift(nodes, children, parent_nodes, parent_children, 0)
+                self._root.right = link_list(parent_nodes, parent_children)
+                return
+            parent_h, parent_nodes, parent_children = \
+                self._list_at(path, h - 1)
+            slot = self._slot_of(path, h, parent_h)
+            lift(nodes, children, parent_nodes, parent_children, slot)
+            h, nodes, children = parent_h, parent_nodes, parent_children
+        left_side = path[h-1].left is path[h]
+        self._attach(path[h-1], link_list(nodes, children), left_side)
+
+    def _insert_top_down(self, key: K, val: V):
+        head = self._root.right
+        if head is None:
+            self._root.right = self._new_node(key, val)
+            self._len += 1
+            return
+        nodes, children = list_of(head)
+        frames = [_ListFrame(nodes, children, 0)]
+        k = self.k
+        while True:
+            frame = frames[-1]
+            if len(frame.nodes) == k:
+                # splits the full list by lifting its middle node
+                if len(frames) == 1:
+                    parent = _ListFrame([], [frame.nodes[0]], 0)
+                    frames.insert(0, parent)
+                else:
+                    parent = frames[-2]
+                mid = frame.nodes[len(frame.nodes) // 2]
+                slot = frame.slot
+                left_nodes, left_children, right_nodes, right_children = \
+                    lift(frame.nodes, frame.children, parent.nodes,
+                         parent.children, slot)
+                self._set_child(frames, len(frames) - 2,
+                                link_list(parent.nodes, parent.children))
+                if key < mid.key:
+                    frames[-1] = _ListFrame(left_nodes, left_children, slot)
+                elif mid.key < key:
+                    frames[-1] = _ListFrame(right_nodes, right_children,
+                                            slot + 1)
+                else:
+                    mid.val = val
+                    return
+                continue
+            nodes, children = frame.nodes, frame.children
+            i = self._position(nodes, key)
+            if i < len(nodes) and not (key < nodes[i].key):
+                nodes[i].val = val
+                return
+            child = children[i]
+            if child is None:
+                # level 0: the list isn't full, so there's room
+                key_node = self._new_node(
+                    key, val, nodes[i] if i < len(nodes) else nodes[-1])
+                self._len += 1
+                nodes.insert(i, key_node)
+                children.insert(i, None)
+                self._set_child(frames, len(frames) - 1,
+                                link_list(nodes, children))
+                return
+            child_nodes, child_children = list_of(child)
+            frames.append(_ListFrame(child_nodes, child_children, i))
+
+    def __delitem__(self, key: K):
+        self.remove(key)
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        if self.mode == 'bottom_up':
+            key_node = self._remove_bottom_up(key)
+        else:
+            key_node = self._remove_top_down(key)
+        if key_node is None:
+            if default is _missing:
+                raise KeyError
+            return default
+        self._len -= 1
+        val = key_node.val
+        self._free_node(key_node)
+        return val
+
+    def _remove_bottom_up(self, key: K) -> _DNode[K, V] | None:
+        """Returns the removed node or None if not found."""
+        path, key_idx = self._removal_path(key)
+        if key_idx == 0:
+            return None
+        key_node = path[key_idx]
+        self._unlink(path, key_idx)
+        return key_node
+
+    def _removal_path(self, key: K) -> tuple[list[_DNode[K, V]], int]:
+        """Returns (path, key_idx), where path[key_idx] is the node with key
+        `key` (key_idx is 0 if not found) and path[-1] is the leaf that's
+        right key-before it, or the node itself if it's a leaf."""
+        path: list[_DNode[K, V]] = [self._root]
+        key_idx = 0
+        cur = self._root.right
+        while cur is not None:
+            path.append(cur)
+            if cur.key < key:
+                cur = cur.right
+            elif key < cur.key:
+                cur = cur.left
+            else:
+                key_idx = len(path) - 1
+                # goes to the leaf that's right key-before the key node
+                cur = cur.left
+                while cur is not None:
+                    path.append(cur)
+                    cur = cur.right
+                break
+        return path, key_idx
+
+    def _unlink(self, path: list[_DNode[K, V]], key_idx: int):
+        """Unlinks path[key_idx] and rebalances the tree (see
+        `_removal_path`)."""
+        key_node = path[key_idx]
+        t = len(path) - 1
+        h, nodes, children = self._list_at(path, t)
+        left_side = path[h-1].left is path[h]
+        leaf = path[t]
+        if leaf is key_node:
+            nodes.remove(key_node)
+        else:
+            # The leaf takes the place of the key node.
+            assert nodes[-1] is leaf
+            nodes.pop()
+            prev_key_node = path[key_idx-1]
+            leaf.left = key_node.left
+            leaf.right = key_node.right
+            leaf.high_right = key_node.high_right
+            if prev_key_node.right is key_node:
+                prev_key_node.right = leaf
+            else:
+                prev_key_node.left = leaf
+            path[key_idx] = leaf
+        children.pop()
+
+        # fixes the holes going up
+        while not nodes and h > 1:
+            hole = children[0]
+            parent_h, parent_nodes, parent_children = \
+                self._list_at(path, h - 1)
+            slot = self._slot_of(path, h, parent_h)
+            parent_children[slot] = hole
+            lower(parent_nodes, parent_children, slot, [], [hole], self.k)
+            left_side = path[parent_h-1].left is path[parent_h]
+            h, nodes, children = parent_h, parent_nodes, parent_children
+        self._attach(path[h-1], link_list(nodes, children), left_side)
+
+    def _remove_top_down(self, key: K) -> _DNode[K, V] | None:
+        """Returns the removed node or None if not found."""
+        head = self._root.right
+        if head is None:
+            return None
+        nodes, children = list_of(head)
+        frames = [_ListFrame(nodes, children, 0)]
+        key_node = None
+        key_depth = 0           # depth of the list containing the key node
+        while True:
+            frame = frames[-1]
+            nodes, children = frame.nodes, frame.children
+            i = self._position(nodes, key)
+            if i < len(nodes) and not (key < nodes[i].key):
+                key_node = nodes[i]
+                key_depth = len(frames) - 1
+            if children[i] is None:
+                break                   # level 0
+            child_nodes, child_children = list_of(children[i])  # type: ignore
+            if len(child_nodes) == 1:
+                # makes the child longer so that it can lose a node
+                lower(nodes, children, i, child_nodes, child_children, self.k)
+                if not nodes:
+                    # the top list became a hole: the tree gets shorter
+                    assert len(frames) == 1
+                    head = children[0]
+                    assert head is not None
+                    frames[0] = _ListFrame(*list_of(head), 0)
+                    self._root.right = head
+                else:
+                    self._set_child(frames, len(frames) - 1,
+                                    link_list(nodes, children))
+                continue                # looks at this list again
+            frames.append(_ListFrame(child_nodes, child_children, i))
+
+        if key_node is None:
+            return None
+        # NOTE: The lists below the top one have at least 2 nodes, so no hole
+        #   can be created.
+        leaf_frame = frames[-1]
+        if key_depth == len(frames) - 1:
+            leaf_frame.nodes.remove(key_node)
+        else:
+            # The last node of the leaf list takes the place of the key node.
+            leaf = leaf_frame.nodes.pop()
+            key_frame = frames[key_depth]
+            key_frame.nodes[key_frame.nodes.index(key_node)] = leaf
+            self._set_child(frames, key_depth,
+                            link_list(key_frame.nodes, key_frame.children))
+        leaf_frame.children.pop()
+        self._set_child(frames, len(frames) - 1,
+                        link_list(leaf_frame.nodes, leaf_frame.children))
+        return key_node
+
+    def _init_params(self) -> tuple[tuple[str, object], ...]:
+        """Returns the keyword arguments needed to recreate the tree (see
+        snapshot.py)."""
+        return (('k', self.k), ('mode', self.mode))
+
+    def _check(self):
+        """Checks whether the tree is valid."""
+        return super()._check(self.k)
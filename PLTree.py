@@ -8,10 +8,11 @@
 
 from __future__ import annotations
 from random import random
-from typing import Final, Generic, Tuple
+from typing import Any, Final, Generic, Iterable, Iterator, Sequence, Tuple
 from misc import *
 from misc import _Missing, _missing
 from generic import K, V, T, Node, Tree
+from key_hash import hash_level, hash_levels, key_hash
 
 MaxLevel: Final[int] = 100
 
@@ -44,18 +45,39 @@ class _PNode(Node[K, V]):
 
 class PLTree(Generic[K, V], Tree[K, V]):
     _p: float
+    _seed: int | None
     _root: Final[_PNode[K, V]]
     _maxLevel: int
     _len: int
 
-    def __init__(self, any_key: K, any_val: V, *, p=0.5):
-        """NOTE: `any_key` and `any_val` are needed for type stability, not
-        that Python cares about it.
+    def __init__(self, any_key: K, any_val: V, *, p=0.5,
+                 seed: int | None = None):
+        """NOTE:
+        - `any_key` and `any_val` are needed for type stability, not that
+          Python cares about it.
+        - If `seed` is given, the level of each node is derived from a seeded
+          hash of its key (see key_hash.py) instead of being random. The
+          shape of the tree then only depends on its keys (and on `p` and
+          `seed`), not on the order of the operations that produced it.
         """
         self._p = p
-        self._root = _PNode[K, V](any_key, any_val, MaxLevel + 1)
+        self._seed = seed
+        self._root = self._make_root(any_key, any_val)
         self._maxLevel = -1
         self._len = 0
+
+    # NOTE: The node hooks below let subclasses use their own nodes (see
+    #   BiasedPLTree.py).
+    def _make_root(self, any_key: K, any_val: V) -> _PNode[K, V]:
+        return _PNode[K, V](any_key, any_val, MaxLevel + 1)
+
+    def _new_node(self, key: K, val: V, level: int) -> _PNode[K, V]:
+        # NOTE: `_PNode` instead of `_PNode[K, V]` because it's faster.
+        return _PNode(key, val, level)
+
+    def _free_node(self, node: _PNode[K, V]):
+        """Called when `node` has been unlinked from the tree for good."""
+        pass
         
     @property
     def first(self):
@@ -80,9 +102,88 @@ class PLTree(Generic[K, V], Tree[K, V]):
             level += 1
         return level
     
+    def _hash_level(self, key: K) -> int:
+        # NOTE: Unlike `_rand_level`, this can't be capped at
+        #   `self._maxLevel + 1`, which depends on the history of the tree.
+        assert self._seed is not None
+        return hash_level(key_hash(key, self._seed), self._p, MaxLevel)
+
     def __len__(self):
         return self._len
 
+    def _path_buffer_len(self) -> int:
+        return 4*(self._maxLevel+1) + 3
+
+    @staticmethod
+    def _ruler_levels(n: int, base: int) -> list[int]:
+        """Returns the levels of a perfect skip list with `n` nodes: the i-th
+        node (from 1) has level j <=> base^j is the highest power of `base`
+        that divides i."""
+        levels = [0] * n
+        step = base
+        level = 1
+        while step <= n:
+            for i in range(step - 1, n, step):
+                levels[i] = level
+            step *= base
+            level += 1
+        return levels
+
+    def _sorted_levels(self, keys: Sequence[K]) -> list[int]:
+        """Levels (in key order) used by `build_sorted`."""
+        if self._seed is not None:
+            return hash_levels(keys, self._seed, self._p, MaxLevel)
+        return self._ruler_levels(len(keys), max(2, round(1/self._p)))
+
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]):
+        """Creates and links the nodes given their keys, values and levels in
+        key order, in one linear pass.
+        NOTE:
+        - The tree must be empty.
+        - Like a skip list, a P-Lexi tree is fully determined by its keys and
+          levels: the first node of highest level in any key interval is the
+          root of the subtree for that interval, so this is just the usual
+          construction of a Cartesian tree.
+        """
+        assert self._root.right is None
+        stack: list[_PNode[K, V]] = []          # rightmost path
+        n = 0
+        new_node = self._new_node
+        with gc_paused():
+            for key, val, level in zip(keys, vals, levels):
+                if level > MaxLevel:
+                    raise ValueError(f"level {level} > MaxLevel")
+                node = new_node(key, val, level)
+                last = None
+                while stack and stack[-1].level < level:
+                    last = stack.pop()
+                node.left = last
+                if stack:
+                    stack[-1].right = node
+                stack.append(node)
+                n += 1
+        if stack:
+            self._root.right = stack[0]
+            self._maxLevel = stack[0].level
+        self._len = n
+
+    def build_sorted(self, keys: Sequence[K], vals: Sequence[V]):
+        """Fills the (empty) tree with the pairs (keys[i], vals[i]) in O(n).
+        NOTE:
+        - `keys` must be strictly increasing.
+        - The levels are those of a perfect skip list rather than random ones
+          (unless the levels are hash-derived).
+        """
+        if len(keys) != len(vals):
+            raise ValueError("keys and vals must have the same length")
+        for i in range(1, len(keys)):
+            if not (keys[i-1] < keys[i]):
+                raise ValueError("keys must be strictly increasing")
+        if self._root.right is not None:
+            raise ValueError("the tree must be empty")
+        self._link_sorted(keys, vals, self._sorted_levels(keys))
+
     # Returns (prev, cur, prev_cmp, cur_cmp). If there's already a node with
     # key `key`, then `cur` is that node, otherwise it's the next node of a
     # hypothetical Node(k, l):
@@ -201,7 +302,9 @@ class PLTree(Generic[K, V], Tree[K, V]):
         self.insert(key, val)
         
     def insert(self, key: K, val: V, level: int | None = None):
-        level = self._rand_level() if level is None else level
+        if level is None:
+            level = self._rand_level() if self._seed is None else \
+                    self._hash_level(key)
 
         prev, cur, prev_cmp, cur_cmp = self._find_insertion_pos(key, level)
         if cur is not None and cur_cmp == 0:        # cur.key = key
@@ -218,7 +321,7 @@ class PLTree(Generic[K, V], Tree[K, V]):
             key_node.val = val
             return
 
-        new = _PNode[K, V](key, val, level)
+        new = self._new_node(key, val, level)
         
         # prev -> new
         if prev_cmp < 0:
@@ -308,8 +411,34 @@ class PLTree(Generic[K, V], Tree[K, V]):
         max_lvl = self._root.right.level if self._root.right is not None \
                     else -1
         self._maxLevel = max_lvl
-        return key_node.val
+        val = key_node.val
+        self._free_node(key_node)
+        return val
     
+    def _nodes(self) -> Iterator[_PNode[K, V]]:
+        """Yields the nodes in key order."""
+        stack: list[_PNode[K, V]] = []
+        cur = self._root.right
+        while True:
+            while cur is not None:
+                stack.append(cur)
+                cur = cur.left
+            if not stack:
+                return
+            cur = stack.pop()
+            yield cur
+            cur = cur.right
+
+    def same_shape(self, other: PLTree[K, Any]) -> bool:
+        """Returns whether the two trees have the same keys and the same
+        shape (the values are ignored).
+        NOTE: Two trees with hash-derived levels, the same `p` and the same
+        `seed` have the same shape iff they have the same keys."""
+        if len(self) != len(other):
+            return False
+        return all(a.level == b.level and not (a.key < b.key or b.key < a.key)
+                   for a, b in zip(self._nodes(), other._nodes()))
+
     @staticmethod
     def _check_sub(cur: _PNode[K, V], above_me: K | None = None,
                    below_me: K | None = None):
@@ -330,6 +459,9 @@ class PLTree(Generic[K, V], Tree[K, V]):
             return
         assert self._maxLevel == self._root.right.level
         self._check_sub(self._root.right)
+        if self._seed is not None:
+            for node in self._nodes():
+                assert node.level == self._hash_level(node.key)
     
     def _pretty_print_sub(self, cur: _PNode[K, V], elem_width):
         if cur.left is not None:
@@ -345,3 +477,14 @@ class PLTree(Generic[K, V], Tree[K, V]):
     def pretty_print(self, elem_width = 7):
         if self._root.right is not None:
             self._pretty_print_sub(self._root.right, elem_width)
+
+class _SetViaInsert:
+    """Mixin for the subclasses of PLTree whose mixins wrap `__setitem__` with
+    a `_set(method, key, val, *args)`: `__setitem__` calls `insert`, which can
+    also be called directly, so `insert` is wrapped instead."""
+
+    def __setitem__(self, key, val):
+        self.insert(key, val)                       # type: ignore
+
+    def insert(self, key, val, level: int | None = None):
+        self._set(super().insert, key, val, level)  # type: ignore
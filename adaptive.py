@@ -0,0 +1,177 @@
+# A tree that switches between P-Lexi, 2-Lexi and 3-Lexi trees depending on
+# the workload.
+#
+# NOTE:
+# - The cost of an operation is modeled as (cost per step) * (path length),
+#   where the cost per step depends on the kind of tree and of operation
+#   (see COSTS) and the path length is about PATH_FACTORS[kind] * log2(n).
+#   The default constants were measured with this implementation (CPython,
+#   200k random float keys), so they should be recalibrated elsewhere.
+# - Every `check_every` operations, we compare the expected cost of the
+#   recent mix of operations on each kind of tree. If another kind would
+#   save more than `margin` times the cost of a conversion over the next
+#   `horizon` operations (i.e. if we expect the current mix to last that
+#   long), we first measure the real path lengths of the current tree (with
+#   `path_length_stats`, which is O(n), but only done when a conversion is
+#   likely) and, if it's still worth it, convert the tree in O(n) by
+#   rebuilding it from its sorted items.
+# - The counts of operations are halved at each check, so older operations
+#   weigh less and less.
+
+from __future__ import annotations
+from math import log2
+from typing import Final, Generic, Iterator, Literal
+from generic import K, V, T, Tree, path_length_stats
+from misc import _Missing, _missing, notFound
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from PLTree import PLTree
+
+Kind = Literal['prob', 'det2', 'det3']
+OpType = Literal['get', 'set', 'del']
+
+TREE_CLASSES: Final[dict[Kind, type]] = {
+    'prob': PLTree, 'det2': D2LTree, 'det3': D3LTree,
+}
+
+# cost (in microseconds) per node along the path
+COSTS: Final[dict[Kind, dict[OpType, float]]] = {
+    'prob': {'get': 0.31, 'set': 0.61, 'del': 0.34},
+    'det2': {'get': 0.29, 'set': 0.78, 'del': 0.61},
+    'det3': {'get': 0.25, 'set': 0.73, 'del': 0.70},
+}
+
+# expected mean path length / log2(n)
+PATH_FACTORS: Final[dict[Kind, float]] = {
+    'prob': 1.5, 'det2': 1.04, 'det3': 1.04,
+}
+
+# cost (in microseconds) of a conversion per node
+CONVERSION_COST: Final[float] = 3.5
+
+class AdaptiveTree(Generic[K, V]):
+    """Wraps a PLTree, D2LTree or D3LTree and converts it to another of them
+    when that's expected to pay off (see the notes above).
+    NOTE: Read the tree through the AdaptiveTree, since `tree` changes at each
+        conversion.
+    """
+    tree: Tree[K, V]
+    kind: Kind
+    check_every: int
+    horizon: int
+    margin: float
+    num_conversions: int
+    _any_key: K
+    _any_val: V
+    _counts: dict[OpType, float]
+    _num_since_check: int
+
+    def __init__(self, any_key: K, any_val: V, *, kind: Kind = 'det2',
+                 check_every: int = 50_000, horizon: int = 1_000_000,
+                 margin: float = 2.):
+        self._any_key = any_key
+        self._any_val = any_val
+        self.kind = kind
+        self.tree = TREE_CLASSES[kind](any_key, any_val)
+        self.check_every = check_every
+        self.horizon = horizon
+        self.margin = margin
+        self.num_conversions = 0
+        self._counts = {'get': 0., 'set': 0., 'del': 0.}
+        self._num_since_check = 0
+
+    def _count(self, op: OpType):
+        self._counts[op] += 1
+        self._num_since_check += 1
+        if self._num_since_check >= self.check_every:
+            self._check_workload()
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __contains__(self, key: K) -> bool:
+        self._count('get')
+        return key in self.tree
+
+    def __getitem__(self, key: K) -> V:
+        self._count('get')
+        return self.tree[key]
+
+    def get(self, key: K, default: T | None = None) -> V | T | None:
+        self._count('get')
+        val = self.tree._find(key)          # type: ignore
+        return default if val is notFound else val
+
+    def __setitem__(self, key: K, val: V):
+        self._count('set')
+        self.tree[key] = val
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        self._count('del')
+        return self.tree.remove(key, default)
+
+    def __delitem__(self, key: K):
+        self.remove(key)
+
+    def items(self, from_key: K | _Missing = _missing,
+              to_key: K | _Missing = _missing) -> Iterator[tuple[K, V]]:
+        return self.tree.items(from_key, to_key)
+
+    def __iter__(self) -> Iterator[tuple[K, V]]:
+        return self.tree.items()
+
+    def expected_costs(self, mean_path_len: float | None = None) -> \
+            dict[Kind, float]:
+        """Returns the expected cost (in microseconds) of the recent mix of
+        operations, per operation, for each kind of tree.
+        NOTE: `mean_path_len`, if given, is used for the current kind."""
+        total = sum(self._counts.values())
+        if total == 0:
+            return {kind: 0. for kind in TREE_CLASSES}
+        log_n = log2(len(self.tree) + 2)
+        costs: dict[Kind, float] = {}
+        for kind, op_costs in COSTS.items():
+            path_len = PATH_FACTORS[kind] * log_n
+            if kind == self.kind and mean_path_len is not None:
+                path_len = mean_path_len
+            costs[kind] = path_len * sum(
+                op_costs[op] * count for op, count in self._counts.items()
+            ) / total
+        return costs
+
+    def _best_switch(self, costs: dict[Kind, float]) -> Kind | None:
+        """Returns the kind worth converting to, if any."""
+        best = min(costs, key=costs.__getitem__)
+        if best == self.kind:
+            return None
+        saving = (costs[self.kind] - costs[best]) * self.horizon
+        if saving <= self.margin * CONVERSION_COST * len(self.tree):
+            return None
+        return best
+
+    def _check_workload(self):
+        self._num_since_check = 0
+        best = self._best_switch(self.expected_costs())
+        if best is not None:
+            # confirms with the real shape of the current tree
+            stats = path_length_stats(self.tree)
+            best = self._best_switch(self.expected_costs(stats.mean_len))
+            if best is not None:
+                self.convert(best)
+        for op in self._counts:
+            self._counts[op] /= 2
+
+    def convert(self, kind: Kind):
+        """Converts the tree to `kind` in O(n)."""
+        if kind == self.kind:
+            return
+        keys: list[K] = []
+        vals: list[V] = []
+        for key, val in self.tree.items():
+            keys.append(key)
+            vals.append(val)
+        tree = TREE_CLASSES[kind](self._any_key, self._any_val)
+        tree.build_sorted(keys, vals)
+        self.tree = tree
+        self.kind = kind
+        self.num_conversions += 1
@@ -0,0 +1,203 @@
+# Trees with a counting Bloom filter in front of the lookups.
+#
+# NOTE:
+# - The filter holds the keys of the tree. It's kept up to date by the node
+#   hooks (`_new_node` and `_free_node`), like the index of hash_index.py.
+#   A counting filter (one byte per counter instead of one bit) is needed
+#   because keys are also removed.
+# - `_find` (and so `__contains__` and `__getitem__`) and `remove` check
+#   the filter first: a definite miss returns without walking the tree,
+#   while a hit (true or false) costs a little more than before.
+# - The filter doubles its size (and is rebuilt from the keys of the tree in
+#   O(n)) when the tree gets more than `capacity` keys. It doesn't shrink.
+#   The bulk builds (`_link_sorted`) size it beforehand.
+# - A counter that reaches 255 is never decremented (it could wrap around),
+#   which can only cause false positives.
+# - The index of the i-th counter of a key is (h1 + i*h2) mod m (double
+#   hashing), where h1 and h2 come from `hash(key)` (see `_hash`), so equal
+#   keys (e.g. 1 and 1.0) must have equal hashes, as for dicts.
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Final
+from generic import K, V, T, Tree
+from misc import NotFound, notFound
+from misc import _Missing, _missing
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree
+
+NUM_HASHES: Final[int] = 4
+_SALT: Final = 0x5BD1E995
+
+@dataclass
+class BloomStats:
+    capacity: int = 0
+    num_counters: int = 0
+    num_definite_misses: int = 0
+    num_false_positives: int = 0
+    num_resizes: int = 0
+
+    @property
+    def false_positive_rate(self) -> float:
+        """Among the keys that were not in the tree."""
+        num_misses = self.num_definite_misses + self.num_false_positives
+        return self.num_false_positives / num_misses if num_misses else 0.
+
+class _BloomFiltered:
+    """Mixin that puts a counting Bloom filter in front of the lookups of a
+    tree."""
+    _counters: bytearray
+    _counter_mask: int
+    _capacity: int
+    _counters_per_key: int
+    _num_keys: int
+    _num_definite_misses: int
+    _num_false_positives: int
+    _num_resizes: int
+
+    def __init__(self, *args, counters_per_key: int = 10,
+                 initial_capacity: int = 1024, **kwargs):
+        """NOTE: The number of counters is rounded up to a power of two, so
+        with 10 counters per key, there are 16 per key of capacity, and about
+        0.05% (right after a resize) to 0.25% (at full capacity) of the misses
+        are false positives."""
+        if counters_per_key < 1 or initial_capacity < 1:
+            raise ValueError(
+                "counters_per_key and initial_capacity must be positive")
+        self._counters_per_key = counters_per_key
+        self._num_keys = 0
+        self._num_definite_misses = 0
+        self._num_false_positives = 0
+        self._num_resizes = 0
+        self._alloc(initial_capacity)
+        super().__init__(*args, **kwargs)           # type: ignore
+
+    def _alloc(self, capacity: int):
+        num_counters = 1 << (capacity * self._counters_per_key - 1).bit_length()
+        self._counters = bytearray(num_counters)
+        self._counter_mask = num_counters - 1
+        self._capacity = capacity
+
+    @staticmethod
+    def _hash(key) -> int:
+        # NOTE: Hashing a tuple mixes the bits of hash(key) (which is the
+        #   identity for small ints) in C.
+        return hash((key, _SALT))
+
+    def _add(self, key, delta: int = 1):
+        x = self._hash(key)
+        h = x & self._counter_mask
+        step = (x >> 32) | 1
+        mask = self._counter_mask
+        counters = self._counters
+        for _ in range(NUM_HASHES):
+            if counters[h] < 255:
+                counters[h] += delta
+            h = (h + step) & mask
+
+    def _may_contain(self, key) -> bool:
+        # NOTE: Unrolled (for NUM_HASHES = 4), which is almost twice as fast
+        #   as the loop.
+        x = hash((key, _SALT))
+        mask = self._counter_mask
+        h = x & mask
+        step = (x >> 32) | 1
+        c = self._counters
+        if c[h] and c[(h + step) & mask] and c[(h + 2*step) & mask] and \
+                c[(h + 3*step) & mask]:
+            return True
+        self._num_definite_misses += 1
+        return False
+
+    def _resize(self):
+        """Doubles the capacity and refills the filter with the keys of the
+        tree."""
+        self._alloc(2 * self._capacity)
+        self._num_resizes += 1
+        stack = [self.first]                        # type: ignore
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                self._add(node.key)
+                stack.append(node.left)
+                stack.append(node.right)
+
+    def _new_node(self, key, val, *args):
+        # NOTE: The new node isn't linked yet, so the resizing must come
+        #   first.
+        if self._num_keys >= self._capacity:
+            self._resize()
+        node = super()._new_node(key, val, *args)   # type: ignore
+        self._add(key)
+        self._num_keys += 1
+        return node
+
+    def _free_node(self, node):
+        self._add(node.key, -1)
+        self._num_keys -= 1
+        super()._free_node(node)                    # type: ignore
+
+    def _link_sorted(self, keys, vals, levels):
+        # NOTE: The nodes are only reachable from the root at the end, so
+        #   the filter can't be resized in the meantime.
+        capacity = self._capacity
+        while capacity < len(keys):
+            capacity *= 2
+        if capacity != self._capacity:
+            self._alloc(capacity)
+        super()._link_sorted(keys, vals, levels)    # type: ignore
+
+    def _find(self, key) -> Any | NotFound:
+        if not self._may_contain(key):
+            return notFound
+        val = super()._find(key)                    # type: ignore
+        if val is notFound:
+            self._num_false_positives += 1
+        return val
+
+    def remove(self, key, default: T | _Missing = _missing):
+        if not self._may_contain(key):
+            if default is _missing:
+                raise KeyError
+            return default
+        val = super().remove(key, notFound)         # type: ignore
+        if val is notFound:
+            self._num_false_positives += 1
+            if default is _missing:
+                raise KeyError
+            return default
+        return val
+
+    def bloom_stats(self) -> BloomStats:
+        return BloomStats(
+            capacity=self._capacity,
+            num_counters=len(self._counters),
+            num_definite_misses=self._num_definite_misses,
+            num_false_positives=self._num_false_positives,
+            num_resizes=self._num_resizes,
+        )
+
+    def _check(self):
+        super()._check()                            # type: ignore
+        # every key must pass the filter
+        stack = [self.first]                        # type: ignore
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                assert self._may_contain(node.key)
+                stack.append(node.left)
+                stack.append(node.right)
+
+class BloomD2LTree(_BloomFiltered, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class BloomD3LTree(_BloomFiltered, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class BloomDkLTree(_BloomFiltered, DkLTree[K, V]):
+    pass
+
+class BloomPLTree(_BloomFiltered, PLTree[K, V]):
+    pass
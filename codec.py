@@ -0,0 +1,105 @@
+# Compact tagged binary encoding for keys and values.
+#
+# Every object is encoded as a 1-byte tag followed by its payload:
+#   N               None
+#   T / F           True / False
+#   i <q>           int that fits in 64 bits
+#   I <I> bytes     any other int (signed, little-endian)
+#   f <d>           float
+#   s <I> bytes     str (utf-8)
+#   b <I> bytes     bytes
+#   t <I> objs      tuple of encodable objects
+# Integers are little-endian. Only these types are supported so that the
+# encoding is stable across processes and machines (unlike pickle).
+
+from __future__ import annotations
+from struct import Struct
+from typing import Any, Tuple
+
+_U32: Struct = Struct('<I')
+_I64: Struct = Struct('<q')
+_F64: Struct = Struct('<d')
+
+_MIN_I64 = -(1 << 63)
+_MAX_I64 = (1 << 63) - 1
+
+def encode(obj: Any, out: bytearray):
+    """Appends the encoding of `obj` to `out`."""
+    t = type(obj)
+    if t is int:
+        if _MIN_I64 <= obj <= _MAX_I64:
+            out += b'i'
+            out += _I64.pack(obj)
+        else:
+            data = obj.to_bytes((obj.bit_length() + 8) // 8, 'little',
+                                signed=True)
+            out += b'I'
+            out += _U32.pack(len(data))
+            out += data
+    elif t is float:
+        out += b'f'
+        out += _F64.pack(obj)
+    elif t is str:
+        data = obj.encode()
+        out += b's'
+        out += _U32.pack(len(data))
+        out += data
+    elif obj is None:
+        out += b'N'
+    elif t is bool:
+        out += b'T' if obj else b'F'
+    elif t is bytes:
+        out += b'b'
+        out += _U32.pack(len(obj))
+        out += obj
+    elif t is tuple:
+        out += b't'
+        out += _U32.pack(len(obj))
+        for x in obj:
+            encode(x, out)
+    else:
+        raise TypeError(f"can't encode objects of type {t.__name__}")
+
+def encode_bytes(obj: Any) -> bytes:
+    out = bytearray()
+    encode(obj, out)
+    return bytes(out)
+
+def decode(buf: bytes | bytearray | memoryview, pos: int = 0) -> \
+        Tuple[Any, int]:
+    """Decodes the object starting at `buf[pos]` and returns
+        (obj, pos after obj).
+    """
+    tag = buf[pos]
+    pos += 1
+    if tag == 0x69:             # 'i'
+        return _I64.unpack_from(buf, pos)[0], pos + 8
+    if tag == 0x66:             # 'f'
+        return _F64.unpack_from(buf, pos)[0], pos + 8
+    if tag == 0x73:             # 's'
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        return bytes(buf[pos:pos+n]).decode(), pos + n
+    if tag == 0x4e:             # 'N'
+        return None, pos
+    if tag == 0x54:             # 'T'
+        return True, pos
+    if tag == 0x46:             # 'F'
+        return False, pos
+    if tag == 0x62:             # 'b'
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        return bytes(buf[pos:pos+n]), pos + n
+    if tag == 0x74:             # 't'
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(n):
+            x, pos = decode(buf, pos)
+            items.append(x)
+        return tuple(items), pos
+    if tag == 0x49:             # 'I'
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        return int.from_bytes(buf[pos:pos+n], 'little', signed=True), pos + n
+    raise ValueError(f"invalid tag {tag!r} at position {pos-1}")
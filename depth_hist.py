@@ -0,0 +1,265 @@
+# Trees that keep a histogram of the depths of their leaves.
+#
+# NOTE:
+# - As in `path_length_stats` and `get_path_lengths` (generic.py), a leaf is
+#   a node with at least one missing child, and its depth is the number of
+#   nodes on the path from the first node to it. `path_length_stats` and
+#   `path_length_quantiles` read the histogram in O(height), so the balance
+#   can be monitored at any time instead of walking the whole tree.
+# - The rebalancing (lift and lower) moves whole subtrees up or down, so it
+#   changes the depths of many leaves at once. The nodes of these trees
+#   record their old children the first time they are relinked during an
+#   operation (see relink_log.py). After the operation, only the nodes on the paths to the
+#   relinked (and created or freed) nodes are looked at, once with the old
+#   children and once with the new ones. The subtrees hanging from these
+#   paths are the same before and after, so their leaves are only counted
+#   again if they moved.
+# - The paths start from the first relinked node on the search path of the
+#   key, which is found by a second descent. A lift or lower at height h
+#   (in the B-tree) happens about once every 2^h operations and moves
+#   subtrees of about 2^h nodes (p^-h nodes and probability p^h for P-Lexi
+#   trees), so asymptotically an insertion or a removal only costs O(log n)
+#   more amortized. Lookups and updates of existing keys cost nothing more.
+# - The constant factor is large, though: writing the links of a node goes
+#   through `__setattr__`, which is slow in Python, and the changed paths are
+#   walked twice after each operation. With 100k random floats, insertions
+#   and removals are 5 to 9 times slower than in the plain trees (e.g. for
+#   D2LTree, 0.64s -> 4.6s for the insertions and 0.73s -> 5.2s for the
+#   removals). Reading the links (i.e. searching) isn't affected.
+# - If a relinked node isn't below the first one (which the trees here never
+#   do), the histogram is recomputed from scratch.
+
+from __future__ import annotations
+from math import sqrt
+from typing import Any, Iterable
+from generic import K, V, T, PathLenStats, Tree, hist_quantiles
+from misc import _Missing, _missing
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree, _SetViaInsert
+from relink_log import Changes, _LoggedDL, _LoggedPL, run_logged
+
+def _leaf_counts(top: Any) -> list[int]:
+    """Returns h, where h[d] is the number of leaves at depth d in the
+    subtree rooted at `top` (at depth 0)."""
+    counts = []
+    level = [top]
+    while level:
+        num_leaves = 0
+        next_level = []
+        for node in level:
+            left = node.left
+            right = node.right
+            if left is None:
+                num_leaves += 1
+                if right is not None:
+                    next_level.append(right)
+            else:
+                next_level.append(left)
+                if right is None:
+                    num_leaves += 1
+                else:
+                    next_level.append(right)
+        counts.append(num_leaves)
+        level = next_level
+    return counts
+
+def _add(counts: list[int], depth: int, delta: int):
+    while len(counts) <= depth:
+        counts.append(0)
+    counts[depth] += delta
+
+def _add_leaves(counts: list[int], top: Any, depth: int, sign: int):
+    for d, c in enumerate(_leaf_counts(top), depth):
+        _add(counts, d, sign * c)
+
+class _NotInSubtree(Exception):
+    pass
+
+def _count_paths(counts: list[int], start: Any, depth: int,
+                 targets: Iterable[Any], sign: int,
+                 log: dict[int, tuple[Any, Any, Any, Any]] | None = None) -> \
+        dict[int, tuple[Any, int]]:
+    """Adds `sign` to the counts of the leaves on the paths from `start` (at
+    depth `depth`) to the `targets`, and returns the subtrees hanging from
+    these paths (with their depths), by id.
+    NOTE: With `log`, the old children of the logged nodes are used."""
+    on_paths: dict[int, tuple[Any, Any, Any, int]] = {}
+    for x in targets:
+        key = x.key
+        cur, d = start, depth
+        while True:
+            if cur is None:
+                raise _NotInSubtree
+            entry = log.get(id(cur)) if log else None
+            _, left, right, _ = entry if entry is not None else \
+                                (cur, cur.left, cur.right, None)
+            on_paths[id(cur)] = (cur, left, right, d)
+            if cur is x:
+                break
+            cur = right if cur.key < key else left
+            d += 1
+    hanging: dict[int, tuple[Any, int]] = {}
+    if start is not None and not on_paths:
+        hanging[id(start)] = (start, depth)
+    for _, left, right, d in on_paths.values():
+        if left is None or right is None:
+            _add(counts, d, sign)
+        if left is not None and id(left) not in on_paths:
+            hanging[id(left)] = (left, d + 1)
+        if right is not None and id(right) not in on_paths:
+            hanging[id(right)] = (right, d + 1)
+    return hanging
+
+class _DepthTracked:
+    """Mixin that keeps the histogram of the depths of the leaves of a
+    tree."""
+    _depths: list[int]                  # _depths[d] = # of leaves at depth d
+
+    def __init__(self, *args, **kwargs):
+        self._depths = []
+        super().__init__(*args, **kwargs)           # type: ignore
+
+    def _recount(self):
+        self._depths = []
+        if self.first is not None:                  # type: ignore
+            _add_leaves(self._depths, self.first, 1, 1)     # type: ignore
+
+    def _run(self, method, key, *args):
+        ret, changes = run_logged(method, key, *args)
+        if changes is not None:
+            try:
+                self._update(key, changes)
+            except _NotInSubtree:                   # (not expected)
+                self._recount()
+        return ret
+
+    def _set(self, method, key, val, *args):
+        self._run(method, key, val, *args)
+
+    def _update(self, key, changes: Changes):
+        # The nodes whose value alone changed don't matter.
+        log = {id_: entry for id_, entry in changes.nodes.items()
+               if entry[3] is _missing or entry[0].left is not entry[1] or
+                  entry[0].right is not entry[2]}
+        if not log and not changes.freed:
+            return
+
+        # The changed subtree is that of the first relinked node on the search
+        # path of `key` (the nodes before it have the same old and new links),
+        # or the whole tree if the root was relinked.
+        root = self._root                           # type: ignore
+        top, depth = None, 1
+        if id(root) not in log:
+            cur = root.right
+            while cur is not None and id(cur) not in log:
+                if cur.key < key:
+                    cur = cur.right
+                elif key < cur.key:
+                    cur = cur.left
+                else:
+                    cur = None
+                depth += 1
+            if cur is None:
+                raise _NotInSubtree
+            top = cur
+
+        # Only the leaves of the nodes on the paths from `top` to the changed
+        # nodes are counted, in the old and in the new tree. The subtrees
+        # hanging from these paths are the same in both, but may have moved.
+        if top is None:
+            old_top, new_top = log[id(root)][2], root.right
+        else:
+            old_top = new_top = top
+        # (The created nodes are logged too, with a missing old value.)
+        relinked = [entry[0] for entry in log.values() if entry[0] is not root]
+        created = {id_ for id_, entry in log.items() if entry[3] is _missing}
+        freed = {id(node) for node in changes.freed}
+        counts = self._depths
+        old = _count_paths(
+            counts, old_top, depth,
+            [node for node in relinked if id(node) not in created] +
+            changes.freed, -1, log)
+        new = _count_paths(
+            counts, new_top, depth,
+            [node for node in relinked if id(node) not in freed], 1)
+        for id_, (node, old_depth) in old.items():
+            new_depth = new.pop(id_, (None, -1))[1]
+            if new_depth != old_depth:
+                for d, c in enumerate(_leaf_counts(node)):
+                    _add(counts, old_depth + d, -c)
+                    if new_depth >= 0:
+                        _add(counts, new_depth + d, c)
+        for node, new_depth in new.values():
+            _add_leaves(counts, node, new_depth, 1)
+        while counts and counts[-1] == 0:
+            counts.pop()
+
+    def __setitem__(self, key: K, val: V):
+        self._set(super().__setitem__, key, val)    # type: ignore
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        return self._run(super().remove, key, default)  # type: ignore
+
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]):
+        super()._link_sorted(keys, vals, levels)    # type: ignore
+        self._recount()
+
+    def depth_histogram(self) -> list[int]:
+        """Returns h, where h[d] is the number of leaves at depth d."""
+        return list(self._depths)
+
+    def path_length_stats(self) -> PathLenStats:
+        """Same as `path_length_stats(self)` (generic.py), in O(height)."""
+        counts = self._depths
+        num_leaves = sum(counts)
+        if num_leaves == 0:
+            return PathLenStats()
+        min_len = next(d for d, c in enumerate(counts) if c)
+        mean_len = sum(d*c for d, c in enumerate(counts)) / num_leaves
+        var = sum(c*(d - mean_len)**2 for d, c in enumerate(counts))
+        return PathLenStats(
+            min_len=min_len,
+            max_len=len(counts) - 1,
+            num_leaves=num_leaves,
+            mean_len=mean_len,
+            std_len=sqrt(var / num_leaves)
+        )
+
+    def path_length_quantiles(self, qs: Iterable[float]) -> list[float]:
+        """Same as `np.quantile(get_path_lengths(self), qs)` (with the
+        default linear interpolation), in O(height) per quantile."""
+        if not self._depths:
+            raise ValueError("the tree is empty")
+        return hist_quantiles(self._depths, qs)
+
+    def _check(self):
+        super()._check()                            # type: ignore
+        depths = self._depths
+        self._recount()
+        assert self._depths == depths, (self._depths, depths)
+
+class DepthTrackedD2LTree(_DepthTracked, _LoggedDL, D2LTree[K, V],
+                          Tree[K, V]):
+    """A D2LTree that keeps the histogram of the depths of its leaves.
+    NOTE: Insertions and removals are about 7 times slower than in D2LTree
+        (see the top of the file)."""
+
+class DepthTrackedD3LTree(_DepthTracked, _LoggedDL, D3LTree[K, V],
+                          Tree[K, V]):
+    """A D3LTree that keeps the histogram of the depths of its leaves.
+    NOTE: Insertions are about 8 times slower than in D3LTree, and removals
+        about 6 times."""
+
+class DepthTrackedDkLTree(_DepthTracked, _LoggedDL, DkLTree[K, V]):
+    """A DkLTree that keeps the histogram of the depths of its leaves.
+    NOTE: Insertions and removals are about 5 times slower than in DkLTree
+        (k=4)."""
+
+class DepthTrackedPLTree(_SetViaInsert, _DepthTracked, _LoggedPL,
+                         PLTree[K, V]):
+    """A PLTree that keeps the histogram of the depths of its leaves.
+    NOTE: Insertions are about 5 times slower than in PLTree, and removals
+        (which are cheap in PLTree) about 9 times."""
@@ -0,0 +1,101 @@
+# Trees that keep a digest of their content.
+#
+# NOTE:
+# - The digest is the sum, modulo 2^128, of a 128-bit BLAKE2b hash of each
+#   (key, value) pair (encoded with codec.py). Since a sum doesn't depend on
+#   the order of its terms, two trees with the same pairs have the same
+#   digest, whatever their types, shapes and histories, and the digest is
+#   updated in O(1) when a pair is added, replaced or removed.
+# - `pair_digest` and `content_digest` compute the same digests outside of
+#   the trees, so a harness can keep a running digest of what it expects
+#   instead of a copy of the whole content.
+# - Integral floats (keys or values) are hashed as ints, so that, as in the
+#   trees, 2 and 2.0 are the same key (but not inside tuples, as in
+#   key_hash.py).
+# - The trees replace the values of existing keys in place, so `__setitem__`
+#   looks the key up first to get the old value, which costs one more search
+#   per insertion. The removals go through the node hook (`_free_node`) and
+#   the bulk builds (`_link_sorted`) recompute the digest in O(n).
+# - The pair is encoded before the tree is modified, so a key or value that
+#   codec.py can't encode is rejected (TypeError) without side effects.
+#   Values modified in place (e.g. lists) aren't seen.
+# - Equal digests mean equal contents with probability about 1 - 2^-128 for
+#   contents that aren't chosen to collide (the digest isn't meant to resist
+#   an adversary).
+
+from __future__ import annotations
+from hashlib import blake2b
+from typing import Any, Final, Iterable
+from codec import encode_bytes
+from generic import K, V, Tree
+from misc import notFound
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree, _SetViaInsert
+
+DIGEST_MOD: Final[int] = 1 << 128
+
+def _normalize(x: Any) -> Any:
+    return int(x) if type(x) is float and x.is_integer() else x
+
+def pair_digest(key: Any, val: Any) -> int:
+    """Returns the hash of a (key, value) pair, in [0, DIGEST_MOD).
+    NOTE: Raises TypeError if `key` or `val` can't be encoded with codec.py."""
+    data = encode_bytes((_normalize(key), _normalize(val)))
+    return int.from_bytes(blake2b(data, digest_size=16).digest(), 'little')
+
+def content_digest(items: Iterable[tuple[Any, Any]]) -> int:
+    """Returns the digest of the (key, value) pairs in `items` (e.g.
+    `d.items()` for a dict `d`), which must have distinct keys."""
+    return sum(pair_digest(key, val) for key, val in items) % DIGEST_MOD
+
+class _Digested:
+    """Mixin that keeps the digest of the content of a tree."""
+    _digest: int
+
+    def __init__(self, *args, **kwargs):
+        self._digest = 0
+        super().__init__(*args, **kwargs)           # type: ignore
+
+    def digest(self) -> int:
+        """Returns the digest of the (key, value) pairs of the tree (see
+        `content_digest`), in O(1)."""
+        return self._digest
+
+    def _set(self, method, key, val, *args):
+        new = pair_digest(key, val)
+        old = self._find(key)                       # type: ignore
+        method(key, val, *args)
+        if old is not notFound:
+            new -= pair_digest(key, old)
+        self._digest = (self._digest + new) % DIGEST_MOD
+
+    def __setitem__(self, key: K, val: V):
+        self._set(super().__setitem__, key, val)    # type: ignore
+
+    def _free_node(self, node):
+        self._digest = \
+            (self._digest - pair_digest(node.key, node.val)) % DIGEST_MOD
+        super()._free_node(node)                    # type: ignore
+
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]):
+        super()._link_sorted(keys, vals, levels)    # type: ignore
+        self._digest = content_digest(self.items())     # type: ignore
+
+    def _check(self):
+        super()._check()                            # type: ignore
+        assert self._digest == content_digest(self.items())  # type: ignore
+
+class DigestD2LTree(_Digested, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class DigestD3LTree(_Digested, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class DigestDkLTree(_Digested, DkLTree[K, V]):
+    pass
+
+class DigestPLTree(_SetViaInsert, _Digested, PLTree[K, V]):
+    pass
@@ -290,13 +290,12 @@ def init_tree(_type: Literal['p', 'd2', 'd3'], num_nodes: int,
     tree: Tree[int, int]
     
     from pathlib import Path
-    from dill import dump, load
+    from snapshot import load, save
 
-    fpath = Path("data") / f"{_type}_tree_{num_nodes}.dat"
+    fpath = Path("data") / f"{_type}_tree_{num_nodes}.snap"
     if fpath.exists() and reload:
         print('loading tree...', end='')
-        with open(str(fpath), 'rb') as f:
-            tree = load(f)
+        tree = load(fpath)
         print('done')
     else:
         # inserts some nodes
@@ -306,8 +305,7 @@ def init_tree(_type: Literal['p', 'd2', 'd3'], num_nodes: int,
         for _ in range(num_nodes):
             k = floor(random() * (max_key + 1))
             tree[k] = 0
-        with open(str(fpath), 'wb') as f:
-            dump(tree, f)
+        save(tree, fpath)
         print('done')
     return tree
 
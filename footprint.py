@@ -0,0 +1,257 @@
+# Lock footprints of the operations of the trees, and a simulator of their
+# concurrent execution.
+#
+# DOC.md only conjectures that 3-Lexi trees would do better than 2-Lexi
+# trees with many threads, because their rebalancing touches fewer nodes.
+# This gives numbers for it before writing any concurrent version:
+# 1. A traced tree records, for each operation, the nodes it reads and
+#    writes and when: time is counted in node accesses (attribute reads and
+#    writes) since the start of the operation, and each node is touched in a
+#    window [first, last].
+# 2. `simulate` replays a trace on N threads, as if each node had a
+#    readers-writer lock held during its window. The operations start in
+#    the order of the trace, each on the first free thread, at the earliest
+#    time at which none of its windows overlaps a conflicting window
+#    (a write on either side) of an operation already started.
+#
+# NOTE:
+# - This is an optimistic model: no deadlocks, no retries, no lock
+#   overhead and no other shared state (like the size of the tree). It
+#   compares the variants rather than predicting real speedups.
+# - The nodes are identified by `id`, which can be reused after a node is
+#   freed, which can only add a few spurious conflicts.
+# - Reading the attributes of the traced nodes goes through a Python
+#   `__getattribute__`, so the traced trees are very slow (even when
+#   `tracing` is False). They are only meant for recording traces.
+
+from __future__ import annotations
+from dataclasses import dataclass
+import heapq
+from random import Random
+from typing import Any, Literal
+from generic import K, V, T, Tree
+from misc import NotFound
+from misc import _Missing, _missing
+from DLTree_misc import _DNode
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import MaxLevel, PLTree, _PNode
+
+OpType = Literal['get', 'set', 'del']
+
+@dataclass
+class OpFootprint:
+    op: OpType
+    key: Any
+    num_steps: int                      # node accesses
+    # id(node) -> (first access, last access, written?)
+    nodes: dict[int, tuple[int, int, bool]]
+
+class _Recorder:
+    __slots__ = ('num_steps', 'nodes')
+    num_steps: int
+    nodes: dict[int, list]              # id(node) -> [first, last, written]
+
+    def __init__(self):
+        self.num_steps = 0
+        self.nodes = {}
+
+    def touch(self, node: Any, written: bool):
+        step = self.num_steps
+        self.num_steps = step + 1
+        entry = self.nodes.get(id(node))
+        if entry is None:
+            self.nodes[id(node)] = [step, step, written]
+        else:
+            entry[1] = step
+            if written:
+                entry[2] = True
+
+# recorder of the current operation
+_recorder: _Recorder | None = None
+
+def _traced_getattribute(self, name: str) -> Any:
+    if _recorder is not None:
+        _recorder.touch(self, False)
+    return object.__getattribute__(self, name)
+
+def _traced_setattr(self, name: str, value: Any):
+    if _recorder is not None:
+        _recorder.touch(self, True)
+    object.__setattr__(self, name, value)
+
+class _TDNode(_DNode[K, V]):
+    __getattribute__ = _traced_getattribute
+    __setattr__ = _traced_setattr
+
+class _TPNode(_PNode[K, V]):
+    __getattribute__ = _traced_getattribute
+    __setattr__ = _traced_setattr
+
+class _Traced:
+    """Mixin that records the footprint of each operation of a tree."""
+    tracing: bool
+    trace: list[OpFootprint]
+
+    def __init__(self, *args, tracing: bool = True, **kwargs):
+        self.tracing = tracing
+        self.trace = []
+        super().__init__(*args, **kwargs)           # type: ignore
+
+    def reset_trace(self):
+        self.trace = []
+
+    def _run(self, op: OpType, method, key, *args):
+        global _recorder
+        if not self.tracing or _recorder is not None:   # (or nested)
+            return method(key, *args)
+        recorder = _recorder = _Recorder()
+        try:
+            return method(key, *args)
+        finally:
+            _recorder = None
+            self.trace.append(OpFootprint(
+                op, key, recorder.num_steps,
+                {id_: tuple(entry)              # type: ignore
+                 for id_, entry in recorder.nodes.items()}))
+
+    # NOTE: `__contains__` and `__getitem__` call `_find`.
+    def _find(self, key: K) -> V | NotFound:
+        return self._run('get', super()._find, key)     # type: ignore
+
+    def __setitem__(self, key: K, val: V):
+        self._run('set', super().__setitem__, key, val) # type: ignore
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        return self._run('del', super().remove, key,    # type: ignore
+                         default)
+
+class _TracedDL(_Traced):
+    def _make_root(self, any_key, any_val):
+        return _TDNode(any_key, any_val, high_right=False)
+
+    def _new_node(self, key, val, near=None):
+        return _TDNode(key, val)
+
+class TracedD2LTree(_TracedDL, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class TracedD3LTree(_TracedDL, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class TracedDkLTree(_TracedDL, DkLTree[K, V]):
+    pass
+
+class TracedPLTree(_Traced, PLTree[K, V]):
+    def _make_root(self, any_key, any_val):
+        return _TPNode(any_key, any_val, MaxLevel + 1)
+
+    def _new_node(self, key, val, level):
+        return _TPNode(key, val, level)
+
+def record_trace(tree: Any, *, num_keys: int, num_ops: int,
+                 get_frac: float = 0.5, seed: int | None = None) -> \
+        list[OpFootprint]:
+    """Fills the (traced) `tree` with `num_keys` random keys without
+    tracing, and returns the trace of `num_ops` random operations: a
+    fraction `get_frac` of lookups, and insertions and removals of random
+    keys in equal numbers otherwise."""
+    rng = Random(seed)
+    keys = [rng.random() for _ in range(num_keys)]
+    tree.tracing = False
+    for key in keys:
+        tree[key] = key
+    tree.reset_trace()
+    tree.tracing = True
+    for _ in range(num_ops):
+        r = rng.random()
+        if r < get_frac or not keys:
+            tree._find(keys[rng.randrange(len(keys))] if keys else 0.)
+        elif r < (1 + get_frac) / 2:
+            key = rng.random()
+            keys.append(key)
+            tree[key] = key
+        else:
+            i = rng.randrange(len(keys))
+            keys[i], keys[-1] = keys[-1], keys[i]
+            tree.remove(keys.pop())
+    tree.tracing = False
+    return tree.trace
+
+@dataclass
+class SimStats:
+    num_threads: int = 0
+    num_ops: int = 0
+    num_delayed: int = 0                # operations that waited for a lock
+    total_delay: int = 0                # in steps
+    sequential_time: int = 0            # (sum of the durations)
+    makespan: int = 0
+
+    @property
+    def conflict_rate(self) -> float:
+        return self.num_delayed / self.num_ops if self.num_ops else 0.
+
+    @property
+    def speedup(self) -> float:
+        return self.sequential_time / self.makespan if self.makespan else 0.
+
+def simulate(trace: list[OpFootprint], num_threads: int, *,
+             shared_reads: bool = True) -> SimStats:
+    """Replays `trace` on `num_threads` threads (see the top of the file).
+    NOTE: With `shared_reads=False`, the locks are mutexes (every access
+    counts as a write)."""
+    if num_threads < 1:
+        raise ValueError("num_threads must be positive")
+    stats = SimStats(num_threads=num_threads, num_ops=len(trace))
+    free_at = [0] * num_threads                 # (a heap)
+    # id(node) -> windows (start, end, written) of the started operations
+    windows: dict[int, list[tuple[int, int, bool]]] = {}
+    for i, fp in enumerate(trace):
+        ready = heapq.heappop(free_at)
+        if i % 1024 == 0:
+            # No operation will start before `ready`, so the windows that
+            # end before it can't conflict anymore.
+            for id_ in list(windows):
+                kept = [w for w in windows[id_] if w[1] >= ready]
+                if kept:
+                    windows[id_] = kept
+                else:
+                    del windows[id_]
+        start = ready
+        moved = True
+        while moved:
+            moved = False
+            for id_, (first, last, written) in fp.nodes.items():
+                written = written or not shared_reads
+                for a, b, w in windows.get(id_, ()):
+                    if (written or w) and a <= start + last and \
+                            start + first <= b:
+                        start = b - first + 1
+                        moved = True
+        if start > ready:
+            stats.num_delayed += 1
+            stats.total_delay += start - ready
+        for id_, (first, last, written) in fp.nodes.items():
+            windows.setdefault(id_, []).append(
+                (start + first, start + last,
+                 written or not shared_reads))
+        end = start + fp.num_steps
+        heapq.heappush(free_at, end)
+        stats.sequential_time += fp.num_steps
+        stats.makespan = max(stats.makespan, end)
+    return stats
+
+if __name__ == "__main__":
+    num_keys = 100_000
+    num_ops = 20_000
+    for name, cls in (('det2', TracedD2LTree), ('det3', TracedD3LTree),
+                      ('prob', TracedPLTree)):
+        for get_frac in (0.5, 0.9):
+            trace = record_trace(cls(0., 0.), num_keys=num_keys,
+                                 num_ops=num_ops, get_frac=get_frac, seed=45)
+            for num_threads in (2, 4, 8, 16):
+                s = simulate(trace, num_threads)
+                print(f'{name} gets={get_frac:.0%} threads={num_threads:2}: '
+                      f'speedup = {s.speedup:5.2f}, '
+                      f'conflicts = {s.conflict_rate:.1%}')
@@ -1,11 +1,18 @@
 from __future__ import annotations
 from abc import abstractmethod
-from dataclasses import dataclass
-from math import sqrt
-from random import random
-from typing import Any, Generic, Protocol, Sized, TypeVar
+from array import array
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass, field
+from math import atan, cos, floor, pi, sin, sqrt, tan
+from random import Random, random
+from sys import getsizeof
+import tracemalloc
+from typing import (
+    Any, Final, Generic, Iterable, Iterator, Protocol, Sequence, Sized, TypeVar
+)
 from typing_extensions import Self
-from misc import _Missing, _missing
+from misc import _Missing, _missing, default
 import numpy as np
 
 K = TypeVar('K', bound='WithLessThan')
@@ -64,6 +71,209 @@ class Tree(Sized, Protocol[K, V]):
     @abstractmethod
     def pretty_print(self, elem_width = 7): ...
 
+    @abstractmethod
+    def build_sorted(self, keys: Sequence[K], vals: Sequence[V]): ...
+
+    @abstractmethod
+    def _sorted_levels(self, keys: Sequence[K]) -> Sequence[int]: ...
+
+    @abstractmethod
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]): ...
+
+    def items(self, from_key: K | _Missing = _missing,
+              to_key: K | _Missing = _missing) -> Iterator[tuple[K, V]]:
+        """Yields the pairs (key, val) with from_key <= key <= to_key in key
+        order. A missing bound means no bound.
+        NOTE: The tree must not be modified during the iteration.
+        """
+        stack: list[Node[K, V]] = []
+        cur = self.first
+        while True:
+            # Goes down-left, skipping the nodes (and their left subtrees)
+            # that come before `from_key`.
+            while cur is not None:
+                if from_key is not _missing and cur.key < from_key:
+                    cur = cur.right
+                else:
+                    stack.append(cur)
+                    cur = cur.left
+            if not stack:
+                return
+            cur = stack.pop()
+            if to_key is not _missing and to_key < cur.key:
+                return
+            yield cur.key, cur.val
+            cur = cur.right
+
+    def __iter__(self) -> Iterator[tuple[K, V]]:
+        return self.items()
+
+    def parallel_scan(self, fn, reducer, workers: int | None = None, **kwargs):
+        """See parallel_scan.parallel_scan."""
+        from parallel_scan import parallel_scan
+        return parallel_scan(self, fn, reducer, workers, **kwargs)
+
+    def to_arrays(self, lo: K | _Missing = _missing,
+                  hi: K | _Missing = _missing, *, key_dtype: Any = None,
+                  val_dtype: Any = None) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the keys and the values with lo <= key <= hi, in key order,
+        as two arrays.
+        NOTE:
+        - The arrays are allocated for the whole tree and filled in one walk
+          (and trimmed if there are bounds).
+        - By default, the dtype of each array is that of its first element:
+          int64 or float64 for numbers, and object otherwise. The filled part
+          is converted if a later element doesn't fit: to float64 for a
+          float after ints, and to object otherwise (e.g. a str or a too big
+          int).
+        """
+        count = len(self)
+        keys: np.ndarray | None = None      # allocated at the first pair
+        vals: np.ndarray | None = None
+        # the elements are checked only if the dtypes are inferred and numeric
+        check_keys = key_dtype is None
+        check_vals = val_dtype is None
+        key_types: set[type] = set()        # the types that fit
+        val_types: set[type] = set()
+        n = 0
+        stack: list[Node[K, V]] = []
+        cur = self.first
+        while True:
+            while cur is not None:
+                if lo is not _missing and cur.key < lo:
+                    cur = cur.right
+                else:
+                    stack.append(cur)
+                    cur = cur.left
+            if not stack:
+                break
+            cur = stack.pop()
+            key = cur.key
+            if hi is not _missing and hi < key:
+                break
+            val = cur.val
+            if keys is None or vals is None:
+                keys = np.empty(count, default(key_dtype, _infer_dtype(key)))
+                vals = np.empty(count, default(val_dtype, _infer_dtype(val)))
+                check_keys = check_keys and keys.dtype != object
+                check_vals = check_vals and vals.dtype != object
+                key_types.add(type(key))
+                val_types.add(type(val))
+            if check_keys and type(key) not in key_types:
+                keys = _refit(keys, n, key)
+                key_types.add(type(key))
+                check_keys = keys.dtype != object
+            if check_vals and type(val) not in val_types:
+                vals = _refit(vals, n, val)
+                val_types.add(type(val))
+                check_vals = vals.dtype != object
+            try:
+                keys[n] = key
+            except OverflowError:               # too big int
+                keys = _refit(keys, n, key)
+                check_keys = False
+                keys[n] = key
+            try:
+                vals[n] = val
+            except OverflowError:
+                vals = _refit(vals, n, val)
+                check_vals = False
+                vals[n] = val
+            n += 1
+            cur = cur.right
+        if keys is None or vals is None:
+            return (np.empty(0, default(key_dtype, object)),
+                    np.empty(0, default(val_dtype, object)))
+        if n < count:
+            keys = keys[:n].copy()
+            vals = vals[:n].copy()
+        return keys, vals
+
+    def from_arrays(self, keys: Any, vals: Any, *,
+                    presorted: bool = False) -> Self:
+        """Fills the (empty) tree with the pairs (keys[i], vals[i]) and
+        returns it.
+        NOTE:
+        - The pairs are sorted (and deduplicated, the last value winning)
+          with NumPy unless presorted=True, in which case the keys must be
+          strictly increasing.
+        - The nodes are created and linked in one pass (see `_link_sorted`).
+        """
+        keys = np.asarray(keys)
+        vals = np.asarray(vals)
+        if len(keys) != len(vals):
+            raise ValueError("keys and vals must have the same length")
+        if len(self) != 0:
+            raise ValueError("the tree must be empty")
+        if presorted:
+            if len(keys) > 1 and not np.all(keys[:-1] < keys[1:]):
+                raise ValueError("keys must be strictly increasing")
+        else:
+            # NOTE: Object keys come back as lists.
+            keys, vals = _sort_range(keys, vals)
+        levels = self._sorted_levels(keys)
+        self._link_sorted(
+            keys.tolist() if isinstance(keys, np.ndarray) else keys,
+            vals.tolist() if isinstance(vals, np.ndarray) else vals,
+            levels)
+        return self
+
+    def save(self, path):
+        """See snapshot.save."""
+        from snapshot import save
+        save(self, path)
+
+    def _path_buffer_len(self) -> int:
+        """Number of slots of the buffers an operation allocates to remember
+        its path (the nodes themselves are counted elsewhere)."""
+        return 2*self.get_height() + 1
+
+    def memory_report(self, *, max_nodes: int | None = None) -> MemoryReport:
+        """Returns the bytes used by the tree, by kind (see MemoryReport).
+        NOTE:
+        - This walks all the nodes, unless `max_nodes` is given, in which
+          case only that many nodes are walked and the sizes are
+          extrapolated (`estimated` is then True).
+        - Keys and values are counted once per distinct object, with
+          `sys.getsizeof` (so the objects they point to aren't counted).
+        - The auxiliary structures are the containers among the attributes
+          of the tree (e.g. the index of a HashIndexedD2LTree), counted with
+          `sys.getsizeof`, i.e. without the objects they hold, which are
+          usually nodes or keys."""
+        report = MemoryReport()
+        seen_keys: set[int] = set()
+        seen_vals: set[int] = set()
+        stack = [self.first] if self.first is not None else []
+        while stack:
+            if max_nodes is not None and report.num_nodes >= max_nodes:
+                break
+            node = stack.pop()
+            report.num_nodes += 1
+            report.node_bytes += _sizeof_node(node)
+            if id(node.key) not in seen_keys:
+                seen_keys.add(id(node.key))
+                report.key_bytes += getsizeof(node.key)
+            if id(node.val) not in seen_vals:
+                seen_vals.add(id(node.val))
+                report.val_bytes += getsizeof(node.val)
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+        if report.num_nodes < len(self):
+            scale = len(self) / report.num_nodes
+            report.node_bytes = round(report.node_bytes * scale)
+            report.key_bytes = round(report.key_bytes * scale)
+            report.val_bytes = round(report.val_bytes * scale)
+            report.num_nodes = len(self)
+            report.estimated = True
+        report.path_buffer_bytes = getsizeof([None] * self._path_buffer_len())
+        for name, attr in vars(self).items():
+            if isinstance(attr, _CONTAINERS):
+                report.aux_bytes[name] = getsizeof(attr)
+        return report
+
     def get_graph(self, *, from_level: int | None=None,
                 to_level: int | None=None, from_key: K | _Missing=_missing,
                 to_key: K | _Missing=_missing):
@@ -115,7 +325,8 @@ class Tree(Sized, Protocol[K, V]):
 
 def sample_path_lengths(tree: Tree[float, Any] | Tree[int, Any],
                         num_samples: int):
-    """NOTE: This assumes keys are uniformly distributed"""
+    """NOTE: This assumes keys are uniformly distributed (see
+    `estimate_path_lengths` for other distributions)."""
     lengths = [0] * num_samples
     if tree.first is None:
         return lengths
@@ -148,6 +359,119 @@ def sample_path_lengths(tree: Tree[float, Any] | Tree[int, Any],
         lengths[i] = count
     return lengths
 
+def _infer_dtype(x: Any) -> np.dtype:
+    """Returns the dtype of an array of elements like `x`: int64 (or that of
+    a NumPy scalar) for ints, float64 for floats, and object otherwise."""
+    if isinstance(x, (int, float, np.number)):
+        if isinstance(x, int) and not isinstance(x, bool) and \
+                not -2**63 <= x < 2**63:
+            return np.dtype(object)
+        return np.asarray(x).dtype
+    return np.dtype(object)
+
+def _refit(arr: np.ndarray, n: int, x: Any) -> np.ndarray:
+    """Returns a copy of `arr`, whose first `n` elements are filled, with a
+    dtype that fits `x` too (a wider numeric dtype or object)."""
+    dtype = np.promote_types(arr.dtype, _infer_dtype(x))
+    if dtype.kind not in 'biuf':
+        dtype = np.dtype(object)
+    out = np.empty(len(arr), dtype)
+    # NOTE: `tolist` so that an object array gets Python numbers.
+    out[:n] = arr[:n].tolist() if dtype == object else arr[:n]
+    return out
+
+_Column = Any           # np.ndarray or list
+
+def _is_array(x: Any) -> bool:
+    return isinstance(x, np.ndarray) and x.dtype != object
+
+def _tolist(x: _Column) -> list:
+    return x.tolist() if isinstance(x, np.ndarray) else list(x)
+
+def _sort_range(keys: _Column, vals: _Column) -> tuple[_Column, _Column]:
+    """Sorts the pairs by key and removes the duplicates (last value wins)."""
+    if _is_array(keys):
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        vals = np.asarray(vals)[order]
+        if len(keys) > 1:
+            last = np.ones(len(keys), dtype=bool)
+            last[:-1] = keys[1:] != keys[:-1]
+            keys = keys[last]
+            vals = vals[last]
+        return keys, vals
+    # NOTE: Lists, so that the values of an object array of keys don't come
+    #   back as NumPy scalars.
+    keys = _tolist(keys)
+    vals = _tolist(vals)
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    out_keys: list = []
+    out_vals: list = []
+    for i in order:
+        k = keys[i]
+        if out_keys and not (out_keys[-1] < k):
+            out_vals[-1] = vals[i]          # same key
+        else:
+            out_keys.append(k)
+            out_vals.append(vals[i])
+    return out_keys, out_vals
+
+@dataclass
+class MemoryReport:
+    num_nodes: int = 0
+    node_bytes: int = 0                 # the nodes, without keys and values
+    key_bytes: int = 0
+    val_bytes: int = 0
+    path_buffer_bytes: int = 0          # per operation (temporary)
+    aux_bytes: dict[str, int] = field(default_factory=dict)  # by attribute
+    estimated: bool = False
+
+    @property
+    def total_bytes(self) -> int:
+        return self.node_bytes + self.key_bytes + self.val_bytes + \
+               self.path_buffer_bytes + sum(self.aux_bytes.values())
+
+    @property
+    def bytes_per_key(self) -> float:
+        return self.total_bytes / self.num_nodes if self.num_nodes else 0.
+
+_CONTAINERS: Final = (dict, list, set, frozenset, tuple, deque, bytearray,
+                      bytes, array, np.ndarray)
+
+# type -> bytes allocated for a node of that type
+_node_sizes: dict[type, int] = {}
+
+def _sizeof_node(node: Node) -> int:
+    """Returns the bytes allocated for a node like `node`, without its key
+    and value.
+    NOTE:
+    - `sys.getsizeof` doesn't count the attributes of an object (and asking
+      for its `__dict__` can allocate one), so this measures, with
+      tracemalloc, the allocation of copies of the first node of each type
+      (which have the same attributes, set in the same order).
+    - All the nodes of a type are assumed to have the same attributes."""
+    cls = type(node)
+    size = _node_sizes.get(cls)
+    if size is None and cls.__dictoffset__ == 0:        # (no __dict__)
+        size = _node_sizes[cls] = getsizeof(node)
+    if size is None:
+        attrs = list(vars(node).items())
+        num_copies = 1000
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        copies = [cls.__new__(cls) for _ in range(num_copies)]
+        for copy in copies:
+            for name, val in attrs:
+                object.__setattr__(copy, name, val)
+        after = tracemalloc.get_traced_memory()[0]
+        if not was_tracing:
+            tracemalloc.stop()
+        size = (after - before - getsizeof(copies)) // num_copies
+        _node_sizes[cls] = size
+    return size
+
 @dataclass
 class PathLenStats:
     min_len: int = 0
@@ -223,3 +547,280 @@ def get_path_lengths(tree: Tree):
         sub(tree.first)
         return lengths[:i]
     return None
+
+def hist_quantiles(counts: Sequence[float], qs: Iterable[float]) -> \
+        list[float]:
+    """Returns `np.quantile(lengths, qs)` (with the default linear
+    interpolation), where `lengths` holds d counts[d] times.
+    NOTE: The counts can be estimates (floats)."""
+    num = sum(counts)
+    if num <= 0:
+        raise ValueError("no lengths")
+
+    def length_at(i: float) -> int:
+        # i-th smallest length
+        for d, c in enumerate(counts):
+            if i < c:
+                return d
+            i -= c
+        return len(counts) - 1          # (rounding errors)
+
+    res = []
+    for q in qs:
+        if not 0 <= q <= 1:
+            raise ValueError("quantiles must be in [0, 1]")
+        pos = q * max(num - 1, 0)
+        lo = floor(pos)
+        lo_len = length_at(lo)
+        frac = pos - lo
+        if frac:
+            res.append(lo_len + frac*(length_at(lo + 1) - lo_len))
+        else:
+            res.append(float(lo_len))
+    return res
+
+class KeyReservoir(Generic[K]):
+    """Uniform sample of (at most) `size` keys from a stream, e.g. of the
+    keys of the operations, for `estimate_path_lengths` (Algorithm R)."""
+    keys: list[K]
+    size: int
+    num_seen: int
+    _rng: Random
+
+    def __init__(self, size: int, seed: int | None = None):
+        if size < 1:
+            raise ValueError("size must be positive")
+        self.keys = []
+        self.size = size
+        self.num_seen = 0
+        self._rng = Random(seed)
+
+    def add(self, key: K):
+        self.num_seen += 1
+        if len(self.keys) < self.size:
+            self.keys.append(key)
+        else:
+            i = self._rng.randrange(self.num_seen)
+            if i < self.size:
+                self.keys[i] = key
+
+@dataclass
+class PathLenEstimate:
+    num_samples: int = 0
+    num_batches: int = 0
+    num_leaves: float = 0                   # (only without `keys`)
+    mean_len: float = 0
+    mean_len_ci: tuple[float, float] = (0, 0)
+    qs: list[float] = field(default_factory=list)
+    quantiles: list[float] = field(default_factory=list)
+    quantile_cis: list[tuple[float, float]] = field(default_factory=list)
+
+def _descend_at_random(first: Node, first_level: int, num_samples: int,
+                       rng: np.random.Generator, level_base: float) -> \
+        list[float]:
+    """Knuth's estimator: returns the estimated number of leaves at each
+    depth, from `num_samples` random descents from `first`.
+    NOTE:
+    - A descent goes to a child with a probability proportional to
+      level_base^level, a guess of the size of its subtree, so that the
+      leaves are reached with similar probabilities. A leaf reached with
+      probability P counts as 1/P leaves, which makes the estimate unbiased
+      (whatever the guesses).
+    - The descents are done together, level by level: each node only keeps
+      the number of descents that reached it, which are split between its
+      children in one call per level."""
+    hist = [0.]
+    level: list[tuple[Node, int, int, float]] = \
+        [(first, first_level, num_samples, 1.)]
+    while level:
+        counts = []
+        left_probs = []
+        for node, lvl, c, _ in level:
+            if node.left is not None and node.right is not None:
+                counts.append(c)
+                left_probs.append(1 / (1 + level_base ** (
+                    node.right_level(lvl) - node.left_level(lvl))))
+        num_lefts = iter(rng.binomial(counts, left_probs).tolist())
+        left_probs_it = iter(left_probs)
+        next_level = []
+        num_leaves = 0.
+        for node, lvl, c, w in level:
+            left, right = node.left, node.right
+            if left is None or right is None:
+                num_leaves += c * w
+                if left is not None:
+                    next_level.append((left, node.left_level(lvl), c, w))
+                elif right is not None:
+                    next_level.append((right, node.right_level(lvl), c, w))
+            else:
+                c_left = next(num_lefts)
+                p_left = next(left_probs_it)
+                if c_left:
+                    next_level.append(
+                        (left, node.left_level(lvl), c_left, w / p_left))
+                if c_left < c:
+                    next_level.append((right, node.right_level(lvl),
+                                       c - c_left, w / (1 - p_left)))
+        hist.append(num_leaves / num_samples)
+        level = next_level
+    return hist
+
+def _descend_with_keys(first: Node, keys: list) -> np.ndarray:
+    """Returns the lengths of the searches for `keys` (sorted), as in
+    `sample_path_lengths`.
+    NOTE: The searches are done together, level by level: each node only
+        keeps the slice of keys that reached it, which is split by
+        bisection."""
+    lengths = np.empty(len(keys), dtype=np.int64)
+    level: list[tuple[Node, int, int]] = [(first, 0, len(keys))]
+    depth = 1
+    while level:
+        next_level = []
+        for node, lo, hi in level:
+            # keys[lo:mid] <= node.key go left
+            mid = bisect_right(keys, node.key, lo, hi)
+            if lo < mid:
+                if node.left is None:
+                    lengths[lo:mid] = depth
+                else:
+                    next_level.append((node.left, lo, mid))
+            if mid < hi:
+                if node.right is None:
+                    lengths[mid:hi] = depth
+                else:
+                    next_level.append((node.right, mid, hi))
+        level = next_level
+        depth += 1
+    return lengths
+
+def _t_quantile(confidence: float, df: int) -> float:
+    """Returns t such that P(-t <= T <= t) = `confidence` for Student's T
+    with `df` degrees of freedom.
+    NOTE: P(-t <= T <= t) is a finite sum in theta = atan(t / sqrt(df))
+        (Abramowitz and Stegun, 26.7.3 and 26.7.4), which is increasing, so
+        theta is found by bisection."""
+    def prob(theta: float) -> float:
+        c2 = cos(theta)**2
+        term = total = 1.
+        if df % 2 == 1:
+            if df == 1:
+                return 2 * theta / pi
+            for j in range(1, (df - 1) // 2):
+                term *= 2*j / (2*j + 1) * c2
+                total += term
+            return 2 / pi * (theta + sin(theta) * cos(theta) * total)
+        for j in range(1, df // 2):
+            term *= (2*j - 1) / (2*j) * c2
+            total += term
+        return sin(theta) * total
+
+    lo, hi = 0., pi / 2
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if prob(mid) < confidence:
+            lo = mid
+        else:
+            hi = mid
+    return sqrt(df) * tan((lo + hi) / 2)
+
+def estimate_path_lengths(
+    tree: Tree, num_samples: int = 10_000, *, keys: Sequence | None = None,
+    qs: Sequence[float] = (0.5, 0.9, 0.99), num_batches: int = 20,
+    confidence: float = 0.95, level_base: float = 2.,
+    seed: int | None = None
+) -> PathLenEstimate:
+    """Estimates the distribution of the path lengths by sampling, in time
+    proportional to the number of samples instead of the number of nodes.
+    NOTE:
+    - Without `keys`, this estimates the root->leaf paths of
+      `path_length_stats`, with random descents (see `_descend_at_random`).
+      The estimated counts are unbiased, but the mean and the quantiles are
+      ratios of them, so they're only consistent. `level_base` only affects
+      the variance: it should be about the branching factor of the levels
+      (e.g. 1/p for P-Lexi trees). In P-Lexi trees, the levels are only a
+      rough guess of the sizes of the subtrees, so a few leaves get large
+      weights and the intervals below are too narrow with few samples
+      (tens of thousands are needed, against a few thousands for k-Lexi
+      trees).
+    - With `keys` (e.g. the `keys` of a `KeyReservoir`), the lengths are
+      those of the searches for the keys (as in `sample_path_lengths`), so
+      they follow the distribution of the keys instead of assuming it's
+      uniform. `num_samples` is then ignored.
+    - The samples are processed in `num_batches` batches, and the confidence
+      intervals come from the spread of the estimates of the batches (batch
+      means, with Student's t with `num_batches` - 1 degrees of freedom).
+      On 2- and 4-Lexi trees of 50k keys, 95% intervals of the mean held
+      the true mean 93-97% of the time (2000 or 10000 samples, 5 or 20
+      batches). For a quantile, that's the spread of the fraction of the
+      lengths below it, which is then mapped back to lengths (Woodruff's
+      interval), since the lengths are integers and the batches often agree
+      on the quantile itself."""
+    if num_batches < 2:
+        raise ValueError("num_batches must be at least 2")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be in (0, 1)")
+    if tree.first is None:
+        return PathLenEstimate()
+    rng = np.random.default_rng(seed)
+    if keys is not None:
+        num_samples = len(keys)
+    if num_samples < num_batches:
+        raise ValueError("need at least one sample per batch")
+
+    hists: list[list[float]]
+    if keys is None:
+        first_level = tree.get_height()
+        hists = []
+        for b in range(num_batches):
+            size = (b + 1) * num_samples // num_batches - \
+                   b * num_samples // num_batches
+            hists.append(_descend_at_random(
+                tree.first, first_level, size, rng, level_base))
+    else:
+        # NOTE: The searches of all the batches are done together, which
+        #   shares more of the nodes near the root.
+        order = sorted(range(num_samples), key=keys.__getitem__)
+        lengths = _descend_with_keys(tree.first, [keys[i] for i in order])
+        batch_of = rng.permutation(num_samples) % num_batches
+        num_bins = int(lengths.max()) + 1
+        hists = [np.bincount(lengths[batch_of[order] == b],
+                             minlength=num_bins).tolist()
+                 for b in range(num_batches)]
+
+    def mean(hist: Sequence[float]) -> float:
+        return sum(d*c for d, c in enumerate(hist)) / sum(hist)
+
+    def cdf(hist: Sequence[float], x: float) -> float:
+        return sum(hist[:floor(x) + 1]) / sum(hist)
+
+    # NOTE: The batches of random descents have the same size (up to 1), so
+    #   the average of their histograms is that of all the samples.
+    height = max(len(h) for h in hists)
+    pooled = [sum(h[d] for h in hists if d < len(h)) for d in range(height)]
+    if keys is None:
+        pooled = [c / num_batches for c in pooled]
+    z = _t_quantile(confidence, num_batches - 1)
+    sqrt_b = sqrt(num_batches)
+
+    mean_len = mean(pooled)
+    w = z * float(np.std([mean(h) for h in hists], ddof=1)) / sqrt_b
+    quantiles = hist_quantiles(pooled, qs)
+    quantile_cis = []
+    for q, x in zip(qs, quantiles):
+        # NOTE: The fraction jumps at each (integer) length, so its spread is
+        #   taken on both sides of the jump.
+        w_q = z * max(float(np.std([cdf(h, y) for h in hists], ddof=1))
+                      for y in (x - 1, x)) / sqrt_b
+        lo_len, hi_len = hist_quantiles(
+            pooled, [max(q - w_q, 0.), min(q + w_q, 1.)])
+        quantile_cis.append((lo_len, hi_len))
+    return PathLenEstimate(
+        num_samples=num_samples,
+        num_batches=num_batches,
+        num_leaves=sum(pooled) if keys is None else 0,
+        mean_len=mean_len,
+        mean_len_ci=(mean_len - w, mean_len + w),
+        qs=list(qs),
+        quantiles=quantiles,
+        quantile_cis=quantile_cis
+    )
@@ -0,0 +1,91 @@
+# Trees with a hash index on the side for the point operations.
+#
+# NOTE:
+# - A dict maps each key to its node. It's kept up to date by the node
+#   hooks (`_new_node` and `_free_node`), which see every node that enters
+#   or leaves the tree. The rebalancing (including `_replace_with_leaf`)
+#   relinks the nodes but never moves a key to another node, so the dict
+#   doesn't need to know about it.
+# - Lookups, updates of existing keys and removals of missing keys don't
+#   walk the tree at all. The ordered operations (`items`, `to_arrays`,
+#   ...) still use the tree.
+# - The price is a dict entry per key (about 100 bytes in CPython) and a
+#   dict update per insertion and removal.
+# - The keys must be hashable, and two keys must be equal (==) iff neither
+#   is less than the other.
+
+from __future__ import annotations
+from typing import Any
+from generic import K, V, T, Tree
+from misc import NotFound, notFound
+from misc import _Missing, _missing
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree
+
+class _HashIndexed:
+    """Mixin that indexes the nodes of a tree by key."""
+    _index: dict[Any, Any]
+
+    def __init__(self, *args, **kwargs):
+        self._index = {}
+        super().__init__(*args, **kwargs)           # type: ignore
+
+    def _new_node(self, key, val, *args):
+        node = super()._new_node(key, val, *args)   # type: ignore
+        self._index[key] = node
+        return node
+
+    def _free_node(self, node):
+        del self._index[node.key]
+        super()._free_node(node)                    # type: ignore
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __getitem__(self, key):
+        return self._index[key].val
+
+    def _find(self, key) -> Any | NotFound:
+        node = self._index.get(key)
+        return notFound if node is None else node.val
+
+    def __setitem__(self, key, val):
+        node = self._index.get(key)
+        if node is not None:
+            node.val = val
+        else:
+            super().__setitem__(key, val)           # type: ignore
+
+    def remove(self, key, default: T | _Missing = _missing):
+        if key not in self._index:
+            if default is _missing:
+                raise KeyError
+            return default
+        return super().remove(key, default)         # type: ignore
+
+    def _check(self):
+        super()._check()                            # type: ignore
+        num_nodes = 0
+        stack = [self.first]                        # type: ignore
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                num_nodes += 1
+                assert self._index[node.key] is node
+                stack.append(node.left)
+                stack.append(node.right)
+        assert num_nodes == len(self._index)
+
+class HashIndexedD2LTree(_HashIndexed, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class HashIndexedD3LTree(_HashIndexed, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class HashIndexedDkLTree(_HashIndexed, DkLTree[K, V]):
+    pass
+
+class HashIndexedPLTree(_HashIndexed, PLTree[K, V]):
+    pass
@@ -0,0 +1,112 @@
+# Seeded 64-bit hashes of keys and the levels derived from them.
+#
+# Unlike `hash()`, which is randomized for str and bytes, these hashes are
+# stable across processes and machines, so that, for instance, two replicas
+# holding the same keys build exactly the same history-independent P-Lexi
+# tree (see PLTree's `seed`).
+#
+# NOTE:
+# - Ints (that fit in 64 bits) and floats are hashed with splitmix64, and
+#   anything else with BLAKE2b over its codec.py encoding (str and bytes
+#   directly).
+# - Keys that compare equal hash equal (e.g. 2 and 2.0), except inside
+#   tuples.
+# - The NumPy versions give exactly the same results as the scalar ones: the
+#   levels are found by comparing the hash with integer thresholds, with no
+#   floating-point computation involved.
+
+from __future__ import annotations
+from bisect import bisect_right
+from functools import lru_cache
+from hashlib import blake2b
+from struct import Struct
+from typing import Any, Final, Sequence
+import numpy as np
+from codec import encode_bytes
+
+_MASK64: Final = (1 << 64) - 1
+_MIN_I64: Final = -(1 << 63)
+_MAX_I64: Final = (1 << 63) - 1
+_F64: Final = Struct('<d')
+_U64: Final = Struct('<Q')
+
+def splitmix64(x: int) -> int:
+    """`x` must be in [0, 2^64)."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+def _splitmix64_array(x: np.ndarray) -> np.ndarray:
+    """Vectorized splitmix64 (`x` must have dtype uint64)."""
+    # NOTE: uint64 arithmetic wraps around, as we want.
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def key_hash(key: Any, seed: int = 0) -> int:
+    """Returns a 64-bit hash of `key`.
+    NOTE: Raises TypeError if `key` can't be encoded with codec.py."""
+    t = type(key)
+    if t is float and key.is_integer():
+        key = int(key)
+        t = int
+    if t is int or t is bool:
+        if _MIN_I64 <= key <= _MAX_I64:
+            return splitmix64((key ^ seed) & _MASK64)
+        data = encode_bytes(int(key))
+    elif t is float:
+        return splitmix64(_U64.unpack(_F64.pack(key))[0] ^ (seed & _MASK64))
+    elif t is str:
+        data = key.encode()
+    elif t is bytes:
+        data = key
+    else:
+        data = encode_bytes(key)
+    h = blake2b(data, digest_size=8, key=(seed & _MASK64).to_bytes(8, 'little'))
+    return int.from_bytes(h.digest(), 'little')
+
+def key_hashes(keys: Sequence[Any] | np.ndarray, seed: int = 0) -> np.ndarray:
+    """Returns the hashes of `keys` as a uint64 array (vectorized for int
+    and float arrays)."""
+    seed64 = np.uint64(seed & _MASK64)
+    if isinstance(keys, np.ndarray):
+        if keys.dtype.kind in 'iub' and keys.dtype != np.uint64:
+            return _splitmix64_array(keys.astype(np.int64).view(np.uint64)
+                                     ^ seed64)
+        if keys.dtype.kind == 'f':
+            keys = keys.astype(np.float64)
+            as_int = (np.floor(keys) == keys) & \
+                     (keys >= -2.**63) & (keys < 2.**63)
+            bits = keys.view(np.uint64).copy()
+            bits[as_int] = keys[as_int].astype(np.int64).view(np.uint64)
+            hashes = _splitmix64_array(bits ^ seed64)
+            # huge integral floats (and infinities) go the slow way
+            slow = np.flatnonzero((np.floor(keys) == keys) & ~as_int)
+            for i in slow.tolist():
+                hashes[i] = key_hash(float(keys[i]), seed)
+            return hashes
+        keys = keys.tolist()
+    return np.array([key_hash(k, seed) for k in keys], dtype=np.uint64)
+
+@lru_cache(maxsize=None)
+def _thresholds(p: float, max_level: int) -> tuple[int, ...]:
+    """Returns the increasing thresholds t_l = p^l * 2^64 for l = max_level,
+    ..., 1, so that a uniform hash h has level >= l (i.e. h < t_l) with
+    probability p^l."""
+    return tuple(int(p**l * 2.**64) for l in range(max_level, 0, -1))
+
+def hash_level(h: int, p: float, max_level: int) -> int:
+    """Returns the level (geometric with parameter `p`, capped at
+    `max_level`) derived from the 64-bit hash `h`."""
+    ts = _thresholds(p, max_level)
+    return len(ts) - bisect_right(ts, h)
+
+def hash_levels(keys: Sequence[Any] | np.ndarray, seed: int, p: float,
+                max_level: int) -> list[int]:
+    """Returns [hash_level(key_hash(key, seed), p, max_level) for key in
+    keys], computed with NumPy."""
+    ts = np.array(_thresholds(p, max_level), dtype=np.uint64)
+    hashes = key_hashes(keys, seed)
+    return (len(ts) - np.searchsorted(ts, hashes, side='right')).tolist()
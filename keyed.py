@@ -0,0 +1,239 @@
+# Trees with `key=` functions (as in `sorted`) and three-way comparators.
+#
+# NOTE:
+# - `KeyedTree` wraps a tree whose nodes hold the derived keys, computed
+#   once per operation instead of once per comparison. The original keys are
+#   kept next to the values, so that `items` can return them.
+# - The search loops compare each node with
+#       if cur.key < key: ...
+#       elif key < cur.key: ...
+#       else: ...
+#   i.e. twice. With `cmp=`, the derived keys are wrapped in `_CmpKey` and
+#   the tree is an instance of `three_way(cls)`, which overrides the lookups
+#   (`_find`) and, for 2-Lexi and k-Lexi trees, the search of the removals
+#   with loops that call `cmp` once per node. The other comparisons (e.g.
+#   those of the insertions and of the range bounds) go through
+#   `_CmpKey.__lt__`.
+# - As with `sorted`, two keys with the same derived key are the same key
+#   (the last one inserted is kept).
+# - A comparator doesn't come with a hash function consistent with it (e.g.
+#   a case-insensitive one), so the `_CmpKey`s aren't hashable and the trees
+#   that hash or index their keys can't take a `cmp`.
+
+from __future__ import annotations
+from typing import Any, Callable, Generic, Iterator
+from generic import K, V, T, Tree
+from misc import NotFound, _Missing, _missing, notFound
+from DLTree import DLTree
+from DLTree_misc import _DNode
+from D2LTree import D2LTree, PathData
+from DkLTree import DkLTree
+from D2LTree_Budgeted import D2LTree_Budgeted
+from PLTree import PLTree
+from BiasedPLTree import BiasedPLTree
+from bloom import _BloomFiltered
+from hash_index import _HashIndexed
+
+class _CmpKey:
+    """A key ordered by a three-way comparator.
+    NOTE: Not hashable (see the top of the file)."""
+    __slots__ = ('obj', 'cmp')
+    obj: Any
+    cmp: Callable[[Any, Any], int]
+
+    def __init__(self, obj: Any, cmp: Callable[[Any, Any], int]):
+        self.obj = obj
+        self.cmp = cmp
+
+    def __lt__(self, other: _CmpKey) -> bool:
+        return self.cmp(self.obj, other.obj) < 0
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _CmpKey) and \
+               self.cmp(self.obj, other.obj) == 0
+
+    __hash__ = None                                 # type: ignore
+
+    def __repr__(self) -> str:
+        return f"_CmpKey({self.obj!r})"
+
+class _ThreeWayFind:
+    def _find(self, key: _CmpKey) -> Any | NotFound:
+        cmp = key.cmp
+        obj = key.obj
+        cur = self.first                            # type: ignore
+        while cur is not None:
+            res = cmp(obj, cur.key.obj)
+            if res > 0:
+                cur = cur.right
+            elif res < 0:
+                cur = cur.left
+            else:
+                return cur.val
+        return notFound
+
+class _ThreeWayD2Removal:
+    def _find_and_collect(self, key: _CmpKey,
+                          nodes: list[_DNode | None]) -> PathData | None:
+        """Same as D2LTree._find_and_collect."""
+        cmp = key.cmp
+        obj = key.obj
+        nodes[0] = self._root                       # type: ignore
+        last_idx = 0
+        key_node = None
+        prev_key_node = None
+        cur = self._root.right                      # type: ignore
+        if cur is None:
+            return None
+        key_node_idx = 0
+        while cur is not None:
+            last_idx += 1
+            nodes[last_idx] = cur
+            res = cmp(obj, cur.key.obj)
+            if res > 0:
+                cur = cur.right
+            elif res < 0:
+                cur = cur.left
+            else:
+                key_node_idx = last_idx
+                key_node = cur
+                prev_key_node = nodes[last_idx-1]
+                cur = cur.left
+                while cur is not None:
+                    last_idx += 1
+                    nodes[last_idx] = cur
+                    cur = cur.right
+                break
+        return PathData(prev_key_node=prev_key_node, key_node=key_node,
+                        key_node_idx=key_node_idx, last_idx=last_idx)
+
+class _ThreeWayDkRemoval:
+    def _removal_path(self, key: _CmpKey) -> tuple[list[_DNode], int]:
+        """Same as DkLTree._removal_path."""
+        cmp = key.cmp
+        obj = key.obj
+        path: list[_DNode] = [self._root]          # type: ignore
+        key_idx = 0
+        cur = self._root.right                      # type: ignore
+        while cur is not None:
+            path.append(cur)
+            res = cmp(obj, cur.key.obj)
+            if res > 0:
+                cur = cur.right
+            elif res < 0:
+                cur = cur.left
+            else:
+                key_idx = len(path) - 1
+                cur = cur.left
+                while cur is not None:
+                    path.append(cur)
+                    cur = cur.right
+                break
+        return path, key_idx
+
+_cache: dict[type, type] = {}
+
+def three_way(cls: type) -> type:
+    """Returns the subclass of the tree class `cls` whose searches compare
+    each node once, with the comparator of the keys, which must be
+    `_CmpKey`s.
+    NOTE: The searches that `cls` overrides (e.g. the `_find` of the trees
+        with tombstones) are left as they are."""
+    tw = _cache.get(cls)
+    if tw is None:
+        mixins: list[type] = []
+        if cls._find in (DLTree._find, PLTree._find):
+            mixins.append(_ThreeWayFind)
+        if issubclass(cls, D2LTree) and \
+                cls._find_and_collect is D2LTree._find_and_collect:
+            mixins.append(_ThreeWayD2Removal)
+        if issubclass(cls, DkLTree) and \
+                cls._removal_path is DkLTree._removal_path:
+            mixins.append(_ThreeWayDkRemoval)
+        tw = type(f'{cls.__name__}_3way', (*mixins, cls),
+                  {'__module__': __name__})
+        _cache[cls] = tw
+    return tw
+
+class KeyedTree(Generic[K, V]):
+    """Wraps a tree of class `cls` (e.g. D2LTree) ordered by `key(k)`
+    instead of `k` and, if `cmp` is given, by `cmp(key(k1), key(k2))`, which
+    must be negative, zero or positive like `a - b`.
+    NOTE:
+    - Other arguments (e.g. `p` or `k`) are passed on to `cls`.
+    - With `cmp`, the trees that hash or index their keys (e.g. the
+      hash-indexed ones) are refused (ValueError)."""
+    tree: Tree[Any, Any]
+    _key: Callable[[K], Any] | None
+    _cmp: Callable[[Any, Any], int] | None
+
+    def __init__(self, cls: type, any_key: K, any_val: V, *,
+                 key: Callable[[K], Any] | None = None,
+                 cmp: Callable[[Any, Any], int] | None = None, **kwargs):
+        if cmp is not None:
+            if issubclass(cls, (D2LTree_Budgeted, BiasedPLTree, _BloomFiltered,
+                                _HashIndexed)) or \
+                    kwargs.get('seed') is not None:
+                raise ValueError(
+                    "with cmp, the tree must not index or hash its keys")
+            cls = three_way(cls)
+        self._key = key
+        self._cmp = cmp
+        any_val_: Any = (any_key, any_val) if key is not None else any_val
+        self.tree = cls(self._derive(any_key), any_val_, **kwargs)
+
+    def _derive(self, key: K) -> Any:
+        if self._key is not None:
+            key = self._key(key)
+        if self._cmp is not None:
+            return _CmpKey(key, self._cmp)
+        return key
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __contains__(self, key: K) -> bool:
+        return self._derive(key) in self.tree
+
+    def __getitem__(self, key: K) -> V:
+        val = self.tree[self._derive(key)]
+        return val[1] if self._key is not None else val
+
+    def get(self, key: K, default: T | None = None) -> V | T | None:
+        val = self.tree._find(self._derive(key))        # type: ignore
+        if val is notFound:
+            return default
+        return val[1] if self._key is not None else val
+
+    def __setitem__(self, key: K, val: V):
+        self.tree[self._derive(key)] = \
+            (key, val) if self._key is not None else val
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        val = self.tree.remove(self._derive(key), notFound)
+        if val is notFound:
+            if default is _missing:
+                raise KeyError
+            return default
+        return val[1] if self._key is not None else val
+
+    def __delitem__(self, key: K):
+        self.remove(key)
+
+    def items(self, from_key: K | _Missing = _missing,
+              to_key: K | _Missing = _missing) -> Iterator[tuple[K, V]]:
+        """NOTE: The bounds are keys, not derived keys."""
+        it = self.tree.items(
+            self._derive(from_key) if from_key is not _missing else _missing,
+            self._derive(to_key) if to_key is not _missing else _missing)
+        if self._key is not None:
+            return (pair for _, pair in it)
+        if self._cmp is not None:
+            return ((k.obj, val) for k, val in it)
+        return it
+
+    def __iter__(self) -> Iterator[tuple[K, V]]:
+        return self.items()
+
+    def _check(self):
+        self.tree._check()
@@ -0,0 +1,201 @@
+# Client for kv_server.py.
+#
+# NOTE: A KVClient can be shared among threads: each call borrows a connection
+#   from the pool and gives it back when done.
+
+from __future__ import annotations
+import socket
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from threading import Lock
+from typing import Any, Iterator, List, Tuple
+from kv_protocol import (
+    OP_DEL, OP_GET, OP_LEN, OP_RANGE, OP_SET, ST_ERROR, ST_NOT_FOUND,
+    KVError, decode_response, encode_request, split_frames
+)
+
+class _Connection:
+    sock: socket.socket
+    inbuf: bytearray
+
+    def __init__(self, path: str, timeout: float | None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.inbuf = bytearray()
+
+    def roundtrip(self, ops: List[int], out: bytearray) -> \
+            List[Tuple[int, Any]]:
+        """Sends the requests in `out` (one per op in `ops`) and returns the
+        decoded responses, in order."""
+        self.sock.sendall(out)
+        results: List[Tuple[int, Any]] = []
+        while len(results) < len(ops):
+            data = self.sock.recv(1 << 18)
+            if not data:
+                raise ConnectionError("connection closed by the server")
+            self.inbuf += data
+            bodies, used = split_frames(self.inbuf)
+            for body in bodies:
+                results.append(decode_response(ops[len(results)], body))
+                body.release()
+            del self.inbuf[:used]
+        return results
+
+    def close(self):
+        self.sock.close()
+
+class KVClient:
+    path: str
+    timeout: float | None
+    _pool: LifoQueue[_Connection]
+    _pool_size: int
+    _num_conns: int
+    _lock: Lock
+
+    def __init__(self, path: str, *, pool_size: int = 4,
+                 timeout: float | None = None):
+        """NOTE: Connections are opened lazily, up to `pool_size`."""
+        self.path = path
+        self.timeout = timeout
+        self._pool = LifoQueue()
+        self._pool_size = pool_size
+        self._num_conns = 0
+        self._lock = Lock()
+
+    @contextmanager
+    def _connection(self) -> Iterator[_Connection]:
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except Empty:
+            with self._lock:
+                if self._num_conns < self._pool_size:
+                    self._num_conns += 1
+                    new = True
+                else:
+                    new = False
+            if new:
+                try:
+                    conn = _Connection(self.path, self.timeout)
+                except BaseException:
+                    with self._lock:
+                        self._num_conns -= 1
+                    raise
+            else:
+                conn = self._pool.get()
+        try:
+            yield conn
+        except BaseException:
+            # The stream may be out of sync, so we don't reuse `conn`.
+            conn.close()
+            with self._lock:
+                self._num_conns -= 1
+            raise
+        self._pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._num_conns -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _call(self, op: int, *args: Any) -> Tuple[int, Any]:
+        out = bytearray()
+        encode_request(out, op, *args)
+        with self._connection() as conn:
+            status, result = conn.roundtrip([op], out)[0]
+        if status == ST_ERROR:
+            raise KVError(result)
+        return status, result
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        status, val = self._call(OP_GET, key)
+        return default if status == ST_NOT_FOUND else val
+
+    def set(self, key: Any, val: Any):
+        self._call(OP_SET, key, val)
+
+    def delete(self, key: Any, default: Any = None) -> Any:
+        """Removes `key` and returns its value (`default` if not found)."""
+        status, val = self._call(OP_DEL, key)
+        return default if status == ST_NOT_FOUND else val
+
+    def range(self, from_key: Any = None, to_key: Any = None,
+              limit: int = 0) -> List[Tuple[Any, Any]]:
+        """Returns the pairs with from_key <= key <= to_key in key order.
+        NOTE: `None` means no bound and limit=0 means no limit."""
+        return self._call(OP_RANGE, from_key, to_key, limit)[1]
+
+    def __len__(self) -> int:
+        return self._call(OP_LEN)[1]
+
+    def pipeline(self) -> Pipeline:
+        return Pipeline(self)
+
+class Pipeline:
+    """Queues requests and sends them all at once with `execute`, which returns
+    the results in order.
+    NOTE: The results are what the corresponding KVClient methods would return,
+        except that server errors are returned as KVError instances instead of
+        being raised.
+    """
+    _client: KVClient
+    _ops: List[int]
+    _defaults: List[Any]
+    _out: bytearray
+
+    def __init__(self, client: KVClient):
+        self._client = client
+        self._ops = []
+        self._defaults = []
+        self._out = bytearray()
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _add(self, op: int, default: Any, *args: Any) -> Pipeline:
+        encode_request(self._out, op, *args)
+        self._ops.append(op)
+        self._defaults.append(default)
+        return self
+
+    def get(self, key: Any, default: Any = None) -> Pipeline:
+        return self._add(OP_GET, default, key)
+
+    def set(self, key: Any, val: Any) -> Pipeline:
+        return self._add(OP_SET, None, key, val)
+
+    def delete(self, key: Any, default: Any = None) -> Pipeline:
+        return self._add(OP_DEL, default, key)
+
+    def range(self, from_key: Any = None, to_key: Any = None,
+              limit: int = 0) -> Pipeline:
+        return self._add(OP_RANGE, None, from_key, to_key, limit)
+
+    def execute(self) -> List[Any]:
+        ops, defaults, out = self._ops, self._defaults, self._out
+        self._ops, self._defaults, self._out = [], [], bytearray()
+        if not ops:
+            return []
+        with self._client._connection() as conn:
+            responses = conn.roundtrip(ops, out)
+        results: List[Any] = []
+        for (status, result), default in zip(responses, defaults):
+            if status == ST_ERROR:
+                results.append(KVError(result))
+            elif status == ST_NOT_FOUND:
+                results.append(default)
+            else:
+                results.append(result)
+        return results
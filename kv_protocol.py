@@ -0,0 +1,114 @@
+# Binary protocol shared by kv_server.py and kv_client.py.
+#
+# Both requests and responses are frames:
+#   <I: length of body> body
+# Request bodies:
+#   GET    op key
+#   SET    op key val
+#   DEL    op key
+#   RANGE  op flags [from_key] [to_key] <I: limit>    (limit 0 = no limit)
+#   LEN    op
+# where `op` is 1 byte and keys and values use the encoding in codec.py.
+# In RANGE, bit 0 of `flags` tells whether from_key is present and bit 1
+# whether to_key is present. Both bounds are inclusive.
+#
+# Response bodies:
+#   OK         status [payload]
+#   NOT_FOUND  status
+#   ERROR      status message(str)
+# The payloads of OK are:
+#   GET    val
+#   SET    (nothing)
+#   DEL    removed val
+#   RANGE  <I: count> key1 val1 ... keyN valN
+#   LEN    len(int)
+#
+# Requests can be pipelined: the server processes all the complete frames it
+# has received in one go and answers them in the same order.
+
+from __future__ import annotations
+from struct import Struct
+from typing import Any, Final, List, Tuple
+from codec import decode, encode
+
+OP_GET: Final = 1
+OP_SET: Final = 2
+OP_DEL: Final = 3
+OP_RANGE: Final = 4
+OP_LEN: Final = 5
+
+ST_OK: Final = 0
+ST_NOT_FOUND: Final = 1
+ST_ERROR: Final = 2
+
+HAS_FROM: Final = 1
+HAS_TO: Final = 2
+
+FRAME_HEADER: Final = Struct('<I')
+U32: Final = Struct('<I')
+
+class KVError(Exception):
+    """Error reported by the server."""
+
+def begin_frame(out: bytearray) -> int:
+    """Reserves the frame header and returns its position."""
+    pos = len(out)
+    out += b'\0\0\0\0'
+    return pos
+
+def end_frame(out: bytearray, pos: int):
+    FRAME_HEADER.pack_into(out, pos, len(out) - pos - 4)
+
+def split_frames(buf: bytearray) -> Tuple[List[memoryview], int]:
+    """Returns the bodies of the complete frames in `buf` and the number of
+    bytes they take up.
+    NOTE: The returned views must be released before `buf` is resized.
+    """
+    bodies: List[memoryview] = []
+    view = memoryview(buf)
+    pos = 0
+    end = len(buf)
+    while end - pos >= 4:
+        n = FRAME_HEADER.unpack_from(buf, pos)[0]
+        if end - pos - 4 < n:
+            break
+        bodies.append(view[pos+4:pos+4+n])
+        pos += 4 + n
+    view.release()
+    return bodies, pos
+
+def encode_request(out: bytearray, op: int, *args: Any):
+    pos = begin_frame(out)
+    out.append(op)
+    if op == OP_RANGE:
+        from_key, to_key, limit = args
+        flags = ((HAS_FROM if from_key is not None else 0) |
+                 (HAS_TO if to_key is not None else 0))
+        out.append(flags)
+        if from_key is not None: encode(from_key, out)
+        if to_key is not None: encode(to_key, out)
+        out += U32.pack(limit)
+    else:
+        for x in args:
+            encode(x, out)
+    end_frame(out, pos)
+
+def decode_response(op: int, body: memoryview) -> Tuple[int, Any]:
+    """Returns (status, result)."""
+    status = body[0]
+    if status == ST_NOT_FOUND:
+        return status, None
+    if status == ST_ERROR:
+        return status, decode(body, 1)[0]
+    if op == OP_RANGE:
+        count = U32.unpack_from(body, 1)[0]
+        pos = 5
+        pairs = []
+        for _ in range(count):
+            k, pos = decode(body, pos)
+            v, pos = decode(body, pos)
+            pairs.append((k, v))
+        return status, pairs
+    if op == OP_SET:
+        return status, None
+    return status, decode(body, 1)[0]
@@ -0,0 +1,215 @@
+# Serves a single tree to local clients over a Unix-domain socket.
+#
+# NOTE:
+# - The trees are single-threaded, so the server runs a single-threaded event
+#   loop: all the complete requests received from a client are executed in
+#   one pass and their responses are sent back with a single write.
+# - See kv_protocol.py for the protocol and kv_client.py for the client.
+
+from __future__ import annotations
+import os
+import selectors
+import socket
+from typing import Any, Final
+from codec import decode, encode
+from generic import Tree
+from kv_protocol import (
+    HAS_FROM, HAS_TO, OP_DEL, OP_GET, OP_LEN, OP_RANGE, OP_SET, ST_ERROR,
+    ST_NOT_FOUND, ST_OK, U32, begin_frame, end_frame, split_frames
+)
+from misc import _missing, notFound
+
+RECV_SIZE: Final[int] = 1 << 18
+
+class _Client:
+    sock: socket.socket
+    inbuf: bytearray
+    outbuf: bytearray
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+
+class KVServer:
+    tree: Tree
+    path: str
+    _sel: selectors.BaseSelector
+    _listener: socket.socket
+    _running: bool
+
+    def __init__(self, tree: Tree, path: str, *, backlog: int = 64):
+        self.tree = tree
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen(backlog)
+        self._listener.setblocking(False)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self._listener, selectors.EVENT_READ, None)
+        self._running = False
+
+    def serve_forever(self, poll_interval: float = 0.5):
+        self._running = True
+        while self._running:
+            for skey, events in self._sel.select(poll_interval):
+                client = skey.data
+                if client is None:
+                    self._accept()
+                    continue
+                if events & selectors.EVENT_READ:
+                    if not self._on_readable(client):
+                        continue            # dropped
+                if events & selectors.EVENT_WRITE and client.outbuf:
+                    self._flush(client)
+
+    def shutdown(self):
+        """Makes serve_forever return (at the next poll at the latest)."""
+        self._running = False
+
+    def close(self):
+        for skey in list(self._sel.get_map().values()):
+            if skey.data is not None:
+                self._drop(skey.data)
+        self._sel.close()
+        self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self._sel.register(sock, selectors.EVENT_READ, _Client(sock))
+
+    def _drop(self, client: _Client):
+        self._sel.unregister(client.sock)
+        client.sock.close()
+
+    def _on_readable(self, client: _Client) -> bool:
+        """Returns False if the client was dropped."""
+        try:
+            data = client.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except ConnectionError:
+            data = b''
+        if not data:
+            self._drop(client)
+            return False
+        client.inbuf += data
+        bodies, used = split_frames(client.inbuf)
+        if not bodies:
+            return True
+        # executes the whole batch in one pass
+        out = client.outbuf
+        for body in bodies:
+            self._execute(body, out)
+            body.release()
+        del client.inbuf[:used]
+        return self._flush(client)
+
+    def _flush(self, client: _Client) -> bool:
+        """Returns False if the client was dropped."""
+        try:
+            sent = client.sock.send(client.outbuf)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except ConnectionError:
+            self._drop(client)
+            return False
+        del client.outbuf[:sent]
+        events = selectors.EVENT_READ
+        if client.outbuf:
+            events |= selectors.EVENT_WRITE
+        self._sel.modify(client.sock, events, client)
+        return True
+
+    def _execute(self, body: memoryview, out: bytearray):
+        """Executes the request in `body` and appends the response to `out`."""
+        pos = begin_frame(out)
+        try:
+            self._execute_op(body, out)
+        except Exception as e:
+            del out[pos+4:]
+            out.append(ST_ERROR)
+            encode(f"{type(e).__name__}: {e}", out)
+        end_frame(out, pos)
+
+    def _execute_op(self, body: memoryview, out: bytearray):
+        tree = self.tree
+        op = body[0]
+        if op == OP_GET:
+            key = decode(body, 1)[0]
+            try:
+                val = tree[key]
+            except KeyError:
+                out.append(ST_NOT_FOUND)
+            else:
+                out.append(ST_OK)
+                encode(val, out)
+        elif op == OP_SET:
+            key, pos = decode(body, 1)
+            tree[key] = decode(body, pos)[0]
+            out.append(ST_OK)
+        elif op == OP_DEL:
+            key = decode(body, 1)[0]
+            val = tree.remove(key, notFound)
+            if val is notFound:
+                out.append(ST_NOT_FOUND)
+            else:
+                out.append(ST_OK)
+                encode(val, out)
+        elif op == OP_RANGE:
+            flags = body[1]
+            pos = 2
+            from_key = to_key = _missing
+            if flags & HAS_FROM:
+                from_key, pos = decode(body, pos)
+            if flags & HAS_TO:
+                to_key, pos = decode(body, pos)
+            limit = U32.unpack_from(body, pos)[0]
+            out.append(ST_OK)
+            count_pos = len(out)
+            out += b'\0\0\0\0'
+            count = 0
+            for k, v in tree.items(from_key, to_key):
+                if count == limit and limit != 0:
+                    break
+                encode(k, out)
+                encode(v, out)
+                count += 1
+            U32.pack_into(out, count_pos, count)
+        elif op == OP_LEN:
+            out.append(ST_OK)
+            encode(len(tree), out)
+        else:
+            raise ValueError(f"unknown op {op}")
+
+def serve(tree: Tree, path: str):
+    server = KVServer(tree, path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from D2LTree import D2LTree
+    from D3LTree import D3LTree
+    from PLTree import PLTree
+
+    parser = ArgumentParser(description="Serves a tree over a Unix socket.")
+    parser.add_argument('path', help="path of the Unix socket")
+    parser.add_argument('--tree', choices=['prob', 'det2', 'det3'],
+                        default='det2')
+    args = parser.parse_args()
+    tree_class: dict[str, Any] = {
+        'prob': PLTree, 'det2': D2LTree, 'det3': D3LTree}
+    serve(tree_class[args.tree](0, 0), args.path)
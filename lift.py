@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Tuple
 from generic import K, V
+import misc
 from DLTree_misc import _DNode
 
 def lift(prev2: _DNode[K, V] | None, prev: _DNode[K, V], cur: _DNode[K, V],
@@ -10,6 +11,8 @@ def lift(prev2: _DNode[K, V] | None, prev: _DNode[K, V], cur: _DNode[K, V],
     """Lifts `right` and returns the final
         cur_prev, right_prev, right2_prev, prev, cur.
     """
+    counters = misc._op_counters
+    if counters is not None: counters['lift'] += 1
     if prev.right is cur:
         # Case I: prev.right = cur
         # P            ==>  P --> r
@@ -0,0 +1,31 @@
+from __future__ import annotations
+from typing import Tuple
+import misc
+from DLTree_misc import _DNode, link_list
+
+def lift(nodes: list[_DNode], children: list[_DNode | None],
+         parent_nodes: list[_DNode], parent_children: list[_DNode | None],
+         slot: int) -> Tuple[list[_DNode], list[_DNode | None],
+                             list[_DNode], list[_DNode | None]]:
+    """Lifts the middle node of the list (nodes, children), which is the child
+    number `slot` of the parent list, into the parent list and returns the
+    left and right halves as (nodes, children, nodes, children).
+    NOTE:
+    - This generalizes lift.py to lists of any length (>= 2):
+        P -- ... --.               ==>   P -- ... --> m
+                    \\              ==>               /   \\
+          n_1 ... m ... n_r        ==>   n_1 ... n_j     n_j+2 ... n_r
+    - The halves are relinked, but the parent list isn't (the caller must
+      call link_list on it).
+    - If the list is the top one, the parent list is just ([], [head]).
+    """
+    counters = misc._op_counters
+    if counters is not None: counters['lift'] += 1
+    m = len(nodes) // 2
+    left_nodes, left_children = nodes[:m], children[:m+1]
+    right_nodes, right_children = nodes[m+1:], children[m+1:]
+    assert left_nodes and right_nodes
+    parent_nodes.insert(slot, nodes[m])
+    parent_children[slot:slot+1] = [link_list(left_nodes, left_children),
+                                    link_list(right_nodes, right_children)]
+    return left_nodes, left_children, right_nodes, right_children
@@ -1,11 +1,13 @@
 from __future__ import annotations
 from generic import K, V
+import misc
 from DLTree_misc import _DNode
 
 def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
           other2: _DNode[K, V] | None) -> bool:
     """Lowers `cur1` and returns `hole`, which tells whether a hole was created
     by the lowering."""
+    counters = misc._op_counters
     if other2 is None:
         # Case Left1
         # P! ---.    .----- P!  ==>  P! ---.      .------ P!
@@ -44,6 +46,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
         #   the algorithm doesn't change.
         if cur1.left is other1:
             # Left1
+            if counters is not None: counters['lower.Left1'] += 1
             high_case = False
             first = other1
             cur1.left = other1.right
@@ -51,6 +54,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
             other1.high_right = True
         elif cur1.high_right:
             # RightHi1
+            if counters is not None: counters['lower.RightHi1'] += 1
             assert cur1.right is not None and cur1.right.left is other1
             high_case = True
             first = cur1.right          # first = r
@@ -58,6 +62,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
             cur1.right = other1
         else:
             # Right1
+            if counters is not None: counters['lower.Right1'] += 1
             high_case = False
             first = cur1
             cur1.high_right = True
@@ -70,6 +75,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
             hole = not high_case and not prev.high_right
             prev.right = first
             prev.high_right = prev.high_right and high_case
+        if hole and counters is not None: counters['holes'] += 1
         return hole
     else:
         # Case Left2
@@ -97,6 +103,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
         #   so no `r` can separate them.
         if cur1.left is other1:
             # Left2
+            if counters is not None: counters['lower.Left2'] += 1
             first = other2
             other1.right = other2.left
             other1.high_right = False
@@ -106,6 +113,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], other1: _DNode[K, V],
             other2.high_right = False
         else:
             # Right2
+            if counters is not None: counters['lower.Right2'] += 1
             first = other1
             r = cur1.right
             cur1.right = other1.left
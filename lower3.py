@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Tuple
 from generic import K, V
+import misc
 from DLTree_misc import _DNode
 
 def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
@@ -8,6 +9,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
           other3: _DNode[K, V] | None, *, prev_is_root: bool) -> \
               Tuple[_DNode[K, V], _DNode[K, V]]:
     """Lowers `cur1`"""
+    counters = misc._op_counters
     # RULE: cur1 always points to cur2 and cur2 is always below cur1 or we
     #   could lower cur2 without lowering cur1 first.
     assert cur1.left is cur2 or (cur1.right is cur2 and not cur1.high_right)
@@ -52,6 +54,7 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
         c1_left = cur1.left
         assert c1_left is not None
         if cur1.high_right:         # RightHi1
+            if counters is not None: counters['lower.RightHi1'] += 1
             r = cur1.right
             assert r is not None
             assert c1_left is cur2
@@ -63,6 +66,9 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
             cur1.right = other1
             prev_c2 = r
         else:                       # Left1 or Right1
+            if counters is not None:
+                counters['lower.Left1' if cur1.left is other1 else
+                         'lower.Right1'] += 1
             assert prev.right is cur1 and (prev.high_right or prev_is_root)
             prev.right = c1_left
             prev.high_right = False
@@ -97,6 +103,9 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
             #   directly, so no `r` can separate them.
             # - LO = last_other.
             # - Prev can be in any of the 3 positions shown above.
+            if counters is not None:
+                counters['lower.Left2' if other3 is None else
+                         'lower.Left3'] += 1
             last_other = other2 if other3 is None else other3
             if prev.right is cur1:
                 prev.right = other2         # keeps same high_right
@@ -137,6 +146,9 @@ def lower(prev: _DNode[K, V], cur1: _DNode[K, V], cur2: _DNode[K, V],
             # - c1 and o1 are connected either directly or through r. The
             #   same goes for lifted and lifted.right.
             # - These are almost the inverse of case Left2 and Left3.
+            if counters is not None:
+                counters['lower.Right2' if other3 is None else
+                         'lower.Right3'] += 1
             if other3 is not None:
                 before_lifted = other1
                 lifted = other2
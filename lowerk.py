@@ -0,0 +1,71 @@
+from __future__ import annotations
+import misc
+from DLTree_misc import _DNode, link_list, list_of
+
+def lower(nodes: list[_DNode], children: list[_DNode | None], i: int,
+          child_nodes: list[_DNode], child_children: list[_DNode | None],
+          max_list_len: int):
+    """Makes the child number `i` of the list (nodes, children), whose content
+    is (child_nodes, child_children), one node longer by *lowering* a
+    neighboring node of the parent list into it.
+    NOTE:
+    - The child can be a *hole* (no nodes and a single child one level too
+      low), as in bottom-up deletions, or a list of one node, as in top-down
+      deletions.
+    - Like lower2.py, we borrow a node from a sibling if it has at least 2
+      nodes:
+            .--- p ---.                 .--- s_1 ---.
+           /           \\       ==>      /             \\
+        s_1 s_2      child    ==>     s_2          p child
+      and otherwise we merge the child, the parent node and the sibling:
+            .--- p ---.
+           /           \\       ==>
+        s_1          child    ==>     s_1 p child
+      In this case, the parent list gets shorter and can become a hole.
+    - The affected children are relinked and stored in `children`, but the
+      parent list isn't relinked (the caller must call link_list on it).
+    """
+    counters = misc._op_counters
+    assert len(nodes) >= 1 and len(children) == len(nodes) + 1
+    if not child_nodes and counters is not None: counters['holes'] += 1
+    left = right = None
+    if i > 0:
+        left = list_of(children[i-1])               # type: ignore
+        if len(left[0]) >= 2:
+            # borrows the last node of the left sibling
+            if counters is not None: counters['lower.BorrowLeft'] += 1
+            left_nodes, left_children = left
+            child_nodes.insert(0, nodes[i-1])
+            child_children.insert(0, left_children[-1])
+            nodes[i-1] = left_nodes[-1]
+            children[i-1] = link_list(left_nodes[:-1], left_children[:-1])
+            children[i] = link_list(child_nodes, child_children)
+            return
+    if i < len(nodes):
+        right = list_of(children[i+1])              # type: ignore
+        if len(right[0]) >= 2:
+            # borrows the first node of the right sibling
+            if counters is not None: counters['lower.BorrowRight'] += 1
+            right_nodes, right_children = right
+            child_nodes.append(nodes[i])
+            child_children.append(right_children[0])
+            nodes[i] = right_nodes[0]
+            children[i] = link_list(child_nodes, child_children)
+            children[i+1] = link_list(right_nodes[1:], right_children[1:])
+            return
+    # merges
+    if counters is not None: counters['lower.Merge'] += 1
+    if left is not None:
+        merged_nodes = left[0] + [nodes[i-1]] + child_nodes
+        merged_children = left[1] + child_children
+        del nodes[i-1]
+        del children[i]
+        i -= 1
+    else:
+        assert right is not None
+        merged_nodes = child_nodes + [nodes[i]] + right[0]
+        merged_children = child_children + right[1]
+        del nodes[i]
+        del children[i+1]
+    assert len(merged_nodes) <= max_list_len
+    children[i] = link_list(merged_nodes, merged_children)
@@ -0,0 +1,470 @@
+# Embedded ordered key-value store organized as a log-structured merge tree:
+# a D2LTree is the (mutable) memtable and the older data lives in immutable
+# sorted runs on disk.
+#
+# How it works:
+# - Writes go to the WAL of the current memtable (see wal.py) and then to the
+#   memtable. Deletions are written as *tombstones*.
+# - When the memtable is full, it's frozen and a fresh one takes its place.
+#   A background worker flushes the frozen memtable to a new run and deletes
+#   its WAL.
+# - When there are `max_runs` runs, the worker merges them into a single run
+#   (the tombstones can then be dropped since nothing older remains).
+# - Reads look at the memtable, then at the frozen memtables, and then at the
+#   runs, from the newest to the oldest, and stop at the first hit.
+# - The MANIFEST file lists the live runs (newest first). It's replaced
+#   atomically, so a crash leaves either the old or the new set of runs.
+#
+# Run files:
+#   MAGIC | records | index | <Q: index offset> <Q: num records> MAGIC
+# where a record is
+#   <B: 0> key val      (value)
+#   <B: 1> key          (tombstone)
+# and the index is the codec.py encoding of the tuple
+#   (key_0, offset_0, key_1, offset_1, ...)
+# of the key and offset of every `index_every`-th record (a sparse index).
+#
+# NOTE:
+# - The keys and values must be encodable with codec.py.
+# - An LSMStore must be used by one thread at a time (the background worker
+#   aside).
+
+from __future__ import annotations
+import heapq
+import mmap
+import os
+from bisect import bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from struct import Struct
+from threading import Lock
+from typing import Any, Final, Iterable, Iterator, List, Tuple
+from codec import decode, encode, encode_bytes
+from D2LTree import D2LTree
+from misc import NotFound, _Missing, _missing, notFound
+from wal import OP_DEL, OP_SET, WriteAheadLog, _encode_record, read_log
+
+class _Tombstone(Enum):
+    tombstone = 0
+_tombstone: Final = _Tombstone.tombstone
+
+RUN_MAGIC: Final = b'LEXIRUN1'
+_FOOTER: Final = Struct('<QQ8s')
+
+_REC_VALUE: Final = 0
+_REC_TOMBSTONE: Final = 1
+
+def _write_run(path: str, items: Iterable[Tuple[Any, Any]],
+               index_every: int):
+    """Writes the (key, val or _tombstone) pairs, in key order, to a new run
+    file."""
+    out = bytearray(RUN_MAGIC)
+    index: list[Any] = []
+    n = 0
+    for key, val in items:
+        if n % index_every == 0:
+            index.append(key)
+            index.append(len(out))
+        if val is _tombstone:
+            out.append(_REC_TOMBSTONE)
+            encode(key, out)
+        else:
+            out.append(_REC_VALUE)
+            encode(key, out)
+            encode(val, out)
+        n += 1
+    index_offset = len(out)
+    encode(tuple(index), out)
+    out += _FOOTER.pack(index_offset, n, RUN_MAGIC)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(out)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class _Run:
+    """Immutable sorted run, memory-mapped.
+    NOTE: The readers of the store `acquire` the runs they read (under the
+        lock of the store) and `release` them when they're done, so that a
+        run removed by a compaction (`retire`) is only unmapped once its last
+        reader is done."""
+    path: str
+    num_records: int
+    _map: mmap.mmap
+    _index_keys: List[Any]
+    _index_offsets: List[int]
+    _data_end: int
+    _users: int
+    _retired: bool
+    _users_lock: Lock
+
+    def __init__(self, path: str):
+        self.path = path
+        self._users = 0
+        self._retired = False
+        self._users_lock = Lock()
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        m = self._map
+        index_offset, self.num_records, magic = \
+            _FOOTER.unpack_from(m, len(m) - _FOOTER.size)
+        if m[:len(RUN_MAGIC)] != RUN_MAGIC or magic != RUN_MAGIC:
+            raise ValueError(f"{path} is not a run file")
+        index = decode(m, index_offset)[0]
+        self._index_keys = list(index[0::2])
+        self._index_offsets = list(index[1::2])
+        self._data_end = index_offset
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            if self._retired and self._users == 0:
+                self._map.close()
+
+    def retire(self):
+        """Unmaps the run now or when its last reader releases it."""
+        with self._users_lock:
+            self._retired = True
+            if self._users == 0:
+                self._map.close()
+
+    def _records(self, pos: int) -> Iterator[Tuple[Any, Any]]:
+        m = self._map
+        end = self._data_end
+        while pos < end:
+            tag = m[pos]
+            key, pos = decode(m, pos + 1)
+            if tag == _REC_TOMBSTONE:
+                yield key, _tombstone
+            else:
+                val, pos = decode(m, pos)
+                yield key, val
+
+    def get(self, key: Any) -> Any | _Tombstone | NotFound:
+        i = bisect_right(self._index_keys, key) - 1
+        if i < 0:
+            return notFound
+        for k, v in self._records(self._index_offsets[i]):
+            if key < k:
+                break
+            if not (k < key):
+                return v
+        return notFound
+
+    def items(self, from_key: Any = _missing) -> Iterator[Tuple[Any, Any]]:
+        """Yields the (key, val or _tombstone) pairs with key >= from_key."""
+        if not self._index_offsets:
+            return
+        i = 0
+        if from_key is not _missing:
+            i = max(0, bisect_right(self._index_keys, from_key) - 1)
+        for k, v in self._records(self._index_offsets[i]):
+            if from_key is _missing or not (k < from_key):
+                yield k, v
+
+class LSMStore:
+    directory: str
+    memtable_size: int
+    max_runs: int
+    index_every: int
+    _memtable: D2LTree
+    _wal: WriteAheadLog
+    _wal_seq: int
+    _frozen: List[Tuple[D2LTree, int]]     # (memtable, WAL seq), newest first
+    _runs: List[_Run]                       # newest first
+    _next_run_id: int
+    _flushed_seq: int
+    _lock: Lock
+    _worker: ThreadPoolExecutor
+    _pending: List[Future]
+    _max_frozen: int
+    _group_size: int
+    _group_delay: float
+
+    def __init__(self, directory: str | os.PathLike, *,
+                 memtable_size: int = 100_000, max_runs: int = 4,
+                 index_every: int = 64, max_frozen: int = 2,
+                 group_size: int = 64, group_delay: float = 0.01):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.memtable_size = memtable_size
+        self.max_runs = max_runs
+        self.index_every = index_every
+        self._max_frozen = max_frozen
+        self._group_size = group_size
+        self._group_delay = group_delay
+        self._lock = Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+        self._frozen = []
+        self._recover()
+
+    # files
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _wal_path(self, seq: int) -> str:
+        return self._path(f"wal-{seq:08d}.log")
+
+    def _write_manifest(self):
+        """NOTE: Called with self._lock held (or before the worker starts)."""
+        data = encode_bytes((tuple(os.path.basename(r.path)
+                                   for r in self._runs),
+                             self._next_run_id, self._flushed_seq))
+        tmp_path = self._path('MANIFEST.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path('MANIFEST'))
+
+    def _recover(self):
+        run_names: Tuple[str, ...] = ()
+        self._next_run_id = 0
+        self._flushed_seq = -1
+        try:
+            with open(self._path('MANIFEST'), 'rb') as f:
+                run_names, self._next_run_id, self._flushed_seq = \
+                    decode(f.read())[0]
+        except FileNotFoundError:
+            pass
+        self._runs = [_Run(self._path(name)) for name in run_names]
+        # removes the leftovers of interrupted flushes and compactions
+        live = set(run_names)
+        wal_seqs = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.run') and name not in live or \
+                    name.endswith('.tmp'):
+                os.remove(self._path(name))
+            elif name.startswith('wal-') and name.endswith('.log'):
+                seq = int(name[4:-4])
+                if seq <= self._flushed_seq:
+                    os.remove(self._path(name))
+                else:
+                    wal_seqs.append(seq)
+        # replays the WALs of the memtables that weren't flushed
+        self._memtable = D2LTree(0, 0)
+        for seq in sorted(wal_seqs):
+            for op, key, val in read_log(self._wal_path(seq))[0]:
+                self._memtable[key] = val if op == OP_SET else _tombstone
+        if len(self._memtable) > 0:
+            run = self._flush_memtable(self._memtable)
+            self._runs.insert(0, run)
+            self._flushed_seq = max(wal_seqs)
+            self._write_manifest()
+            self._memtable = D2LTree(0, 0)
+        # NOTE: The WALs are removed even if they were empty, so that
+        #   reopening an idle store doesn't leave one more WAL each time.
+        for seq in wal_seqs:
+            os.remove(self._wal_path(seq))
+        self._wal_seq = self._flushed_seq + 1
+        self._wal = self._open_wal()
+
+    def _open_wal(self) -> WriteAheadLog:
+        return WriteAheadLog(self._wal_path(self._wal_seq),
+                             group_size=self._group_size,
+                             group_delay=self._group_delay)
+
+    # background work
+
+    def _flush_memtable(self, memtable: D2LTree) -> _Run:
+        path = self._path(f"{self._next_run_id:08d}.run")
+        self._next_run_id += 1
+        _write_run(path, memtable.items(), self.index_every)
+        return _Run(path)
+
+    def _flush_frozen(self, memtable: D2LTree, seq: int):
+        """Runs in the worker."""
+        run = self._flush_memtable(memtable)
+        with self._lock:
+            self._runs.insert(0, run)
+            self._frozen.remove((memtable, seq))
+            self._flushed_seq = seq
+            self._write_manifest()
+        os.remove(self._wal_path(seq))
+        if len(self._runs) >= self.max_runs:
+            self._compact()
+
+    def _compact(self):
+        """Merges all the runs into one. Runs in the worker."""
+        runs = list(self._runs)
+        if len(runs) <= 1:
+            return
+        path = self._path(f"{self._next_run_id:08d}.run")
+        self._next_run_id += 1
+        # NOTE: All the runs are merged, so the tombstones can be dropped.
+        merged = (kv for kv in _merge([r.items() for r in runs])
+                  if kv[1] is not _tombstone)
+        _write_run(path, merged, self.index_every)
+        new_run = _Run(path)
+        with self._lock:
+            # NOTE: No run can have been added meanwhile since flushes also
+            #   run in the worker.
+            self._runs = [new_run]
+            self._write_manifest()
+        for run in runs:
+            run.retire()
+            os.remove(run.path)
+
+    def _freeze(self):
+        """Freezes the memtable and schedules its flush."""
+        self._wal.close()
+        frozen = (self._memtable, self._wal_seq)
+        with self._lock:
+            self._frozen.insert(0, frozen)
+        self._pending.append(self._worker.submit(self._flush_frozen, *frozen))
+        self._memtable = D2LTree(0, 0)
+        self._wal_seq += 1
+        self._wal = self._open_wal()
+        # backpressure: waits if the worker is too far behind
+        while len(self._pending) > self._max_frozen or \
+                (self._pending and self._pending[0].done()):
+            self._pending.pop(0).result()       # (re)raises any error
+
+    # API
+
+    def _write(self, key: Any, val: Any):
+        if val is _tombstone:
+            record = _encode_record(OP_DEL, key)
+        else:
+            record = _encode_record(OP_SET, key, val)
+        # NOTE: The record is encoded first and logged last, so that keys and
+        #   values that can't be encoded or compared are rejected before
+        #   anything is modified (a logged record would fail the recovery).
+        self._memtable[key] = val
+        self._wal.append(record)
+        if len(self._memtable) >= self.memtable_size:
+            self._freeze()
+
+    def __setitem__(self, key: Any, val: Any):
+        self._write(key, val)
+
+    def delete(self, key: Any):
+        """Deletes `key` without checking whether it's present."""
+        self._write(key, _tombstone)
+
+    def __delitem__(self, key: Any):
+        if key not in self:
+            raise KeyError
+        self.delete(key)
+
+    def _lookup(self, key: Any) -> Any | _Tombstone | NotFound:
+        val = self._memtable._find(key)
+        if val is not notFound:
+            return val
+        with self._lock:
+            frozen = [m for m, _ in self._frozen]
+            runs = list(self._runs)
+            for run in runs:
+                run.acquire()
+        try:
+            for memtable in frozen:
+                val = memtable._find(key)
+                if val is not notFound:
+                    return val
+            for run in runs:
+                val = run.get(key)
+                if val is not notFound:
+                    return val
+            return notFound
+        finally:
+            for run in runs:
+                run.release()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        val = self._lookup(key)
+        return default if val is notFound or val is _tombstone else val
+
+    def __getitem__(self, key: Any) -> Any:
+        val = self._lookup(key)
+        if val is notFound or val is _tombstone:
+            raise KeyError
+        return val
+
+    def __contains__(self, key: Any) -> bool:
+        val = self._lookup(key)
+        return val is not notFound and val is not _tombstone
+
+    def items(self, from_key: Any = _missing,
+              to_key: Any = _missing) -> Iterator[Tuple[Any, Any]]:
+        """Yields the pairs (key, val) with from_key <= key <= to_key in key
+        order.
+        NOTE: The range of the memtable is copied first, so the store can be
+            modified during the iteration (without affecting it).
+        """
+        with self._lock:
+            frozen = [m for m, _ in self._frozen]
+            runs = list(self._runs)
+            for run in runs:
+                run.acquire()
+        try:
+            sources: list[Iterable[Tuple[Any, Any]]] = [
+                list(self._memtable.items(from_key, to_key))]
+            sources += [m.items(from_key, to_key) for m in frozen]
+            sources += [r.items(from_key) for r in runs]
+            for k, v in _merge(sources):
+                if to_key is not _missing and to_key < k:
+                    return
+                if v is not _tombstone:
+                    yield k, v
+        finally:
+            for run in runs:
+                run.release()
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        return self.items()
+
+    def commit(self):
+        """Makes all the writes so far durable."""
+        self._wal.commit()
+
+    def flush(self):
+        """Flushes the memtable to a run and waits for the worker."""
+        if len(self._memtable) > 0:
+            self._freeze()
+        self.wait()
+
+    def compact(self):
+        """Merges all the runs into one and waits for it."""
+        self.wait()
+        self._worker.submit(self._compact).result()
+
+    def wait(self):
+        """Waits until the worker is idle."""
+        while self._pending:
+            self._pending.pop(0).result()
+
+    def close(self):
+        self.wait()
+        self._wal.close()
+        self._worker.shutdown()
+        for run in self._runs:
+            run.retire()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _merge(sources: List[Iterable[Tuple[Any, Any]]]) -> \
+        Iterator[Tuple[Any, Any]]:
+    """Merges sorted sources given from the newest to the oldest. For each key,
+    only the newest pair is kept."""
+    def tagged(source: Iterable[Tuple[Any, Any]], age: int):
+        for k, v in source:
+            yield k, age, v
+    # NOTE: (key, age) pairs are all distinct, so values are never compared.
+    last: Any = _missing
+    for k, _, v in heapq.merge(*(tagged(s, age)
+                                 for age, s in enumerate(sources))):
+        if last is not _missing and not (last < k):
+            continue            # older version
+        last = k
+        yield k, v
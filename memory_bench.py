@@ -0,0 +1,142 @@
+# Measures the memory used to build and churn the trees.
+#
+# For each tree type, key picker and size n:
+# 1. build: n insertions of `get_ins_key()`;
+# 2. churn: n operations alternating a removal of `get_del_key()` and an
+#    insertion (so the size stays around n).
+# After each phase, the current and peak traced memory (tracemalloc) and the
+# peak RSS (`ru_maxrss`) are recorded, as well as `memory_report()` after the
+# build.
+#
+# NOTE:
+# - Each configuration runs in its own (spawned) process, since the peak RSS
+#   of a process never goes down.
+# - The traced memory includes the key picker, which remembers the keys it
+#   can return for removal, and the values (floats). `memory_report()` is
+#   the tree alone.
+# - tracemalloc slows everything down about 2-3 times, and the peaks
+#   include its own overhead in RSS (but not in the traced memory). With
+#   `--no-trace` only the RSS is measured.
+# - 20M keys take several GB of RAM and hours per configuration.
+
+from __future__ import annotations
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from multiprocessing import get_context
+from random import random, seed
+import resource
+from time import time
+import tracemalloc
+
+from generic import Tree
+from test import TestType, TreeType, key_pickers, make_tree
+
+_MB = 1 << 20
+
+@dataclass
+class MemoryStats:
+    tree_type: TreeType
+    test_type: TestType
+    num_keys: int
+    len: int = 0                        # after the churn
+    build_time: float = 0.
+    build_cur_mb: float = 0.            # traced
+    build_peak_mb: float = 0.
+    build_rss_mb: float = 0.            # peak
+    churn_time: float = 0.
+    churn_cur_mb: float = 0.
+    churn_peak_mb: float = 0.
+    churn_rss_mb: float = 0.
+    tree_mb: float = 0.                 # memory_report() after the build
+    bytes_per_key: float = 0.
+
+def _peak_rss_mb() -> float:
+    # NOTE: ru_maxrss is in KB on Linux (and in bytes on macOS).
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _traced_mb() -> tuple[float, float]:
+    if not tracemalloc.is_tracing():
+        return 0., 0.
+    cur, peak = tracemalloc.get_traced_memory()
+    return cur / _MB, peak / _MB
+
+def measure(tree_type: TreeType, test_type: TestType, num_keys: int, *,
+            trace: bool = True, rand_seed: int | None = 45) -> MemoryStats:
+    seed(rand_seed)
+    stats = MemoryStats(tree_type, test_type, num_keys)
+    if trace:
+        tracemalloc.start()
+    kp = key_pickers[test_type]()
+    tree: Tree = make_tree(tree_type)
+
+    t = time()
+    for _ in range(num_keys):
+        tree[kp.get_ins_key()] = random()
+    stats.build_time = time() - t
+    stats.build_cur_mb, stats.build_peak_mb = _traced_mb()
+    stats.build_rss_mb = _peak_rss_mb()
+
+    report = tree.memory_report()
+    stats.tree_mb = report.total_bytes / _MB
+    stats.bytes_per_key = report.bytes_per_key
+    if trace:
+        tracemalloc.reset_peak()
+
+    t = time()
+    for i in range(num_keys):
+        if i % 2 == 0:
+            key = kp.get_del_key()
+            if key is not None:
+                tree.remove(key, None)
+        else:
+            tree[kp.get_ins_key()] = random()
+    stats.churn_time = time() - t
+    stats.churn_cur_mb, stats.churn_peak_mb = _traced_mb()
+    stats.churn_rss_mb = _peak_rss_mb()
+    stats.len = len(tree)
+    if trace:
+        tracemalloc.stop()
+    return stats
+
+def _measure_args(args: tuple) -> MemoryStats:
+    tree_type, test_type, num_keys, trace = args
+    return measure(tree_type, test_type, num_keys, trace=trace)
+
+def run_all(tree_types: list[TreeType], test_types: list[TestType],
+            sizes: list[int], *, trace: bool = True,
+            fname: str | None = 'data/memory_bench.txt') -> list[MemoryStats]:
+    names = [f.name for f in fields(MemoryStats)]
+    all_stats = []
+    if fname is not None:
+        with open(fname, 'w') as f:
+            print('\t'.join(names), file=f)
+    for num_keys in sizes:
+        for tree_type in tree_types:
+            for test_type in test_types:
+                # (a fresh process for each configuration)
+                with ProcessPoolExecutor(
+                        1, mp_context=get_context('spawn')) as pool:
+                    stats = pool.submit(
+                        _measure_args,
+                        (tree_type, test_type, num_keys, trace)).result()
+                all_stats.append(stats)
+                row = [getattr(stats, name) for name in names]
+                print(' '.join(f'{x:.1f}' if isinstance(x, float) else str(x)
+                               for x in row), flush=True)
+                if fname is not None:
+                    with open(fname, 'a') as f:
+                        print('\t'.join(map(str, row)), file=f)
+    return all_stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trees', nargs='+', default=['det2', 'det3', 'prob'])
+    parser.add_argument('--pickers', nargs='+', default=list(key_pickers))
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1_000_000, 10_000_000, 20_000_000])
+    parser.add_argument('--no-trace', action='store_true')
+    parser.add_argument('--out', default='data/memory_bench.txt')
+    args = parser.parse_args()
+    run_all(args.trees, args.pickers, args.sizes, trace=not args.no_trace,
+            fname=args.out)
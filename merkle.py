@@ -0,0 +1,239 @@
+# Trees that keep a hash of each subtree, to find and repair the differences
+# between replicas.
+#
+# NOTE:
+# - The hash of a subtree is the digest (see digest.py) of its (key, value)
+#   pairs, i.e. the sum of their hashes modulo 2^128. Unlike a hash of the
+#   children's hashes, it doesn't depend on the shape of the tree, so that
+#   the trees of two replicas (which can have different types or histories)
+#   can be compared range by range: `range_hash` adds up O(height) subtree
+#   hashes, like a prefix sum.
+# - `diff` walks the subtrees of one tree and only goes down into those
+#   whose hash differs from the hash of the same key range in the other
+#   tree. With d differences, it visits O(d height) nodes, each costing a
+#   `range_hash` and a lookup in the other tree, so O(d log^2 n) in total.
+#   `sync` then copies only the differing pairs.
+# - The hashes are kept up to date as in depth_hist.py: the nodes record
+#   the changes of their links (by lift, lower and the chain merges of
+#   k-Lexi trees) and values during an operation (see relink_log.py), and
+#   afterwards, only the
+#   hashes of the nodes on the paths to them are recomputed, in a single
+#   post-order descent.
+#   The bulk builds (`_link_sorted`) recompute all the hashes in O(n).
+# - Each node holds two 128-bit ints (the hash of its pair and of its
+#   subtree), i.e. about 100 more bytes. Every insertion or removal rehashes
+#   a whole path, and writing the links goes through `__setattr__`, so they
+#   are about 7 times slower than in the plain trees. Lookups aren't
+#   affected.
+
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Any, Final, Iterable, Iterator
+from digest import DIGEST_MOD, pair_digest
+from generic import K, V, T, Tree
+from misc import NotFound, notFound
+from misc import _Missing, _missing
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree, _SetViaInsert
+from relink_log import Changes, _LoggedDL, _LoggedPL, run_logged
+
+_MASK: Final[int] = DIGEST_MOD - 1
+
+class _NotInTree(Exception):
+    pass
+
+class _Merkle:
+    """Mixin that keeps the hash of each subtree of a tree.
+    NOTE: Each node gets an `h` (the hash of its pair) and an `hsum` (the hash
+    of its subtree)."""
+
+    def _rehash_all(self):
+        # post-order, with an explicit stack
+        stack = [(self.first, False)]               # type: ignore
+        while stack:
+            node, done = stack.pop()
+            if node is None:
+                continue
+            if done:
+                _rehash(node)
+            else:
+                node.h = pair_digest(node.key, node.val)
+                stack.append((node, True))
+                stack.append((node.left, False))
+                stack.append((node.right, False))
+
+    def _run(self, method, key, args: tuple, h: int | None = None):
+        """Runs `method(key, *args)` and rehashes what it changed. `h` is the
+        hash of the pair (key, args[0]) for insertions."""
+        ret, changes = run_logged(method, key, *args)
+        if changes is not None and changes.nodes:
+            try:
+                self._update(changes, key, args, h)
+            except _NotInTree:                      # (not expected)
+                self._rehash_all()
+        return ret
+
+    def _set(self, method, key, val, *args):
+        # NOTE: Hashing first rejects the pairs codec.py can't encode before
+        #   the tree is modified.
+        self._run(method, key, (val, *args), pair_digest(key, val))
+
+    def _update(self, changes: Changes, key, args: tuple, h: int | None):
+        root = self._root                           # type: ignore
+        freed = {id(node) for node in changes.freed}
+        targets = []
+        for x, _, _, old_val in changes.nodes.values():
+            if x is root or id(x) in freed:
+                continue
+            if x.val is not old_val:    # (created or given a new value)
+                x.h = h if h is not None and x.key == key and \
+                           x.val is args[0] else pair_digest(x.key, x.val)
+            targets.append(x.key)
+        targets.sort()
+
+        # Rehashes the nodes on the paths to the targets, children first, in
+        # a single descent. The children that aren't on the paths have the
+        # same subtrees as before.
+        stack = [(self.first, 0, len(targets), False)]  # type: ignore
+        while stack:
+            node, lo, hi, done = stack.pop()
+            if done:
+                _rehash(node)
+                continue
+            if node is None:
+                raise _NotInTree
+            stack.append((node, lo, hi, True))
+            node_key = node.key
+            i = bisect_left(targets, node_key, lo, hi)
+            j = i + 1 if i < hi and not node_key < targets[i] else i
+            if lo < i:
+                stack.append((node.left, lo, i, False))
+            if j < hi:
+                stack.append((node.right, j, hi, False))
+
+    def __setitem__(self, key: K, val: V):
+        self._set(super().__setitem__, key, val)    # type: ignore
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        return self._run(super().remove, key, (default,))  # type: ignore
+
+    def _link_sorted(self, keys: Iterable[K], vals: Iterable[V],
+                     levels: Iterable[int]):
+        super()._link_sorted(keys, vals, levels)    # type: ignore
+        self._rehash_all()
+
+    def digest(self) -> int:
+        """Returns the digest of the (key, value) pairs of the tree (the same
+        as `digest.content_digest(self.items())`), in O(1)."""
+        first = self.first                          # type: ignore
+        return 0 if first is None else first.hsum
+
+    def _hash_below(self, key: K, inclusive: bool) -> int:
+        """Returns the hash of the pairs with keys < `key` (<= if
+        `inclusive`)."""
+        acc = 0
+        cur = self.first                            # type: ignore
+        while cur is not None:
+            if cur.key < key or (inclusive and not key < cur.key):
+                left = cur.left
+                acc += cur.h if left is None else cur.h + left.hsum
+                cur = cur.right
+            else:
+                cur = cur.left
+        return acc & _MASK
+
+    def range_hash(self, from_key: K | _Missing = _missing,
+                   to_key: K | _Missing = _missing, *,
+                   exclusive: bool = False) -> int:
+        """Returns the digest of the pairs with from_key <= key <= to_key (or
+        from_key < key < to_key if `exclusive`), in O(height). A missing
+        bound means no bound."""
+        if from_key is not _missing and to_key is not _missing and \
+                (to_key < from_key or (exclusive and not from_key < to_key)):
+            return 0
+        hi = self.digest() if to_key is _missing else \
+             self._hash_below(to_key, not exclusive)
+        lo = 0 if from_key is _missing else \
+             self._hash_below(from_key, exclusive)
+        return (hi - lo) & _MASK
+
+    def _diff_pairs(self, other: Any) -> Iterator[tuple[K, V | NotFound]]:
+        # Each subtree holds the keys strictly between `lo` and `hi`.
+        stack: list[tuple[Any, Any, Any]] = \
+            [(self.first, _missing, _missing)]      # type: ignore
+        while stack:
+            node, lo, hi = stack.pop()
+            ours = 0 if node is None else node.hsum
+            if ours == other.range_hash(lo, hi, exclusive=True):
+                continue
+            if node is None:
+                for key, val in other.items(lo, hi):
+                    if (lo is _missing or lo < key) and \
+                            (hi is _missing or key < hi):
+                        yield key, val
+                continue
+            val = other._find(node.key)
+            if val is notFound or pair_digest(node.key, val) != node.h:
+                yield node.key, val
+            stack.append((node.right, node.key, hi))
+            stack.append((node.left, lo, node.key))
+
+    def diff(self, other: Any) -> Iterator[K]:
+        """Yields the keys whose values differ between `self` and `other`
+        (including the keys that are only in one of them), in no particular
+        order.
+        NOTE:
+        - `other` can be any object with the `range_hash`, `_find` and
+          `items` of a Merkle tree, e.g. a proxy of a remote replica.
+        - The trees must not be modified during the iteration."""
+        for key, _ in self._diff_pairs(other):
+            yield key
+
+    def sync(self, source: Any) -> int:
+        """Makes `self` hold the same pairs as `source` by copying only the
+        differing pairs (see `diff`), and returns their number."""
+        pairs = list(self._diff_pairs(source))
+        for key, val in pairs:
+            if val is notFound:
+                self.remove(key)
+            else:
+                self[key] = val                     # type: ignore
+        return len(pairs)
+
+    def _check(self):
+        super()._check()                            # type: ignore
+        stack = [self.first]                        # type: ignore
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                assert node.h == pair_digest(node.key, node.val)
+                hsum = node.h
+                for child in (node.left, node.right):
+                    if child is not None:
+                        hsum += child.hsum
+                        stack.append(child)
+                assert node.hsum == hsum & _MASK
+
+def _rehash(node: Any):
+    left = node.left
+    right = node.right
+    hsum = node.h
+    if left is not None:
+        hsum += left.hsum
+    if right is not None:
+        hsum += right.hsum
+    object.__setattr__(node, 'hsum', hsum & _MASK)
+
+class MerkleD2LTree(_Merkle, _LoggedDL, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class MerkleD3LTree(_Merkle, _LoggedDL, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class MerkleDkLTree(_Merkle, _LoggedDL, DkLTree[K, V]):
+    pass
+
+class MerklePLTree(_SetViaInsert, _Merkle, _LoggedPL, PLTree[K, V]):
+    pass
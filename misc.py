@@ -1,4 +1,6 @@
 from __future__ import annotations
+import gc
+from contextlib import contextmanager
 from enum import Enum
 from typing import Final
 
@@ -10,5 +12,22 @@ class NotFound(Enum):
 _missing: Final = _Missing.missing
 notFound: Final = NotFound.not_found
 
+# Counters of the operation in progress of a counting tree (see
+# op_counters.py), or None. lift.py and the lower modules count their cases
+# in it.
+_op_counters: dict[str, int] | None = None
+
 def default(x, default):
     return x if x is not None else default
+
+@contextmanager
+def gc_paused():
+    """Pauses the cyclic GC, which would otherwise run over and over (for
+    nothing) while we create many linked nodes in a row."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
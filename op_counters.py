@@ -0,0 +1,147 @@
+# Trees that count the work done by their operations.
+#
+# NOTE:
+# - The counters are (with <op> in get, set, del):
+#     <op>.ops              number of operations
+#     <op>.comparisons      key comparisons
+#     <op>.visits           nodes whose key was compared
+#     lift                  calls to lift (lift.py or liftk.py)
+#     lower.<case>          lowerings by case (Left1, Right1, RightHi1, Left2,
+#                           Right2 and, for 3-Lexi trees, Left3 and Right3;
+#                           BorrowLeft, BorrowRight and Merge for k-Lexi
+#                           trees)
+#     holes                 holes created (2-Lexi trees) or filled (by the
+#                           bottom-up removals of k-Lexi trees). The other
+#                           trees never leave holes.
+#     allocations, frees    nodes created and freed
+# - The comparisons are counted by passing the trees a probe that wraps the
+#   key and counts the calls to its comparison methods. A comparison like
+#   `cur.key < probe` reaches the probe because the key's own `__lt__`
+#   returns NotImplemented for it, as the builtin types do.
+# - lift.py and the lower modules count their cases in `misc._op_counters`,
+#   which is only set during the operations of a counting tree. Otherwise
+#   the cost is one test of a global per call, which isn't measurable since
+#   these calls are O(1) amortized per operation.
+# - The counting can be switched off (`counting = False`), in which case
+#   the operations are only slowed down by the forwarding.
+
+from __future__ import annotations
+from collections import Counter
+from typing import Any
+from generic import K, V, T, Tree
+import misc
+from misc import NotFound
+from misc import _Missing, _missing
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree
+
+class _Probe:
+    """Wraps a key and counts the comparisons with it."""
+    __slots__ = ('key', 'counters', 'comparisons', 'visits', 'last')
+    key: Any
+    counters: Counter[str]
+    comparisons: str            # names of the counters
+    visits: str
+    last: Any                   # last key compared
+
+    def __init__(self, key: Any, counters: Counter[str], op: str):
+        self.key = key
+        self.counters = counters
+        self.comparisons = op + '.comparisons'
+        self.visits = op + '.visits'
+        self.last = self            # (no key yet)
+
+    def _count(self, other: Any) -> Any:
+        counters = self.counters
+        counters[self.comparisons] += 1
+        if other is not self.last:
+            self.last = other
+            counters[self.visits] += 1
+        return other.key if type(other) is _Probe else other
+
+    def __lt__(self, other: Any) -> bool:
+        return self.key < self._count(other)
+
+    def __gt__(self, other: Any) -> bool:
+        return self._count(other) < self.key
+
+    def __eq__(self, other: Any) -> bool:
+        return self.key == self._count(other)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+def _unwrap(key: Any) -> Any:
+    return key.key if type(key) is _Probe else key
+
+class _Counting:
+    """Mixin that counts the work done by the operations of a tree."""
+    counting: bool
+    _counters: Counter[str]
+
+    def __init__(self, *args, counting: bool = True, **kwargs):
+        self.counting = counting
+        self._counters = Counter()
+        super().__init__(*args, **kwargs)               # type: ignore
+
+    def op_counts(self) -> dict[str, int]:
+        """Returns a snapshot of the counters."""
+        return dict(self._counters)
+
+    def reset_op_counts(self):
+        self._counters = Counter()
+
+    def _run(self, op: str, method, key, *args):
+        counters = self._counters
+        counters[op + '.ops'] += 1
+        misc._op_counters = counters
+        try:
+            return method(_Probe(key, counters, op), *args)
+        finally:
+            misc._op_counters = None
+
+    # NOTE: `__contains__` and `__getitem__` call `_find`.
+    def _find(self, key: K) -> V | NotFound:
+        if not self.counting:
+            return super()._find(key)                   # type: ignore
+        return self._run('get', super()._find, key)     # type: ignore
+
+    def __setitem__(self, key: K, val: V):
+        if not self.counting:
+            return super().__setitem__(key, val)        # type: ignore
+        self._run('set', super().__setitem__, key, val) # type: ignore
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        if not self.counting:
+            return super().remove(key, default)         # type: ignore
+        return self._run('del', super().remove, key,    # type: ignore
+                         default)
+
+    def _new_node(self, key, val, *args):
+        if self.counting:
+            self._counters['allocations'] += 1
+        return super()._new_node(_unwrap(key), val, *args)  # type: ignore
+
+    def _free_node(self, node):
+        if self.counting:
+            self._counters['frees'] += 1
+        super()._free_node(node)                        # type: ignore
+
+class CountingD2LTree(_Counting, D2LTree[K, V], Tree[K, V]):
+    def _replace_with_leaf(self, *args) -> bool:
+        hole = super()._replace_with_leaf(*args)
+        if hole and self.counting:
+            self._counters['holes'] += 1
+        return hole
+
+class CountingD3LTree(_Counting, D3LTree[K, V], Tree[K, V]):
+    pass
+
+class CountingDkLTree(_Counting, DkLTree[K, V]):
+    pass
+
+class CountingPLTree(_Counting, PLTree[K, V]):
+    def _hash_level(self, key: K) -> int:
+        return super()._hash_level(_unwrap(key))
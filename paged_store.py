@@ -0,0 +1,387 @@
+# 2-Lexi and 3-Lexi trees whose nodes live in a memory-mapped file, so that
+# they can be larger than RAM.
+#
+# File layout:
+#   page 0      header (see _HEADER)
+#   page i > 0  <H: num free slots> <H: first free slot> <B: in free list>
+#               <3 bytes padding> <I: next page with free slots>
+#               followed by fixed-size node records
+# Node records:
+#   key (<q> or <d>) | val (<q> or <d>) | <Q: left id> | <Q: right id> |
+#   <B: flags> | padding
+# A node id is page_number * slots_per_page + slot, so 0 (in the header page)
+# means None. A free slot stores the next free slot of its page in `left`.
+#
+# NOTE:
+# - The algorithms in D2LTree, D3LTree, lift.py, lower2.py and lower3.py are
+#   used as they are: they see the nodes through *handles* with the same
+#   attributes as _DNode. Handles are interned, so `is` still works.
+# - Pages are copied from the map into an LRU cache of bytearrays and written
+#   back when evicted (if dirty) or on `flush`.
+# - A new node is allocated, if possible, in the same page as the node next
+#   to it in its list, so that the nodes of a list tend to share a page and a
+#   descent touches fewer pages. Lifts and lowers don't move nodes, though.
+# - The keys and values are ints or floats (see `key_format`, `val_format`).
+# - Nothing is durable until `flush` (or `close`) is called.
+
+from __future__ import annotations
+import mmap
+import os
+from collections import OrderedDict
+from struct import Struct
+from typing import Any, Final, Literal
+from weakref import WeakValueDictionary
+from generic import K, V, Tree
+from DLTree_misc import _DNode
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+
+MAGIC: Final = b'LEXIPAGE'
+VERSION: Final = 1
+
+# magic, version, max_list_len, key format, val format, page size,
+# num pages, first page with free slots, len, root id
+_HEADER: Final = Struct('<8sBBccIQQQQ')
+_PAGE_HEADER: Final = Struct('<HHB3xI')
+_PAGE_HEADER_SIZE: Final = 16
+_U64: Final = Struct('<Q')
+
+_KEY: Final = 0
+_VAL: Final = 8
+_LEFT: Final = 16
+_RIGHT: Final = 24
+_FLAGS: Final = 32
+_RECORD_SIZE: Final = 40
+
+_HIGH_RIGHT: Final = 1
+_IN_USE: Final = 2
+
+_NO_SLOT: Final = 0xFFFF
+
+_GROW_PAGES: Final = 256            # min number of pages added to the file
+
+class PageStore:
+    """Fixed-size node records in the pages of a memory-mapped file."""
+    path: str
+    page_size: int
+    slots_per_page: int
+    max_list_len: int
+    num_pages: int
+    free_page_head: int
+    len: int
+    root_id: int
+    _key: Struct
+    _val: Struct
+    _file: Any
+    _map: mmap.mmap
+    _cache: OrderedDict[int, bytearray]
+    _dirty: set[int]
+    _cache_pages: int
+    _handles: WeakValueDictionary[int, _PagedNode]
+
+    def __init__(self, path: str | os.PathLike, max_list_len: int, *,
+                 key_format: Literal['q', 'd'] = 'q',
+                 val_format: Literal['q', 'd'] = 'q',
+                 page_size: int = 4096, cache_pages: int = 1024):
+        """Opens the store at `path` or creates it.
+        NOTE: When opening an existing store, the formats and page size are
+            read from the file.
+        """
+        self.path = os.fspath(path)
+        self._cache = OrderedDict()
+        self._dirty = set()
+        self._cache_pages = max(1, cache_pages)
+        self._handles = WeakValueDictionary()
+        exists = os.path.exists(self.path) and \
+                 os.path.getsize(self.path) > 0
+        self._file = open(self.path, 'r+b' if exists else 'w+b')
+        if exists:
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            (magic, version, self.max_list_len, kf, vf, self.page_size,
+             self.num_pages, self.free_page_head, self.len,
+             self.root_id) = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError("not a page store")
+            if version != VERSION:
+                raise ValueError(f"unsupported version {version}")
+            if self.max_list_len != max_list_len:
+                raise ValueError(f"the store is for lists of length up to "
+                                 f"{self.max_list_len}")
+            key_format, val_format = kf.decode(), vf.decode()   # type: ignore
+        else:
+            self.max_list_len = max_list_len
+            self.page_size = page_size
+            self.num_pages = 1
+            self.free_page_head = 0
+            self.len = 0
+            self._file.truncate(page_size * _GROW_PAGES)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self.slots_per_page = (self.page_size -
+                               _PAGE_HEADER_SIZE) // _RECORD_SIZE
+        if self.slots_per_page < 1:
+            raise ValueError("page_size is too small")
+        self._key = Struct('<' + key_format)
+        self._val = Struct('<' + val_format)
+        if not exists:
+            self.root_id = self.alloc()
+            self._write_header()
+
+    def _write_header(self):
+        _HEADER.pack_into(
+            self._map, 0, MAGIC, VERSION, self.max_list_len,
+            self._key.format[-1:].encode(), self._val.format[-1:].encode(),
+            self.page_size, self.num_pages, self.free_page_head, self.len,
+            self.root_id)
+
+    # pages
+
+    def page(self, page_no: int) -> bytearray:
+        cache = self._cache
+        page = cache.get(page_no)
+        if page is not None:
+            cache.move_to_end(page_no)
+            return page
+        start = page_no * self.page_size
+        page = bytearray(self._map[start:start+self.page_size])
+        self._add_to_cache(page_no, page)
+        return page
+
+    def _add_to_cache(self, page_no: int, page: bytearray):
+        cache = self._cache
+        cache[page_no] = page
+        if len(cache) > self._cache_pages:
+            old_no, old_page = cache.popitem(last=False)
+            if old_no in self._dirty:
+                self._write_back(old_no, old_page)
+
+    def _write_back(self, page_no: int, page: bytearray):
+        start = page_no * self.page_size
+        self._map[start:start+self.page_size] = page
+        self._dirty.discard(page_no)
+
+    def dirty_page(self, page_no: int) -> bytearray:
+        """Like `page`, but the page will be written back."""
+        page = self.page(page_no)
+        self._dirty.add(page_no)
+        return page
+
+    def _new_page(self) -> int:
+        page_no = self.num_pages
+        size = (page_no + 1) * self.page_size
+        old_size = len(self._map)
+        if size > old_size:
+            self._map.close()
+            self._file.truncate(max(2 * old_size,
+                                    size + _GROW_PAGES * self.page_size))
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self.num_pages += 1
+        page = bytearray(self.page_size)
+        # all the slots are free: slot i -> slot i+1
+        spp = self.slots_per_page
+        for i in range(spp):
+            _U64.pack_into(page, _PAGE_HEADER_SIZE + i*_RECORD_SIZE + _LEFT,
+                           i + 1 if i + 1 < spp else _NO_SLOT)
+        _PAGE_HEADER.pack_into(page, 0, spp, 0, 1, self.free_page_head)
+        self.free_page_head = page_no
+        self._add_to_cache(page_no, page)
+        self._dirty.add(page_no)
+        return page_no
+
+    # allocation
+
+    def _alloc_in(self, page_no: int) -> int:
+        """Allocates a slot in the page `page_no`, which must have one."""
+        page = self.dirty_page(page_no)
+        num_free, slot, in_list, next_page = _PAGE_HEADER.unpack_from(page, 0)
+        off = _PAGE_HEADER_SIZE + slot*_RECORD_SIZE
+        next_slot = _U64.unpack_from(page, off + _LEFT)[0]
+        page[off:off+_RECORD_SIZE] = bytes(_RECORD_SIZE)
+        page[off + _FLAGS] = _IN_USE
+        _PAGE_HEADER.pack_into(page, 0, num_free - 1, next_slot, in_list,
+                               next_page)
+        return page_no * self.slots_per_page + slot
+
+    def alloc(self, near: int = 0) -> int:
+        """Returns the id of a new (zeroed) record, in the same page as the
+        record `near` if possible."""
+        if near:
+            page_no = near // self.slots_per_page
+            if _PAGE_HEADER.unpack_from(self.page(page_no), 0)[0] > 0:
+                return self._alloc_in(page_no)
+        # NOTE: The list of pages with free slots may contain full pages,
+        #   which we remove lazily.
+        while self.free_page_head:
+            page_no = self.free_page_head
+            page = self.page(page_no)
+            num_free, slot, _, next_page = _PAGE_HEADER.unpack_from(page, 0)
+            if num_free > 0:
+                return self._alloc_in(page_no)
+            page = self.dirty_page(page_no)
+            _PAGE_HEADER.pack_into(page, 0, num_free, slot, 0, 0)
+            self.free_page_head = next_page
+        return self._alloc_in(self._new_page())
+
+    def free(self, node_id: int):
+        page_no, slot = divmod(node_id, self.slots_per_page)
+        page = self.dirty_page(page_no)
+        num_free, first_slot, in_list, next_page = \
+            _PAGE_HEADER.unpack_from(page, 0)
+        off = _PAGE_HEADER_SIZE + slot*_RECORD_SIZE
+        page[off + _FLAGS] = 0
+        _U64.pack_into(page, off + _LEFT, first_slot)
+        if not in_list:
+            in_list = 1
+            next_page = self.free_page_head
+            self.free_page_head = page_no
+        _PAGE_HEADER.pack_into(page, 0, num_free + 1, slot, in_list,
+                               next_page)
+
+    # handles
+
+    def node(self, node_id: int) -> _PagedNode | None:
+        if node_id == 0:
+            return None
+        node = self._handles.get(node_id)
+        if node is None:
+            node = _PagedNode(self, node_id)
+            self._handles[node_id] = node
+        return node
+
+    def flush(self):
+        for page_no in list(self._dirty):
+            self._write_back(page_no, self._cache[page_no])
+        self._write_header()
+        self._map.flush()
+
+    def close(self):
+        self.flush()
+        self._handles.clear()
+        self._cache.clear()
+        self._map.close()
+        self._file.close()
+
+class _PagedNode(_DNode):
+    """Handle to a node record. It behaves like a _DNode."""
+    _store: PageStore
+    _page_no: int
+    _off: int
+    _id: int
+
+    def __init__(self, store: PageStore, node_id: int):
+        self._store = store
+        self._id = node_id
+        self._page_no, slot = divmod(node_id, store.slots_per_page)
+        self._off = _PAGE_HEADER_SIZE + slot*_RECORD_SIZE
+
+    def __repr__(self) -> str:
+        return f"PagedNode({self.key} #{self._id})"
+
+    def _get_ptr(self, field: int) -> _PagedNode | None:
+        s = self._store
+        return s.node(_U64.unpack_from(s.page(self._page_no),
+                                       self._off + field)[0])
+
+    def _set_ptr(self, field: int, node: _PagedNode | None):
+        _U64.pack_into(self._store.dirty_page(self._page_no),
+                       self._off + field, 0 if node is None else node._id)
+
+    @property               # type: ignore[override]
+    def key(self):
+        s = self._store
+        return s._key.unpack_from(s.page(self._page_no), self._off + _KEY)[0]
+
+    @key.setter
+    def key(self, key):
+        s = self._store
+        s._key.pack_into(s.dirty_page(self._page_no), self._off + _KEY, key)
+
+    @property               # type: ignore[override]
+    def val(self):
+        s = self._store
+        return s._val.unpack_from(s.page(self._page_no), self._off + _VAL)[0]
+
+    @val.setter
+    def val(self, val):
+        s = self._store
+        s._val.pack_into(s.dirty_page(self._page_no), self._off + _VAL, val)
+
+    @property               # type: ignore[override]
+    def left(self):
+        return self._get_ptr(_LEFT)
+
+    @left.setter
+    def left(self, node):
+        self._set_ptr(_LEFT, node)
+
+    @property               # type: ignore[override]
+    def right(self):
+        return self._get_ptr(_RIGHT)
+
+    @right.setter
+    def right(self, node):
+        self._set_ptr(_RIGHT, node)
+
+    @property               # type: ignore[override]
+    def high_right(self):
+        page = self._store.page(self._page_no)
+        return bool(page[self._off + _FLAGS] & _HIGH_RIGHT)
+
+    @high_right.setter
+    def high_right(self, high_right):
+        page = self._store.dirty_page(self._page_no)
+        flags = page[self._off + _FLAGS]
+        page[self._off + _FLAGS] = (flags | _HIGH_RIGHT if high_right else
+                                    flags & ~_HIGH_RIGHT)
+
+class _PagedDLTree:
+    """Mixin that stores the nodes of a D2LTree or D3LTree in a PageStore."""
+    _store: PageStore
+    _len: int
+    _max_list_len: int
+
+    def __init__(self, path: str | os.PathLike, *,
+                 key_format: Literal['q', 'd'] = 'q',
+                 val_format: Literal['q', 'd'] = 'q',
+                 page_size: int = 4096, cache_pages: int = 1024):
+        self._store = PageStore(path, self._max_list_len,
+                                key_format=key_format, val_format=val_format,
+                                page_size=page_size, cache_pages=cache_pages)
+        super().__init__(0, 0)              # type: ignore
+        self._len = self._store.len
+
+    def _make_root(self, any_key, any_val) -> _PagedNode:
+        root = self._store.node(self._store.root_id)
+        assert root is not None
+        return root
+
+    def _new_node(self, key, val, near: _PagedNode | None = None) -> \
+            _PagedNode:
+        s = self._store
+        node = s.node(s.alloc(0 if near is None else near._id))
+        assert node is not None
+        node.key = key
+        node.val = val
+        return node
+
+    def _free_node(self, node: _PagedNode):
+        self._store.free(node._id)
+
+    def flush(self):
+        self._store.len = self._len
+        self._store.flush()
+
+    def close(self):
+        self._store.len = self._len
+        self._store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PagedD2LTree(_PagedDLTree, D2LTree[K, V], Tree[K, V]):
+    pass
+
+class PagedD3LTree(_PagedDLTree, D3LTree[K, V], Tree[K, V]):
+    pass
@@ -0,0 +1,184 @@
+# Builds a tree from a large (sorted or unsorted) input using a process pool.
+#
+# How it works:
+# 1. The input is partitioned into key ranges (one per worker) by sampled
+#    splitters.
+# 2. Each worker sorts its range, removes the duplicates (the last value
+#    wins, as with repeated insertions) and sends the range back as columnar
+#    arrays.
+# 3. The first key of each range (but the first) is kept aside as a
+#    *separator*. Each worker then computes the levels (in key order) of a
+#    valid subtree for the rest of its range. All the subtrees have the same
+#    height (2- and 3-Lexi trees) or levels below the separators (P-Lexi
+#    trees).
+# 4. The separators get the levels of a *spine* above the subtrees, so that
+#    the separators and the subtrees, concatenated in key order, describe a
+#    single valid tree, whose nodes are created and linked in one linear pass
+#    (see `_link_sorted`).
+# For P-Lexi trees with hash-derived levels, step 3 just computes the levels
+# of all the keys and there's no spine.
+#
+# NOTE:
+# - The keys, values and levels travel as NumPy arrays when possible, and as
+#   lists otherwise.
+# - The nodes themselves are Python objects, so they're always created and
+#   linked by the main process, serially. This is most of the work: with 1M
+#   random floats, the NumPy sort takes 0.05s and `from_arrays` 1.8s in
+#   total, while `parallel_build` takes 2.3s with 2 workers (the ranges are
+#   pickled to and from the workers). So it only pays off when sorting is
+#   expensive, e.g. for keys with slow comparisons, and sorted input is
+#   built by `build_sorted` directly.
+
+from __future__ import annotations
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from random import sample
+from typing import Any, List, Sequence, Tuple
+import numpy as np
+from DLTree import DLTree
+from PLTree import PLTree
+from generic import Tree, _Column, _is_array, _sort_range, _tolist
+
+def _subtree_levels(n: int, max_list_len: int | None, height: int,
+                    p_base: int) -> np.ndarray:
+    """Returns the levels of a subtree with `n` nodes.
+    NOTE: max_list_len is None for P-Lexi trees."""
+    if max_list_len is None:
+        levels = PLTree._ruler_levels(n, p_base)
+    else:
+        levels = DLTree._balanced_levels(n, max_list_len, height)
+    return np.array(levels, dtype=np.int8)
+
+def _partition(keys: _Column, vals: _Column,
+               num_ranges: int) -> List[Tuple[_Column, _Column]]:
+    n = len(keys)
+    # Uses sorted, distinct, sampled keys as splitters.
+    sampled = sorted(set(keys[i] for i in sample(range(n),
+                                                 min(n, 64 * num_ranges))))
+    splitters = [sampled[len(sampled) * i // num_ranges]
+                 for i in range(1, num_ranges)]
+    splitters = sorted(set(splitters))
+    if _is_array(keys):
+        vals = np.asarray(vals)
+        buckets = np.searchsorted(np.array(splitters), keys, side='right')
+        order = np.argsort(buckets, kind='stable')
+        bounds = np.searchsorted(buckets[order],
+                                 np.arange(len(splitters) + 2))
+        keys = keys[order]
+        vals = vals[order]
+        return [(keys[bounds[i]:bounds[i+1]], vals[bounds[i]:bounds[i+1]])
+                for i in range(len(splitters) + 1)]
+    parts: list[tuple[list, list]] = [([], []) for _ in
+                                      range(len(splitters) + 1)]
+    for k, v in zip(keys, vals):
+        ks, vs = parts[bisect_right(splitters, k)]
+        ks.append(k)
+        vs.append(v)
+    return parts
+
+def parallel_build(tree: Tree, keys: Sequence[Any], vals: Sequence[Any], *,
+                   workers: int | None = None, presorted: bool = False,
+                   min_range_size: int = 50_000) -> Tree:
+    """Fills the empty `tree` (a D2LTree, D3LTree or PLTree) with the pairs
+    (keys[i], vals[i]) and returns it.
+    NOTE:
+    - Only the sort (and the levels) is parallel: the nodes are created and
+      linked serially, which takes most of the time (see the top of the
+      file). Unless sorting dominates (e.g. keys with slow comparisons),
+      `from_arrays` is as fast or faster.
+    - If a key appears more than once, the last value wins.
+    - With presorted=True, the keys must be sorted (duplicates are allowed).
+      There's nothing to sort, so the duplicates are removed and the tree is
+      built by `build_sorted`, without any worker.
+    - Small inputs are built serially.
+    """
+    if len(tree) != 0:
+        raise ValueError("the tree must be empty")
+    if len(keys) != len(vals):
+        raise ValueError("keys and vals must have the same length")
+    if isinstance(tree, PLTree):
+        max_list_len = None
+        p_base = max(2, round(1/tree._p))
+    elif isinstance(tree, DLTree):
+        max_list_len = tree._max_list_len
+        p_base = 0
+    else:
+        raise TypeError(f"unsupported tree type {type(tree).__name__}")
+    if not isinstance(keys, np.ndarray):
+        keys = list(keys)
+    if not isinstance(vals, np.ndarray):
+        vals = list(vals)
+    if presorted:
+        keys, vals = _sort_range(keys, vals)        # (duplicates)
+        tree.build_sorted(_tolist(keys), _tolist(vals))     # type: ignore
+        return tree
+
+    n = len(keys)
+    workers = workers or cpu_count() or 1
+    num_ranges = max(1, min(workers, n // max(1, min_range_size)))
+
+    pool = ProcessPoolExecutor(max_workers=workers) if num_ranges > 1 \
+           else None
+    map_ = map if pool is None else pool.map
+    try:
+        parts = _partition(keys, vals, num_ranges) \
+                if num_ranges > 1 else [(keys, vals)]
+        ranges = list(map_(_sort_range, *zip(*parts)))
+        ranges = [r for r in ranges if len(r[0]) > 0]
+        if len(ranges) == 0:
+            return tree
+        if isinstance(tree, PLTree) and tree._seed is not None:
+            # The levels only depend on the keys, so no spine is needed.
+            levels = list(map_(tree._sorted_levels, [r[0] for r in ranges]))
+            tree._link_sorted(
+                [k for r in ranges for k in _tolist(r[0])],
+                [v for r in ranges for v in _tolist(r[1])],
+                [lev for ls in levels for lev in ls])
+            return tree
+
+        # the subtrees exclude the separators
+        sizes = [len(r[0]) - (i > 0) for i, r in enumerate(ranges)]
+        height = (min(sizes) + 1).bit_length() - 1
+        if max_list_len is not None and \
+                max(sizes) > (max_list_len + 1)**height - 1:
+            # The ranges are too unbalanced for a common height, so we build
+            # the tree as a whole.
+            ranges = [(np.concatenate([r[0] for r in ranges])
+                       if _is_array(ranges[0][0])
+                       else [k for r in ranges for k in r[0]],
+                       [v for r in ranges for v in _tolist(r[1])])]
+            sizes = [len(ranges[0][0])]
+            height = (sizes[0] + 1).bit_length() - 1
+        num_subtrees = len(ranges)
+        subtree_levels = list(map_(
+            _subtree_levels, sizes, [max_list_len] * num_subtrees,
+            [height] * num_subtrees, [p_base] * num_subtrees))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # The spine is made of the separators.
+    num_seps = num_subtrees - 1
+    if max_list_len is None:
+        top = max((int(ls.max()) for ls in subtree_levels if len(ls) > 0),
+                  default=-1)
+        spine_levels = [top + 1 + lev
+                        for lev in PLTree._ruler_levels(num_seps, p_base)]
+    else:
+        spine_levels = [height + lev for lev in
+                        DLTree._balanced_levels(num_seps, max_list_len)]
+
+    all_keys: list = []
+    all_vals: list = []
+    all_levels: list[int] = []
+    for i, ((ks, vs), levels) in enumerate(zip(ranges, subtree_levels)):
+        ks = _tolist(ks)
+        vs = _tolist(vs)
+        if i > 0:
+            all_levels.append(spine_levels[i-1])
+        all_keys.extend(ks)
+        all_vals.extend(vs)
+        all_levels.extend(levels.tolist())
+    tree._link_sorted(all_keys, all_vals, all_levels)       # type: ignore
+    return tree
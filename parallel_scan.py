@@ -0,0 +1,145 @@
+# Map-reduce over the items of a tree, using several processes or threads.
+#
+# NOTE:
+# - The key space is cut into ranges of similar sizes by looking only at the
+#   nodes near the root.
+# - In process mode, the workers are *forked*, so they get a copy of the tree
+#   for free and only the results travel between processes. This means that
+#   `fn`, `reducer` and the results must be picklable and `fn` must be defined
+#   at module level. Where forking isn't available, threads are used instead.
+
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from functools import reduce
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+from typing import Any, Callable, Iterator, List, Literal, Tuple, TypeVar
+from generic import K, V, Node, Tree
+from misc import _Missing, _missing
+from PLTree import PLTree
+
+R = TypeVar('R')
+
+# The tree being scanned in process mode (inherited by the forked workers).
+_scan_tree: Tree | None = None
+
+def _chain_len(node: Node, level: int) -> int:
+    """Returns the number of nodes in the list that starts at `node`."""
+    n = 1
+    while node.right is not None and node.right_level(level) == level:
+        node = node.right
+        n += 1
+    return n
+
+def split_keys(tree: Tree[K, V], num_ranges: int) -> List[K]:
+    """Returns (at most) num_ranges-1 keys, in increasing order, that split the
+    tree into ranges of similar sizes.
+    NOTE: Only the top of the tree is visited: we repeatedly expand the
+        (estimated) biggest subtree into its left subtree, its root and its
+        right subtree until we have enough pieces. A subtree whose root is at
+        level L and starts a list of length c is estimated to contain
+        c*2^(L+1) nodes.
+    """
+    first = tree.first
+    if num_ranges <= 1 or first is None:
+        return []
+    # Pieces in key order: (key, None, 1) for single nodes and
+    # (node, level, estimated size) for subtrees.
+    # NOTE: The first node of a P-Lexi tree is at level height-1 (and the
+    #   levels of its children don't depend on it).
+    height = tree.get_height()
+    level = height - 1 if isinstance(tree, PLTree) else height
+    pieces: list[tuple[Any, int | None, float]] = [
+        (first, level, _chain_len(first, level) * 2.0**(level + 1))]
+    want = 8 * num_ranges
+    while len(pieces) < want:
+        subtrees = [j for j, p in enumerate(pieces) if p[1] is not None]
+        if not subtrees:
+            break               # only single nodes left
+        i = max(subtrees, key=lambda j: pieces[j][2])
+        node, level, _ = pieces[i]
+        new: list[tuple[Any, int | None, float]] = []
+        if node.left is not None:
+            left_level = node.left_level(level)
+            new.append((node.left, left_level,
+                        _chain_len(node.left, left_level) *
+                        2.0**(left_level + 1)))
+        new.append((node.key, None, 1))
+        if node.right is not None:
+            right_level = node.right_level(level)
+            new.append((node.right, right_level,
+                        _chain_len(node.right, right_level) *
+                        2.0**(right_level + 1)))
+        pieces[i:i+1] = new
+
+    total = sum(p[2] for p in pieces)
+    splitters: list[K] = []
+    acc = 0.
+    r = 1
+    for key, level, est in pieces:
+        if level is None and acc >= r * total / num_ranges:
+            if not splitters or splitters[-1] < key:
+                splitters.append(key)
+            while r < num_ranges and acc >= r * total / num_ranges:
+                r += 1
+            if r == num_ranges:
+                break
+        acc += est
+    return splitters
+
+def _range_items(tree: Tree[K, V], lo: K | _Missing,
+                 hi: K | _Missing) -> Iterator[Tuple[K, V]]:
+    """Yields the items with lo <= key < hi."""
+    for k, v in tree.items(lo):
+        if hi is not _missing and not (k < hi):
+            return
+        yield k, v
+
+def _scan_range(fn: Callable[[Iterator[Tuple[K, V]]], R], lo: K | _Missing,
+                hi: K | _Missing) -> R:
+    """Runs in a forked worker."""
+    assert _scan_tree is not None
+    return fn(_range_items(_scan_tree, lo, hi))
+
+def parallel_scan(tree: Tree[K, V], fn: Callable[[Iterator[Tuple[K, V]]], R],
+                  reducer: Callable[[R, R], R], workers: int | None = None,
+                  *, mode: Literal['process', 'thread'] = 'process',
+                  initial: R | _Missing = _missing) -> R:
+    """Calls `fn` on an iterator over the items (in key order) of each range
+    and returns the results combined with `reducer`, in key order.
+    NOTE: The tree must not be modified during the scan.
+    """
+    global _scan_tree
+    workers = workers or cpu_count() or 1
+    bounds: list[Any] = [_missing, *split_keys(tree, workers), _missing]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+
+    results: list[R]
+    if len(ranges) == 1:
+        results = [fn(_range_items(tree, _missing, _missing))]
+    else:
+        if mode == 'process' and 'fork' not in get_all_start_methods():
+            mode = 'thread'
+        executor: Executor
+        if mode == 'process':
+            _scan_tree = tree
+            executor = ProcessPoolExecutor(len(ranges),
+                                           mp_context=get_context('fork'))
+        else:
+            executor = ThreadPoolExecutor(len(ranges))
+        try:
+            with executor:
+                if mode == 'process':
+                    futures = [executor.submit(_scan_range, fn, lo, hi)
+                               for lo, hi in ranges]
+                else:
+                    futures = [executor.submit(fn,
+                                               _range_items(tree, lo, hi))
+                               for lo, hi in ranges]
+                results = [f.result() for f in futures]
+        finally:
+            _scan_tree = None
+    if initial is _missing:
+        return reduce(reducer, results)
+    return reduce(reducer, results, initial)
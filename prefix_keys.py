@@ -0,0 +1,153 @@
+# Trees of string keys that share a long prefix (URLs, paths, ...).
+#
+# NOTE:
+# - `PrefixStrippedTree` stores the common prefix of all the keys once and
+#   the rest of each key in the nodes. The keys of the nodes are shorter, so
+#   they take less memory and each comparison has less to scan.
+# - Tracking the longest common prefix of the bounds along the search path,
+#   to start each comparison after it, doesn't pay off in CPython: skipping
+#   the prefix means slicing the key (a new string) while `<` compares the
+#   strings with memcmp, so rescanning a prefix of 200 characters costs a
+#   few ns, much less than a slice. The common prefix of the whole tree is
+#   the only one that can be skipped once per operation.
+# - A key that doesn't start with the prefix is rejected in O(1) by the
+#   lookups and the removals. Inserting one shortens the prefix, which
+#   rewrites the keys of all the nodes in O(n), but the prefix can only
+#   get shorter, so this happens at most len(prefix) times (usually only a
+#   few times at the start).
+# - The keys of the nodes are rewritten in place, so the trees that also
+#   index or hash their keys (D2LTree_Budgeted, BiasedPLTree, PLTree with a
+#   seed) aren't supported.
+
+from __future__ import annotations
+from typing import Generic, Iterator
+from generic import V, T, Tree
+from misc import _Missing, _missing, notFound
+from BiasedPLTree import BiasedPLTree
+from D2LTree_Budgeted import D2LTree_Budgeted
+
+def common_prefix_len(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    # NOTE: The comparisons of the slices run in C.
+    lo, hi = 0, n               # a[:lo] == b[:lo] and a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+class PrefixStrippedTree(Generic[V]):
+    """Wraps a tree of class `cls` (e.g. D2LTree or PLTree) with string keys
+    (see the notes above).
+    NOTE:
+    - If `prefix` is None, the first key inserted is taken as the prefix
+      (which gets shorter as needed).
+    - Other arguments (e.g. `p`) are passed on to `cls`."""
+    tree: Tree[str, V]
+    prefix: str | None
+
+    def __init__(self, cls: type, any_val: V, *, prefix: str | None = None,
+                 **kwargs):
+        if issubclass(cls, (D2LTree_Budgeted, BiasedPLTree)) or \
+                kwargs.get('seed') is not None:
+            raise ValueError("the tree must not index or hash its keys")
+        self.tree = cls('', any_val, **kwargs)
+        self.prefix = prefix
+
+    def _strip(self, key: str) -> str | None:
+        """Returns `key` without the prefix, or None if it doesn't start with
+        it."""
+        prefix = self.prefix
+        if prefix is None:
+            return None
+        if not key.startswith(prefix):
+            return None
+        return key[len(prefix):]
+
+    def _shorten_prefix(self, new_len: int):
+        """Moves the end of the prefix back into the keys of the nodes."""
+        assert self.prefix is not None
+        moved = self.prefix[new_len:]
+        self.prefix = self.prefix[:new_len]
+        stack = [self.tree.first]
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                node.key = moved + node.key
+                stack.append(node.left)
+                stack.append(node.right)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __contains__(self, key: str) -> bool:
+        suffix = self._strip(key)
+        return suffix is not None and suffix in self.tree
+
+    def __getitem__(self, key: str) -> V:
+        suffix = self._strip(key)
+        if suffix is None:
+            raise KeyError
+        return self.tree[suffix]
+
+    def get(self, key: str, default: T | None = None) -> V | T | None:
+        suffix = self._strip(key)
+        if suffix is None:
+            return default
+        val = self.tree._find(suffix)       # type: ignore
+        return default if val is notFound else val
+
+    def __setitem__(self, key: str, val: V):
+        if self.prefix is None:
+            self.prefix = key
+        elif not key.startswith(self.prefix):
+            if len(self.tree) == 0:
+                self.prefix = key
+            else:
+                self._shorten_prefix(common_prefix_len(self.prefix, key))
+        self.tree[key[len(self.prefix):]] = val
+
+    def remove(self, key: str, default: T | _Missing = _missing) -> V | T:
+        suffix = self._strip(key)
+        if suffix is None:
+            if default is _missing:
+                raise KeyError
+            return default
+        return self.tree.remove(suffix, default)
+
+    def __delitem__(self, key: str):
+        self.remove(key)
+
+    def _bound(self, key: str | _Missing, lower: bool) -> \
+            str | _Missing | None:
+        """Returns the bound for the tree or None if the range is empty.
+        NOTE: A string that doesn't start with the prefix is either smaller
+            or larger than all the strings that do."""
+        if key is _missing or self.prefix is None:
+            return _missing
+        suffix = self._strip(key)
+        if suffix is not None:
+            return suffix
+        if key < self.prefix:
+            return _missing if lower else None
+        return None if lower else _missing
+
+    def items(self, from_key: str | _Missing = _missing,
+              to_key: str | _Missing = _missing) -> Iterator[tuple[str, V]]:
+        lo = self._bound(from_key, True)
+        hi = self._bound(to_key, False)
+        if lo is None or hi is None:
+            return
+        prefix = self.prefix or ''
+        for suffix, val in self.tree.items(lo, hi):
+            yield prefix + suffix, val
+
+    def __iter__(self) -> Iterator[tuple[str, V]]:
+        return self.items()
+
+    def _check(self):
+        self.tree._check()
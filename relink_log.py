@@ -0,0 +1,82 @@
+# Logging of the nodes changed by an operation, for the trees that keep
+# something about each subtree up to date (depth_hist.py and merkle.py).
+#
+# NOTE:
+# - The logged nodes record their old children and value the first time
+#   one of them changes during an operation (which includes their creation,
+#   with a missing old value), and the nodes freed by the operation are
+#   listed. The trees then only look at the paths to these nodes.
+# - Writing the attributes of a logged node goes through a Python
+#   `__setattr__`, which is slow, but reading them isn't affected.
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from generic import K, V
+from misc import _missing
+from DLTree_misc import _DNode
+from PLTree import MaxLevel, _PNode
+
+@dataclass
+class Changes:
+    # id(node) -> (node, old left, old right, old value)
+    nodes: dict[int, tuple[Any, Any, Any, Any]] = field(default_factory=dict)
+    freed: list[Any] = field(default_factory=list)
+
+# changes of the current operation
+_changes: Changes | None = None
+
+def _logged_setattr(self, name: str, value: Any):
+    changes = _changes
+    if changes is not None and \
+            (name == 'left' or name == 'right' or name == 'val'):
+        nodes = changes.nodes
+        # NOTE: Reading `__dict__` (or assigning `__class__`) would allocate a
+        #   dict for the node.
+        if id(self) not in nodes and getattr(self, name, _missing) is not value:
+            nodes[id(self)] = (self, getattr(self, 'left', None),
+                               getattr(self, 'right', None),
+                               getattr(self, 'val', _missing))
+    object.__setattr__(self, name, value)
+
+class _LDNode(_DNode[K, V]):
+    __setattr__ = _logged_setattr
+
+class _LPNode(_PNode[K, V]):
+    __setattr__ = _logged_setattr
+
+def run_logged(method: Callable, *args) -> tuple[Any, Changes | None]:
+    """Returns `method(*args)` and the changes it made to the logged nodes, or
+    None for the changes if an operation is already being logged (e.g.
+    `insert` in `__setitem__`)."""
+    global _changes
+    if _changes is not None:
+        return method(*args), None
+    changes = _changes = Changes()
+    try:
+        ret = method(*args)
+    finally:
+        _changes = None
+    return ret, changes
+
+class _Logged:
+    """Mixin that lists the nodes freed by the logged operations."""
+
+    def _free_node(self, node):
+        if _changes is not None:
+            _changes.freed.append(node)
+        super()._free_node(node)                    # type: ignore
+
+class _LoggedDL(_Logged):
+    def _make_root(self, any_key, any_val):
+        return _LDNode(any_key, any_val, high_right=False)
+
+    def _new_node(self, key, val, near=None):
+        return _LDNode(key, val)
+
+class _LoggedPL(_Logged):
+    def _make_root(self, any_key, any_val):
+        return _LPNode(any_key, any_val, MaxLevel + 1)
+
+    def _new_node(self, key, val, level):
+        return _LPNode(key, val, level)
@@ -0,0 +1,229 @@
+# Binary snapshots of whole trees.
+#
+# Layout (all integers little-endian, every section 8-byte aligned):
+#   magic (8 bytes) | <I: header size> | header | padding
+#   levels column | keys column | vals column
+# where `header` is the codec.py encoding of
+#   (module, class name, params, n)
+# and each column is
+#   <B: kind> <B: width> 6 bytes of padding <Q: data size> | data | padding
+# with these kinds:
+#   COL_UINT    n unsigned ints of `width` bytes
+#   COL_DELTA   one <q> followed by the n-1 differences between consecutive
+#               ints, as unsigned ints of `width` bytes (for the keys)
+#   COL_INT     n <q>
+#   COL_FLOAT   n <d>
+#   COL_CODEC   n objects encoded with codec.py
+#
+# NOTE:
+# - The nodes are stored in key order with their levels, which fully
+#   determine the shape of the tree (see `_link_sorted`), so loading a
+#   snapshot recreates the *exact* same tree in one linear pass.
+# - The numeric columns are decoded with NumPy directly from the file buffer,
+#   which can be memory-mapped.
+
+from __future__ import annotations
+import mmap as _mmap
+import os
+from importlib import import_module
+from struct import Struct
+from typing import Any, Final, List, Tuple
+import numpy as np
+from codec import decode, encode, encode_bytes
+from generic import Tree
+
+MAGIC: Final = b'LEXITREE'
+VERSION: Final = 1
+
+COL_UINT: Final = 0
+COL_DELTA: Final = 1
+COL_INT: Final = 2
+COL_FLOAT: Final = 3
+COL_CODEC: Final = 4
+
+_U32: Final = Struct('<I')
+_COL_HEADER: Final = Struct('<BB6xQ')
+
+_MIN_I64 = -(1 << 63)
+_MAX_I64 = (1 << 63) - 1
+
+_UINT_DTYPES: Final = {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}
+
+def _pad(out: bytearray):
+    out += bytes(-len(out) % 8)
+
+def _uint_width(max_val: int) -> int:
+    for width in (1, 2, 4, 8):
+        if max_val < 1 << (8 * width):
+            return width
+    raise OverflowError("value too large")
+
+def _all_int64(xs: List[Any]) -> bool:
+    return all(type(x) is int for x in xs) and \
+        (not xs or (_MIN_I64 <= min(xs) and max(xs) <= _MAX_I64))
+
+def _write_column(out: bytearray, kind: int, width: int, data: bytes):
+    out += _COL_HEADER.pack(kind, width, len(data))
+    out += data
+    _pad(out)
+
+def _write_keys(out: bytearray, keys: List[Any]):
+    if _all_int64(keys) and len(keys) > 0:
+        arr = np.array(keys, dtype=np.int64)
+        # NOTE: The keys are increasing, but the differences may still not
+        #   fit in 63 bits.
+        if len(keys) == 1 or keys[-1] - keys[0] <= _MAX_I64:
+            deltas = np.diff(arr).astype(np.uint64)
+            width = _uint_width(int(deltas.max(initial=0)))
+            data = arr[:1].tobytes() + \
+                   deltas.astype(_UINT_DTYPES[width]).tobytes()
+            _write_column(out, COL_DELTA, width, data)
+            return
+    _write_values(out, keys)
+
+def _write_values(out: bytearray, vals: List[Any]):
+    if _all_int64(vals):
+        _write_column(out, COL_INT, 8,
+                      np.array(vals, dtype=np.int64).tobytes())
+    elif all(type(v) is float for v in vals):
+        _write_column(out, COL_FLOAT, 8,
+                      np.array(vals, dtype=np.float64).tobytes())
+    else:
+        data = bytearray()
+        for v in vals:
+            encode(v, data)
+        _write_column(out, COL_CODEC, 0, data)
+
+def _read_column(buf: Any, pos: int, n: int) -> Tuple[List[Any], int]:
+    """Returns (values, position of the next column)."""
+    kind, width, size = _COL_HEADER.unpack_from(buf, pos)
+    pos += _COL_HEADER.size
+    end = pos + size
+    if kind == COL_UINT:
+        vals = np.frombuffer(buf, _UINT_DTYPES[width], n, pos).tolist()
+    elif kind == COL_DELTA:
+        first = np.frombuffer(buf, np.int64, 1, pos)
+        deltas = np.frombuffer(buf, _UINT_DTYPES[width], n - 1, pos + 8)
+        arr = np.empty(n, dtype=np.int64)
+        arr[0] = first[0]
+        np.cumsum(deltas, dtype=np.int64, out=arr[1:])
+        arr[1:] += first[0]
+        vals = arr.tolist()
+    elif kind == COL_INT:
+        vals = np.frombuffer(buf, np.int64, n, pos).tolist()
+    elif kind == COL_FLOAT:
+        vals = np.frombuffer(buf, np.float64, n, pos).tolist()
+    elif kind == COL_CODEC:
+        vals = []
+        p = pos
+        for _ in range(n):
+            v, p = decode(buf, p)
+            vals.append(v)
+    else:
+        raise ValueError(f"invalid column kind {kind}")
+    return vals, end + (-end % 8)
+
+def _columns(tree: Tree) -> Tuple[List[Any], List[Any], List[int]]:
+    """Returns the keys, values and levels of the nodes in key order.
+    NOTE: Iterative, so it works on trees of any shape."""
+    keys: List[Any] = []
+    vals: List[Any] = []
+    levels: List[int] = []
+    stack: List[Tuple[Any, int]] = []
+    cur = tree.first
+    # In D-Lexi trees, the leaves are at level 0.
+    level = tree.get_height() - 1
+    while True:
+        while cur is not None:
+            stack.append((cur, level))
+            if cur.left is not None:
+                level = cur.left_level(level)
+            cur = cur.left
+        if not stack:
+            break
+        cur, level = stack.pop()
+        keys.append(cur.key)
+        vals.append(cur.val)
+        levels.append(level)
+        if cur.right is not None:
+            level = cur.right_level(level)
+        cur = cur.right
+    return keys, vals, levels
+
+def _params(tree: Tree) -> Tuple[Any, ...]:
+    """Returns the constructor's keyword arguments as a tuple of pairs."""
+    init_params = getattr(tree, '_init_params', None)
+    if init_params is not None:
+        return init_params()
+    p = getattr(tree, '_p', None)
+    if p is None:
+        return ()
+    seed = getattr(tree, '_seed', None)
+    return (('p', p),) if seed is None else (('p', p), ('seed', seed))
+
+def dumps(tree: Tree) -> bytearray:
+    """NOTE: Trees with deferred work (see D2LTree_Budgeted.py) finish it
+    first."""
+    maintain = getattr(tree, 'maintain', None)
+    if maintain is not None:
+        maintain()
+    keys, vals, levels = _columns(tree)
+    cls = type(tree)
+    header = encode_bytes((cls.__module__, cls.__qualname__, _params(tree),
+                           len(keys)))
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out += _U32.pack(len(header))
+    out += header
+    _pad(out)
+    _write_column(out, COL_UINT, 1, np.array(levels, dtype=np.uint8).tobytes())
+    _write_keys(out, keys)
+    _write_values(out, vals)
+    return out
+
+def save(tree: Tree, path: str | os.PathLike):
+    """Saves `tree` to `path` atomically (the old file, if any, is replaced
+    only once the new one has been fully written)."""
+    data = dumps(tree)
+    tmp_path = f"{os.fspath(path)}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def loads(buf: Any) -> Tree:
+    """Recreates a tree from a buffer (bytes, bytearray, mmap, ...)."""
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a tree snapshot")
+    pos = len(MAGIC)
+    if buf[pos] != VERSION:
+        raise ValueError(f"unsupported snapshot version {buf[pos]}")
+    pos += 1
+    header_size = _U32.unpack_from(buf, pos)[0]
+    pos += _U32.size
+    (module, name, params, n), _ = decode(buf, pos)
+    pos += header_size
+    pos += -pos % 8
+
+    levels, pos = _read_column(buf, pos, n)
+    keys, pos = _read_column(buf, pos, n)
+    vals, pos = _read_column(buf, pos, n)
+
+    cls = getattr(import_module(module), name)
+    any_key = keys[0] if n > 0 else 0
+    any_val = vals[0] if n > 0 else 0
+    tree = cls(any_key, any_val, **dict(params))
+    tree._link_sorted(keys, vals, levels)
+    return tree
+
+def load(path: str | os.PathLike, *, mmap: bool = False) -> Tree:
+    """Loads a tree saved with `save`.
+    NOTE: With mmap=True, the file is memory-mapped instead of being read
+        into memory first.
+    """
+    with open(path, 'rb') as f:
+        if not mmap:
+            return loads(f.read())
+        with _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as m:
+            return loads(m)
@@ -0,0 +1,143 @@
+# Tree classes specialized for a key type.
+#
+# `specialize(D2LTree, key_type=float)` returns a subclass of D2LTree with a
+# faster `__setitem__`, which gives the same trees as the generic one.
+#
+# NOTE:
+# - The search keeps the path in a list grown by `append` instead of
+#   filling a preallocated one, and the key of each node is loaded once.
+# - An existing key is updated in place, without any path.
+# - A new node that doesn't make its list too long (about half of the random
+#   insertions) is linked directly: the node is constructed instead of
+#   calling the `_new_node` hook, and there's no rebalancing loop. Otherwise
+#   the rest is done by the generic `_insert_below`, so the rebalancing
+#   isn't forked.
+# - Measured with 100k random floats (process time, best of 7, see the
+#   bottom of the file), insertions are about 20% faster and updates about
+#   25% faster. Lookups aren't specialized: inlining `_find` into
+#   `__getitem__` and caching `cur.key` made no measurable difference
+#   (CPython 3.11 already specializes the attribute loads and the
+#   comparisons of ints, floats and strs).
+# - The code is the same for all the key types: for tuples, comparing the
+#   first elements first (and the whole tuples only on a tie) was 10-20%
+#   slower with composite keys, since deep in the tree the first elements
+#   are almost always equal. The classes are still per key type so that
+#   this can change without changing the clients.
+# - Only D2LTree and its subclasses that don't override `__setitem__` or the
+#   node hooks can be specialized (ValueError otherwise).
+# - The classes are named <Base>_<type> (e.g. D2LTree_float) and can be
+#   looked up by name in this module (see `__getattr__`), so that
+#   snapshot.py can load them.
+
+from __future__ import annotations
+from importlib import import_module
+from typing import Final
+from generic import K, V
+from DLTree import DLTree
+from DLTree_misc import _DNode
+from D2LTree import D2LTree
+
+KEY_TYPES: Final[dict[str, type]] = {
+    'int': int, 'float': float, 'str': str, 'tuple': tuple,
+}
+
+_cache: dict[tuple[type, type], type] = {}
+
+def specialize(cls: type, key_type: type) -> type:
+    """Returns the subclass of the tree class `cls` specialized for keys of
+    type `key_type` (int, float, str or tuple)."""
+    if key_type not in KEY_TYPES.values():
+        raise ValueError(f"unsupported key type: {key_type!r}")
+    if not issubclass(cls, D2LTree) or \
+            cls.__setitem__ is not D2LTree.__setitem__ or \
+            cls._new_node is not DLTree._new_node or \
+            cls._insert_keynode is not D2LTree._insert_keynode:
+        raise ValueError(f"can't specialize {cls!r}")
+    spec = _cache.get((cls, key_type))
+    if spec is None:
+        spec = type(f'{cls.__name__}_{key_type.__name__}', (_FastD2L, cls),
+                    {'__module__': __name__})
+        _cache[cls, key_type] = spec
+    return spec
+
+def __getattr__(name: str) -> type:
+    """Regenerates the specialized classes by name (e.g. in another
+    process)."""
+    base, _, type_name = name.rpartition('_')
+    if base and type_name in KEY_TYPES:
+        try:
+            cls = getattr(import_module(base), base)
+        except (ImportError, AttributeError):
+            pass
+        else:
+            return specialize(cls, KEY_TYPES[type_name])
+    raise AttributeError(name)
+
+class _FastD2L:
+    def __setitem__(self, key: K, val: V):
+        """Inserts with replacement."""
+        root = self._root                           # type: ignore
+        nodes = [root]
+        prev_cmp = -1
+        cur = root.right
+        while cur is not None:
+            nodes.append(cur)
+            cur_key = cur.key
+            if cur_key < key:
+                prev_cmp = -1
+                cur = cur.right
+            elif key < cur_key:
+                prev_cmp = 1
+                cur = cur.left
+            else:       # key already present
+                cur.val = val
+                return
+
+        self._len += 1                              # type: ignore
+        last_idx = len(nodes) - 1
+        prev = nodes[last_idx]
+        if last_idx == 0:              # empty tree
+            prev.right = _DNode(key, val)
+            return
+        # The new node goes into the list of `prev` (at level 0), which gets
+        # too long if prev2 -> prev is a high link, or if the node goes left
+        # and prev -> prev.right is one (see D2LTree._insert_keynode).
+        prev2 = nodes[last_idx - 1]
+        if not (prev2.high_right and prev2.right is prev):
+            if prev_cmp < 0:
+                prev.right = _DNode(key, val)
+                prev.high_right = True
+                return
+            if not (prev.high_right and prev.right is not None):
+                key_node = _DNode(key, val, True, None, prev)
+                if prev2.right is prev:
+                    prev2.right = key_node
+                else:
+                    prev2.left = key_node
+                return
+        self._insert_below(nodes, last_idx, prev_cmp,  # type: ignore
+                           _DNode(key, val))
+
+if __name__ == "__main__":
+    from random import random
+    from time import process_time
+    keys = [random() for _ in range(100_000)]
+    best: dict[str, list[float]] = {}
+    for _ in range(7):
+        for cls in (D2LTree, specialize(D2LTree, float)):
+            tree = cls(0., 0.)
+            times = []
+            for op in ('insert', 'lookup', 'update'):
+                t = process_time()
+                if op == 'lookup':
+                    for key in keys:
+                        tree[key]
+                else:
+                    for key in keys:
+                        tree[key] = key
+                times.append(process_time() - t)
+            best[cls.__name__] = [min(a, b) for a, b in
+                                  zip(best.get(cls.__name__, times), times)]
+    for name, (ins, get, upd) in best.items():
+        print(f'{name:14} insert {ins:.3f}s  lookup {get:.3f}s  '
+              f'update {upd:.3f}s')
@@ -14,7 +14,12 @@ import numpy as np
 
 from D2LTree import D2LTree
 from D3LTree import D3LTree
+from DkLTree import DkLTree
 from PLTree import PLTree
+from depth_hist import (
+    DepthTrackedD2LTree, DepthTrackedD3LTree, DepthTrackedDkLTree,
+    DepthTrackedPLTree, _DepthTracked
+)
 from generic import Tree, get_path_lengths
 from misc import *
 from figures import savefig, set_figure
@@ -32,9 +37,15 @@ def _get_len_ratio_qs(tree: Tree):
     tree_size = len(tree)
     if tree_size > 0:
         logn = log2(tree_size+1)
-        lengths = get_path_lengths(tree)
-        assert lengths is not None
-        qs = np.quantile(lengths, np.linspace(0, 1, num=19))
+        probs = np.linspace(0, 1, num=19)
+        if isinstance(tree, _DepthTracked):
+            # O(height) instead of O(n) (see depth_hist.py). Same as below
+            # (checked by tests/test_depth_hist.py).
+            qs = np.array(tree.path_length_quantiles(probs))
+        else:
+            lengths = get_path_lengths(tree)
+            assert lengths is not None
+            qs = np.quantile(lengths, probs)
         row: list[float] = (qs / logn).tolist()
         return row
     return None
@@ -135,7 +146,28 @@ key_pickers = dict(
     center_fifo = CenterFifoKeyPicker,
 )
 
-TreeType = Literal['prob', 'det2', 'det3']
+# NOTE: 'det<k>' is a k-Lexi Tree (e.g. 'det5') and 'det<k>td' is the same
+#   tree in top-down mode. 'det2' and 'det3' are D2LTree and D3LTree. The
+#   suffix '_hist' (e.g. 'det2_hist') gives the same tree with a histogram of
+#   the path lengths (see depth_hist.py).
+TreeType = Literal['prob', 'det2', 'det3'] | str
+
+def make_tree(tree_type: TreeType) -> Tree[float, float]:
+    hist = tree_type.endswith('_hist')
+    if hist:
+        tree_type = tree_type[:-len('_hist')]
+    if tree_type == 'prob':
+        return (DepthTrackedPLTree if hist else PLTree)(0., 0.)
+    if tree_type == 'det2':
+        return (DepthTrackedD2LTree if hist else D2LTree)(0., 0.)
+    if tree_type == 'det3':
+        return (DepthTrackedD3LTree if hist else D3LTree)(0., 0.)
+    if tree_type.startswith('det'):
+        top_down = tree_type.endswith('td')
+        k = int(tree_type[3:-2] if top_down else tree_type[3:])
+        return (DepthTrackedDkLTree if hist else DkLTree)(
+            0., 0., k=k, mode='top_down' if top_down else 'bottom_up')
+    raise ValueError(f"unknown tree type {tree_type!r}")
 
 class TestConf:
     tree_type: TreeType
@@ -204,8 +236,13 @@ class TestConf:
     
     @staticmethod
     def _tree_name_of(tree_type: TreeType):
-        return ('P-Lexi' if tree_type == 'prob' else
-                '2-Lexi' if tree_type == 'det2' else '3-Lexi')
+        # (same shapes with or without the histogram)
+        tree_type = tree_type.removesuffix('_hist')
+        if tree_type == 'prob':
+            return 'P-Lexi'
+        if tree_type.endswith('td'):
+            return f'{tree_type[3:-2]}-Lexi (top-down)'
+        return f'{tree_type[3:]}-Lexi'
         
     @property
     def tree_name(self):
@@ -230,8 +267,7 @@ class TestConf:
 def do_test(test_conf: TestConf):
     tc = test_conf
     kp = key_pickers[tc.test_type]()
-    tree_class = {'prob': PLTree, 'det2': D2LTree, 'det3': D3LTree}
-    tree: Tree = tree_class[tc.tree_type](0., 0.)
+    tree: Tree = make_tree(tc.tree_type)
 
     every = max(1, tc.num_ops//100)
     def get_every(x):
@@ -361,6 +397,16 @@ def do_all_tests(*, draw_only=False):
                     do_test(tc)
                 draw_test_graph(tc)
 
+def do_k_tests(*, draw_only=False):
+    """Compares k-Lexi Trees for several values of k, in both modes."""
+    tree_types: list[TreeType] = ['det2', 'det3', 'det4', 'det5', 'det8',
+                                  'det3td', 'det4td', 'det5td', 'det8td']
+    for tree_type in tree_types:
+        tc = TestConf(tree_type, 'uniform', 1_000_000, 2, ins_only=False)
+        if not draw_only:
+            do_test(tc)
+        draw_test_graph(tc)
+
 def draw_test_progress(test_conf: TestConf, title: str = ''):
     progress = np.loadtxt(f'data/{test_conf.base_fname}_progress.txt')
     fig = set_figure(figsize=(15, 7), dpi=80)
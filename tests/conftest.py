@@ -0,0 +1,6 @@
+# The modules are at the top of the repository (there's no package).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
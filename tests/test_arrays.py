@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from D2LTree import D2LTree
+from PLTree import PLTree
+
+@pytest.mark.parametrize('vals, dtype', [
+    ([1, 2, 3], np.int64),
+    ([1.5, 2, 3], np.float64),
+    ([1, 2.5, 3], np.float64),
+    ([1, 'a', 3], object),
+    ([1, 2, 2**70], object),
+    ([(1, 2), (3, 4), (5, 6)], object),
+])
+@pytest.mark.parametrize('cls', [D2LTree, PLTree])
+def test_to_arrays_dtypes(cls, vals, dtype):
+    tree = cls(0, 0)
+    for key, val in enumerate(vals):
+        tree[key] = val
+    keys, arr = tree.to_arrays()
+    assert keys.dtype == np.int64 and keys.tolist() == [0, 1, 2]
+    assert arr.dtype == dtype and arr.tolist() == vals
+
+def test_to_arrays_bounds():
+    tree = D2LTree(0., 0.)
+    keys = np.random.default_rng(0).random(1000)
+    tree.from_arrays(keys, -keys)
+    lo, hi = 0.25, 0.5
+    expected = np.sort(keys[(lo <= keys) & (keys <= hi)])
+    got_keys, got_vals = tree.to_arrays(lo, hi, val_dtype=np.float32)
+    assert np.array_equal(got_keys, expected)
+    assert got_vals.dtype == np.float32
+    assert np.allclose(got_vals, -expected)
+    empty_keys, _ = tree.to_arrays(2., 3.)
+    assert len(empty_keys) == 0
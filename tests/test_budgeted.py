@@ -0,0 +1,46 @@
+from random import Random
+from D2LTree_Budgeted import D2LTree_Budgeted
+
+def test_deferred_work_stays_bounded():
+    # After most keys are removed, most lists have a single node and almost
+    # every removal needs more lower steps than `max_steps`.
+    rng = Random(1)
+    tree = D2LTree_Budgeted(0., 0., max_steps=4, max_deferred=64)
+    keys = [rng.random() for _ in range(20_000)]
+    for key in keys:
+        tree[key] = key
+    rng.shuffle(keys)
+    for key in keys[:16_000]:
+        assert tree.remove(key) == key
+        assert tree.num_deferred <= 64
+    # steady random insertions and removals
+    live = keys[16_000:]
+    for _ in range(10_000):
+        if rng.random() < 0.5:
+            key = rng.random()
+            live.append(key)
+            tree[key] = key
+        else:
+            i = rng.randrange(len(live))
+            live[i], live[-1] = live[-1], live[i]
+            tree.remove(live.pop())
+        assert tree.num_deferred <= 64
+    tree._check()
+    assert list(tree) == sorted((key, key) for key in live)
+
+def test_maintain_skips_expensive_tombstones():
+    rng = Random(2)
+    tree = D2LTree_Budgeted(0., 0., max_steps=4, max_deferred=1 << 30)
+    keys = [rng.random() for _ in range(20_000)]
+    for key in keys:
+        tree[key] = key
+    rng.shuffle(keys)
+    for key in keys[:16_000]:
+        tree.remove(key)
+    before = tree.num_deferred
+    for _ in range(1000):
+        tree.maintain(8)
+    assert tree.num_deferred < before // 2
+    assert tree.maintain()
+    assert tree.num_deferred == 0
+    tree._check()
@@ -0,0 +1,47 @@
+from random import Random
+import numpy as np
+import pytest
+from generic import get_path_lengths, path_length_stats
+from depth_hist import (
+    DepthTrackedD2LTree, DepthTrackedD3LTree, DepthTrackedDkLTree,
+    DepthTrackedPLTree
+)
+
+QS = np.linspace(0, 1, num=19)
+
+@pytest.mark.parametrize('cls, kwargs', [
+    (DepthTrackedD2LTree, {}),
+    (DepthTrackedD3LTree, {}),
+    (DepthTrackedDkLTree, {'k': 4}),
+    (DepthTrackedDkLTree, {'k': 3, 'mode': 'top_down'}),
+    (DepthTrackedPLTree, {}),
+])
+@pytest.mark.parametrize('seed', range(5))
+def test_same_as_path_lengths(cls, kwargs, seed):
+    rng = Random(seed)
+    tree = cls(0., 0., **kwargs)
+    ref = {}
+    for i in range(2000):
+        key = float(rng.randrange(500))
+        if rng.random() < 0.6:
+            tree[key] = i
+            ref[key] = i
+        else:
+            assert tree.remove(key, None) == ref.pop(key, None)
+        if i % 100 == 99:
+            lengths = get_path_lengths(tree)
+            if len(ref) == 0:
+                assert tree.depth_histogram() == []
+                continue
+            assert tree.depth_histogram() == \
+                   np.bincount(np.asarray(lengths, dtype=int)).tolist()
+            assert np.allclose(tree.path_length_quantiles(QS),
+                               np.quantile(lengths, QS))
+            stats = tree.path_length_stats()
+            expected = path_length_stats(tree)
+            assert (stats.min_len, stats.max_len, stats.num_leaves) == \
+                   (expected.min_len, expected.max_len, expected.num_leaves)
+            assert stats.mean_len == pytest.approx(expected.mean_len)
+            assert stats.std_len == pytest.approx(expected.std_len)
+    tree._check()
+    assert list(tree) == sorted(ref.items())
@@ -0,0 +1,59 @@
+from random import Random
+import pytest
+from generic import path_length_stats
+from keyed import KeyedTree
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from DkLTree import DkLTree
+from PLTree import PLTree
+from D2LTree_Budgeted import D2LTree_Budgeted
+from hash_index import HashIndexedD2LTree
+
+def _cmp(a, b):
+    return (a > b) - (a < b)
+
+@pytest.mark.parametrize('cls, kwargs', [
+    (D2LTree, {}), (D3LTree, {}), (DkLTree, {'k': 4}), (PLTree, {}),
+])
+@pytest.mark.parametrize('key, cmp', [
+    (None, _cmp), (str.lower, None), (str.lower, _cmp),
+])
+def test_same_as_dict(cls, kwargs, key, cmp):
+    rng = Random(0)
+    tree = KeyedTree(cls, 'a', 0, key=key, cmp=cmp, **kwargs)
+    ref = {}
+    for i in range(3000):
+        k = rng.choice('abcdefgh') + str(rng.randrange(200))
+        if key is not None and rng.random() < 0.5:
+            k = k.upper()
+        derived = key(k) if key is not None else k
+        if rng.random() < 0.6:
+            tree[k] = i
+            ref[derived] = (k, i)
+        else:
+            expected = ref.pop(derived, None)
+            assert tree.remove(k, None) == \
+                   (expected[1] if expected is not None else None)
+    tree._check()
+    assert list(tree) == [ref[d] for d in sorted(ref)]
+
+def test_one_comparison_per_node():
+    calls = 0
+    def cmp(a, b):
+        nonlocal calls
+        calls += 1
+        return _cmp(a, b)
+    tree = KeyedTree(D2LTree, 0, 0, cmp=cmp)
+    for i in range(1000):
+        tree[i] = i
+    calls = 0
+    assert tree[500] == 500
+    assert calls <= path_length_stats(tree.tree).max_len
+
+@pytest.mark.parametrize('cls, kwargs', [
+    (D2LTree_Budgeted, {}), (HashIndexedD2LTree, {}), (PLTree, {'seed': 1}),
+])
+def test_cmp_refuses_hashing_trees(cls, kwargs):
+    with pytest.raises(ValueError):
+        KeyedTree(cls, 'a', 0, cmp=_cmp, **kwargs)
+    KeyedTree(cls, 'a', 0, key=str.lower, **kwargs)
@@ -0,0 +1,26 @@
+import pytest
+from lsm import LSMStore
+
+def test_recovery_after_rejected_write(tmp_path):
+    store = LSMStore(tmp_path, memtable_size=100)
+    store[1] = 1
+    with pytest.raises(TypeError):
+        store['a'] = 2                  # can't be compared with 1
+    store[2] = 2
+    store.close()
+    store = LSMStore(tmp_path, memtable_size=100)
+    assert list(store.items()) == [(1, 1), (2, 2)]
+    store.close()
+
+def test_recovery_after_reopens(tmp_path):
+    store = LSMStore(tmp_path, memtable_size=100, max_runs=3)
+    for i in range(1000):
+        store[i] = i
+    store.delete(5)
+    store.close()
+    for _ in range(3):
+        LSMStore(tmp_path, memtable_size=100, max_runs=3).close()
+    store = LSMStore(tmp_path, memtable_size=100, max_runs=3)
+    assert [key for key, _ in store.items()] == \
+           [i for i in range(1000) if i != 5]
+    store.close()
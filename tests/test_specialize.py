@@ -0,0 +1,48 @@
+from random import Random
+import pytest
+from D2LTree import D2LTree
+from D3LTree import D3LTree
+from snapshot import _columns, dumps, loads
+from specialize import specialize
+
+def _random_key(rng: Random, key_type: type):
+    x = rng.randrange(2000)
+    if key_type is float:
+        return x / 7
+    if key_type is str:
+        return f'k{x}'
+    if key_type is tuple:
+        return (x % 5, x)
+    return x
+
+@pytest.mark.parametrize('key_type', [int, float, str, tuple])
+def test_same_trees_as_generic(key_type):
+    rng = Random(key_type.__name__)
+    generic = D2LTree(_random_key(rng, key_type), 0)
+    spec = specialize(D2LTree, key_type)(_random_key(rng, key_type), 0)
+    for i in range(20_000):
+        key = _random_key(rng, key_type)
+        if rng.random() < 0.7:
+            generic[key] = i
+            spec[key] = i
+        else:
+            assert spec.remove(key, None) == generic.remove(key, None)
+        if i % 1000 == 0:
+            assert _columns(spec) == _columns(generic)
+    spec._check()
+    assert _columns(spec) == _columns(generic)
+    assert len(spec) == len(generic)
+
+def test_snapshot_by_name():
+    tree = specialize(D2LTree, float)(0., 0.)
+    for i in range(100):
+        tree[i / 3] = i
+    copy = loads(dumps(tree))
+    assert type(copy) is type(tree)
+    assert list(copy) == list(tree)
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        specialize(D3LTree, float)
+    with pytest.raises(ValueError):
+        specialize(D2LTree, bytes)
@@ -0,0 +1,234 @@
+# Durability for trees: a write-ahead log (WAL) plus periodic checkpoints.
+#
+# WAL records (little-endian):
+#   <I: payload size> <I: crc32 of payload> payload
+# with payload
+#   SET    op key val
+#   DEL    op key
+# where `op` is 1 byte and keys and values use the encoding in codec.py.
+#
+# NOTE:
+# - Group commit: records are buffered and written with a single fsync once
+#   `group_size` records are pending or the oldest pending record is older
+#   than `group_delay` seconds (checked at each append), or on `commit`.
+#   A crash loses at most the records that weren't committed yet.
+# - A torn or corrupted tail (after a crash in the middle of a write) is
+#   detected with the CRCs and discarded.
+# - A checkpoint saves a snapshot (see snapshot.py) and then empties the log.
+#   If we crash in between, the old log is replayed over the new snapshot,
+#   which is harmless since replaying sets and deletions in order is
+#   idempotent.
+
+from __future__ import annotations
+import os
+from struct import Struct
+from time import monotonic
+from typing import Any, Callable, Final, Generic, Iterator, Tuple
+from zlib import crc32
+from codec import decode, encode
+from generic import K, V, T, Tree
+from misc import _Missing, _missing, notFound
+from snapshot import load, save
+
+OP_SET: Final = 1
+OP_DEL: Final = 2
+
+_RECORD_HEADER: Final = Struct('<II')
+
+def _encode_record(op: int, key: Any, val: Any = _missing) -> bytearray:
+    """NOTE: Raises TypeError if `key` or `val` can't be encoded."""
+    out = bytearray(_RECORD_HEADER.size)
+    out.append(op)
+    encode(key, out)
+    if val is not _missing:
+        encode(val, out)
+    payload = memoryview(out)[_RECORD_HEADER.size:]
+    _RECORD_HEADER.pack_into(out, 0, len(payload), crc32(payload))
+    payload.release()
+    return out
+
+def read_log(path: str | os.PathLike) -> Tuple[list[Tuple[int, Any, Any]],
+                                                int]:
+    """Returns the valid records, as (op, key, val) triples (val is None for
+    deletions), and the size of the valid prefix of the log."""
+    records: list[Tuple[int, Any, Any]] = []
+    try:
+        with open(path, 'rb') as f:
+            buf = f.read()
+    except FileNotFoundError:
+        return records, 0
+    pos = 0
+    end = len(buf)
+    while end - pos >= _RECORD_HEADER.size:
+        size, crc = _RECORD_HEADER.unpack_from(buf, pos)
+        start = pos + _RECORD_HEADER.size
+        if end - start < size:
+            break                   # torn tail
+        payload = memoryview(buf)[start:start+size]
+        if crc32(payload) != crc:
+            break                   # corrupted tail
+        op = payload[0]
+        key, p = decode(payload, 1)
+        val = decode(payload, p)[0] if op == OP_SET else None
+        records.append((op, key, val))
+        pos = start + size
+    return records, pos
+
+class WriteAheadLog:
+    path: str
+    group_size: int
+    group_delay: float
+    _file: Any
+    _pending: bytearray
+    _num_pending: int
+    _oldest_pending: float
+
+    def __init__(self, path: str | os.PathLike, *, group_size: int = 64,
+                 group_delay: float = 0.01):
+        """NOTE: Discards the invalid tail of the log, if any."""
+        self.path = os.fspath(path)
+        self.group_size = group_size
+        self.group_delay = group_delay
+        _, valid_size = read_log(self.path)
+        self._file = open(self.path, 'ab')
+        if self._file.tell() != valid_size:
+            self._file.truncate(valid_size)
+            os.fsync(self._file.fileno())
+        self._pending = bytearray()
+        self._num_pending = 0
+        self._oldest_pending = 0.
+
+    def append(self, record: bytes | bytearray):
+        if self._num_pending == 0:
+            self._oldest_pending = monotonic()
+        self._pending += record
+        self._num_pending += 1
+        if (self._num_pending >= self.group_size or
+                monotonic() - self._oldest_pending >= self.group_delay):
+            self.commit()
+
+    def commit(self):
+        """Writes the pending records and waits until they're on disk."""
+        if self._num_pending == 0:
+            return
+        self._file.write(self._pending)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending.clear()
+        self._num_pending = 0
+
+    def truncate(self):
+        """Empties the log (pending records included)."""
+        self._pending.clear()
+        self._num_pending = 0
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.commit()
+        self._file.close()
+
+class DurableTree(Generic[K, V]):
+    """Wraps a tree so that its mutations are logged and it can be recovered
+    after a crash.
+    NOTE:
+    - Read the tree through `tree` (or the few read methods below), but only
+      modify it through the DurableTree.
+    - The keys and values must be encodable with codec.py.
+    """
+    tree: Tree[K, V]
+    directory: str
+    checkpoint_every: int
+    _wal: WriteAheadLog
+    _num_since_checkpoint: int
+
+    def __init__(self, directory: str | os.PathLike,
+                 new_tree: Callable[[], Tree[K, V]], *,
+                 checkpoint_every: int = 1_000_000, group_size: int = 64,
+                 group_delay: float = 0.01):
+        """Recovers the tree saved in `directory`, if any, or creates it with
+        `new_tree()`."""
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.checkpoint_every = checkpoint_every
+        snapshot_path = self._snapshot_path()
+        self.tree = load(snapshot_path) if os.path.exists(snapshot_path) \
+                    else new_tree()
+        records, _ = read_log(self._wal_path())
+        for op, key, val in records:
+            if op == OP_SET:
+                self.tree[key] = val
+            else:
+                self.tree.remove(key, None)
+        self._wal = WriteAheadLog(self._wal_path(), group_size=group_size,
+                                  group_delay=group_delay)
+        self._num_since_checkpoint = len(records)
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, 'snapshot')
+
+    def _wal_path(self) -> str:
+        return os.path.join(self.directory, 'wal')
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.tree
+
+    def __getitem__(self, key: K) -> V:
+        return self.tree[key]
+
+    def items(self, from_key: K | _Missing = _missing,
+              to_key: K | _Missing = _missing) -> Iterator[tuple[K, V]]:
+        return self.tree.items(from_key, to_key)
+
+    def __iter__(self) -> Iterator[tuple[K, V]]:
+        return self.tree.items()
+
+    def _logged(self, record: bytearray):
+        self._wal.append(record)
+        self._num_since_checkpoint += 1
+        if self._num_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def __setitem__(self, key: K, val: V):
+        # NOTE: The record is encoded first so that unsupported keys and
+        #   values are rejected before the tree is modified.
+        record = _encode_record(OP_SET, key, val)
+        self.tree[key] = val
+        self._logged(record)
+
+    def remove(self, key: K, default: T | _Missing = _missing) -> V | T:
+        record = _encode_record(OP_DEL, key)
+        val = self.tree.remove(key, notFound)
+        if val is notFound:
+            if default is _missing:
+                raise KeyError
+            return default
+        self._logged(record)
+        return val
+
+    def __delitem__(self, key: K):
+        self.remove(key)
+
+    def commit(self):
+        """Makes all the mutations so far durable."""
+        self._wal.commit()
+
+    def checkpoint(self):
+        """Saves a snapshot of the tree and empties the log."""
+        self._wal.commit()
+        save(self.tree, self._snapshot_path())
+        self._wal.truncate()
+        self._num_since_checkpoint = 0
+
+    def close(self):
+        self._wal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()